@@ -0,0 +1,185 @@
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Optional
+from langchain_core.runnables import Runnable
+from ai_models_connection.ai_provider import BaseLLMProvider
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_MESSAGE = re.compile(
+    r"\b(408|429|50[0-4])\b|rate.?limit|resource.?exhausted|overloaded|unavailable|timed? ?out",
+    re.IGNORECASE
+)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Decide whether an error from a provider should trigger failover (429 / 5xx / timeouts)."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(error, "code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+
+    return bool(RETRYABLE_MESSAGE.search(str(error)))
+
+
+class ProviderHealth:
+    """Rolling latency window and failure cooldown for one provider/model pair"""
+
+    def __init__(self, window: int = 50, cooldown: float = 15.0, max_cooldown: float = 300.0):
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._lock = threading.Lock()
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.unhealthy_until = 0.0
+
+    def record_failure(self):
+        """Put the provider on an exponentially growing cooldown."""
+        with self._lock:
+            self.consecutive_failures += 1
+            backoff = min(self.cooldown * (2 ** (self.consecutive_failures - 1)), self.max_cooldown)
+            self.unhealthy_until = time.monotonic() + backoff
+
+    def is_healthy(self) -> bool:
+        return time.monotonic() >= self.unhealthy_until
+
+    def p95(self, min_samples: int = 5) -> Optional[float]:
+        """95th percentile latency, or None until enough samples were collected."""
+        with self._lock:
+            if len(self.latencies) < min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+
+# Health is shared by every job in the process, so one vendor's bad minute is learned once.
+_health_registry = {}
+_health_lock = threading.Lock()
+
+
+def get_provider_health(key: str) -> ProviderHealth:
+    with _health_lock:
+        if key not in _health_registry:
+            _health_registry[key] = ProviderHealth()
+        return _health_registry[key]
+
+
+# Hedged calls of every router run on one pool: routers are built per job and tier, and a
+# pool each would leave its idle threads behind.
+HEDGE_WORKERS = 16
+_hedge_executor = None
+_hedge_lock = threading.Lock()
+
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _hedge_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+        return _hedge_executor
+
+
+class RoutedLLM(Runnable):
+    """Runnable that sends each call to the first healthy provider and fails over on 429/5xx"""
+
+    def __init__(self, entries: List[tuple], hedge: bool = False, executor: ThreadPoolExecutor = None):
+        self.entries = entries
+        self.hedge = hedge
+        self._executor = (executor or get_hedge_executor()) if hedge else None
+
+    def _candidates(self) -> List[tuple]:
+        healthy = [entry for entry in self.entries if get_provider_health(entry[0]).is_healthy()]
+        if healthy:
+            return healthy
+        # Everyone is cooling down: try the one that recovers first rather than failing outright.
+        return sorted(self.entries, key=lambda entry: get_provider_health(entry[0]).unhealthy_until)
+
+    def _call(self, key: str, llm, input, config, **kwargs):
+        health = get_provider_health(key)
+        started = time.monotonic()
+        try:
+            result = llm.invoke(input, config, **kwargs)
+        except Exception as e:
+            if is_retryable_error(e):
+                health.record_failure()
+            raise
+        health.record_success(time.monotonic() - started)
+        return result
+
+    def _failover(self, candidates: List[tuple], input, config, last_error: Exception = None, **kwargs):
+        for key, llm in candidates:
+            try:
+                return self._call(key, llm, input, config, **kwargs)
+            except Exception as e:
+                if not is_retryable_error(e):
+                    raise
+                print(f"[router] {key} failed ({e}), failing over...")
+                last_error = e
+        raise last_error
+
+    def _hedged(self, candidates: List[tuple], input, config, **kwargs):
+        (primary_key, primary_llm), (backup_key, backup_llm) = candidates[0], candidates[1]
+        threshold = get_provider_health(primary_key).p95()
+        if threshold is None:
+            return self._failover(candidates, input, config, **kwargs)
+
+        futures = {self._executor.submit(self._call, primary_key, primary_llm, input, config, **kwargs): primary_key}
+        done, pending = wait(futures, timeout=threshold)
+
+        if not done:
+            print(f"[router] {primary_key} exceeded p95 ({threshold:.1f}s), hedging with {backup_key}")
+            futures[self._executor.submit(self._call, backup_key, backup_llm, input, config, **kwargs)] = backup_key
+            remaining = candidates[2:]
+        else:
+            remaining = candidates[1:]
+
+        last_error = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    if not is_retryable_error(e):
+                        raise
+                    print(f"[router] {futures[future]} failed ({e})")
+                    last_error = e
+
+        return self._failover(remaining, input, config, last_error=last_error, **kwargs)
+
+    def invoke(self, input, config=None, **kwargs):
+        candidates = self._candidates()
+        if self.hedge and len(candidates) > 1:
+            return self._hedged(candidates, input, config, **kwargs)
+        return self._failover(candidates, input, config, **kwargs)
+
+
+class ProviderRouter(BaseLLMProvider):
+    """Ordered pool of providers exposed as a single LLM with failover and optional hedging"""
+
+    def __init__(self, providers: List[BaseLLMProvider], hedge: bool = False):
+        if not providers:
+            raise ValueError("ProviderRouter needs at least one provider.")
+        self.providers = providers
+        self.hedge = hedge
+        self.model = providers[0].model
+
+    def get_llm(self):
+        entries = [(f"{type(p).__name__}:{p.model}", p.get_llm()) for p in self.providers]
+        return RoutedLLM(entries, hedge=self.hedge)
@@ -0,0 +1,101 @@
+import ast
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+BRANCH_NODES = (
+    ast.If, ast.For, ast.AsyncFor, ast.While, ast.Try, ast.With, ast.AsyncWith,
+    ast.ExceptHandler, ast.BoolOp, ast.IfExp, ast.comprehension,
+    ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda
+)
+BRANCH_KEYWORDS = re.compile(r"\b(if|elif|else if|for|foreach|while|case|catch|except|function|def|class|fn|func)\b|&&|\|\|")
+
+DEFAULT_CONFIG = {
+    "tiers": {
+        "fast": {"provider": "google", "model": "gemini-2.5-flash-lite"},
+        "standard": {"provider": "google", "model": "gemini-2.5-flash"},
+        "strong": {"provider": "google", "model": "gemini-2.5-pro"}
+    },
+    "order": ["fast", "standard", "strong"],
+    "default_tier": "standard",
+    "diagram_types": {},
+    "file_rules": {
+        "fast_max_lines": 150,
+        "fast_max_complexity": 15,
+        "strong_min_lines": 1500,
+        "strong_min_complexity": 150
+    }
+}
+
+
+def estimate_complexity(code_content: str, file_path: str = "") -> int:
+    """
+    Rough cyclomatic-style complexity. Python files are parsed with ast; anything else
+    (or Python that doesn't parse) falls back to counting branch keywords.
+    """
+    if file_path.endswith(".py"):
+        try:
+            tree = ast.parse(code_content)
+            return 1 + sum(isinstance(node, BRANCH_NODES) for node in ast.walk(tree))
+        except (SyntaxError, ValueError):
+            pass
+    return 1 + len(BRANCH_KEYWORDS.findall(code_content))
+
+
+class ModelTierPolicy:
+    """Maps a request (diagram type + file size/complexity) to a model tier"""
+
+    def __init__(self, config: Dict = None):
+        config = {**DEFAULT_CONFIG, **(config or {})}
+        self.tiers = config["tiers"]
+        self.order = config["order"]
+        self.default_tier = config["default_tier"]
+        self.diagram_types = config["diagram_types"]
+        self.file_rules = {**DEFAULT_CONFIG["file_rules"], **config.get("file_rules", {})}
+
+        unknown = {self.default_tier, *self.diagram_types.values()} - set(self.tiers)
+        if unknown or set(self.order) != set(self.tiers):
+            raise ValueError(f"Tier config references unknown tiers: {unknown or set(self.order) ^ set(self.tiers)}")
+
+    @classmethod
+    def load(cls, path: str) -> "ModelTierPolicy":
+        """Load the tier mapping from a JSON file, falling back to the built-in defaults."""
+        if not path or not os.path.exists(path):
+            print(f"Model tier config not found at {path}, using defaults")
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _shift(self, tier: str, steps: int) -> str:
+        index = min(max(self.order.index(tier) + steps, 0), len(self.order) - 1)
+        return self.order[index]
+
+    def tier_for(self, diagram_type: str, code_content: Optional[str] = None, file_path: str = "") -> str:
+        """
+        Starts from the tier configured for the diagram type, then moves one tier down for
+        small simple inputs and one tier up for large or branch-heavy ones.
+        """
+        tier = self.diagram_types.get(diagram_type, self.default_tier)
+        if not code_content:
+            return tier
+
+        lines = code_content.count("\n") + 1
+        complexity = estimate_complexity(code_content, file_path)
+        rules = self.file_rules
+
+        if lines <= rules["fast_max_lines"] and complexity <= rules["fast_max_complexity"]:
+            return self._shift(tier, -1)
+        if lines >= rules["strong_min_lines"] or complexity >= rules["strong_min_complexity"]:
+            return self._shift(tier, 1)
+        return tier
+
+    def model_for(self, tier: str) -> Tuple[str, str]:
+        """(provider_name, model) configured for a tier."""
+        entry = self.tiers[tier]
+        return entry["provider"], entry["model"]
+
+    def pool_for(self, tier: str, api_keys: Dict[str, str], fallbacks: List[Tuple[str, str, str]] = None) -> List[Tuple[str, str, str]]:
+        """Ordered (provider_name, model, api_key) pool for a tier: its own model first, then the fallbacks."""
+        provider_name, model = self.model_for(tier)
+        return [(provider_name, model, api_keys.get(provider_name))] + list(fallbacks or [])
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+from typing import Dict, List, Optional
+from mermaid_graph import semantic_diff
+
+UNSAFE = re.compile(r"[^A-Za-z0-9]+")
+MANIFEST_NAME = ".manifest.json"
+INDEX_NAME = "index.md"
+MERMAID_BLOCK = re.compile(r"```mermaid\n(.*?)\n```", re.DOTALL)
+_STOP = object()
+
+
+def diagram_filename(file_path: str) -> str:
+    """
+    Stable, collision-free file name for a diagram: a readable slug of the path plus a
+    short hash of the exact path, so 'a/b.py' and 'a_b.py' no longer map to the same file.
+    """
+    slug = UNSAFE.sub("_", file_path).strip("_")[:80] or "diagram"
+    digest = hashlib.sha1(file_path.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}.md"
+
+
+def render_markdown(result) -> str:
+    content = f"# Diagram: {result.file_path}\n\n"
+    if result.success:
+        content += f"## Description\n\n{result.description}\n\n"
+        content += f"## Diagram\n\n```mermaid\n{result.mermaid_code}\n```\n"
+    else:
+        content += f"## Error\n\n{result.error}\n"
+    return content
+
+
+def read_mermaid(path: str) -> Optional[str]:
+    """Mermaid source of a previously exported diagram file, if there is one."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            match = MERMAID_BLOCK.search(f.read())
+    except OSError:
+        return None
+    return match.group(1) if match else None
+
+
+def write_atomic(path: str, content: str):
+    """Writes to a temp file next to the target and renames it over, so readers never see half a file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+class BatchDiagramExporter:
+    """
+    Writes diagrams from a background thread in batches, each file through an atomic
+    rename. A manifest of content hashes lets unchanged diagrams be skipped without
+    touching the file, so re-runs (e.g. in the docs workflow) leave minimal git diffs;
+    a diagram whose text changed but whose meaning didn't keeps the previous file too.
+    close() flushes the queue and writes index.md linking every diagram.
+    """
+
+    def __init__(self, output_dir: str = "docs/diagrams", batch_size: int = 32, prune: bool = False):
+        self.output_dir = output_dir
+        self.batch_size = batch_size
+        self.prune = prune
+        self.stats = {"written": 0, "unchanged": 0, "semantically_unchanged": 0, "failed": 0, "removed": 0}
+        os.makedirs(output_dir, exist_ok=True)
+
+        self._manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self._manifest = self._load_manifest()
+        self._seen = set()
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._writer = threading.Thread(target=self._run, name="diagram-writer", daemon=True)
+        self._writer.start()
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        try:
+            with open(self._manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def submit(self, result) -> str:
+        """Queues a diagram and returns the path it will be written to."""
+        if self._closed:
+            raise RuntimeError("BatchDiagramExporter is closed.")
+        filename = diagram_filename(result.file_path)
+        self._queue.put((filename, result))
+        return os.path.join(self.output_dir, filename)
+
+    # Kept so the exporter is a drop-in replacement for DiagramExporter.
+    save_diagram = submit
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            batch: List[tuple] = []
+            stop = False
+            while True:
+                if item is _STOP:
+                    stop = True
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[tuple]):
+        for filename, result in batch:
+            content = render_markdown(result)
+            digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            path = os.path.join(self.output_dir, filename)
+            with self._lock:
+                self._seen.add(filename)
+                previous = self._manifest.get(filename)
+            if previous and previous["hash"] == digest and os.path.exists(path):
+                self.stats["unchanged"] += 1
+                continue
+            if previous and previous.get("success") and result.success:
+                old_code = read_mermaid(path)
+                if old_code is not None and semantic_diff(old_code, result.mermaid_code).is_empty():
+                    self.stats["semantically_unchanged"] += 1
+                    continue
+            try:
+                write_atomic(path, content)
+            except OSError as e:
+                print(f"  ✗ Could not write {path}: {e}")
+                self.stats["failed"] += 1
+                continue
+            with self._lock:
+                self._manifest[filename] = {"path": result.file_path, "hash": digest, "success": result.success}
+            self.stats["written"] += 1
+
+    def _render_index(self) -> str:
+        entries = sorted(self._manifest.items(), key=lambda item: item[1]["path"].lower())
+        lines = ["# Diagrams", "", f"{len(entries)} diagrams.", ""]
+        for filename, entry in entries:
+            marker = "" if entry.get("success", True) else " (failed)"
+            lines.append(f"- [{entry['path']}]({filename}){marker}")
+        return "\n".join(lines) + "\n"
+
+    def close(self) -> Dict[str, int]:
+        """Flushes pending diagrams, prunes stale ones if asked, and writes the index and manifest."""
+        if self._closed:
+            return self.stats
+        self._closed = True
+        self._queue.put(_STOP)
+        self._writer.join()
+
+        if self.prune:
+            for filename in [name for name in self._manifest if name not in self._seen]:
+                try:
+                    os.remove(os.path.join(self.output_dir, filename))
+                except FileNotFoundError:
+                    pass
+                del self._manifest[filename]
+                self.stats["removed"] += 1
+
+        index_path = os.path.join(self.output_dir, INDEX_NAME)
+        index = self._render_index()
+        try:
+            with open(index_path, encoding="utf-8") as f:
+                unchanged = f.read() == index
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            write_atomic(index_path, index)
+        write_atomic(self._manifest_path, json.dumps(self._manifest, indent=1, sort_keys=True) + "\n")
+
+        print(f"Diagrams: {self.stats['written']} written, {self.stats['unchanged']} unchanged, "
+              f"{self.stats['semantically_unchanged']} kept (no semantic change), "
+              f"{self.stats['failed']} failed, {self.stats['removed']} removed")
+        return self.stats
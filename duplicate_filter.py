@@ -0,0 +1,198 @@
+import re
+import threading
+import zlib
+import numpy as np
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+LOCKFILE_NAMES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "composer.lock", "poetry.lock",
+    "Pipfile.lock", "Cargo.lock", "Gemfile.lock", "go.sum", "uv.lock", "npm-shrinkwrap.json"
+}
+GENERATED_SUFFIXES = (
+    ".min.js", ".min.css", ".map", "_pb2.py", "_pb2_grpc.py", ".pb.go", ".g.dart",
+    ".generated.ts", ".generated.cs", ".designer.cs"
+)
+# Generator markers, looked for only in the comments a file starts with: "// Code generated
+# by protoc-gen-go. DO NOT EDIT.", "/** @generated */", "# This file is autogenerated by ...".
+GENERATED_MARKER = re.compile(
+    r"@generated|\bdo not (?:edit|modify)\b|<auto-generated"
+    r"|^(?:(?:this )?(?:file|code) (?:is |was |has been )?)?(?:auto-?generated|automatically generated|generated (?:by|from))\b",
+    re.IGNORECASE
+)
+COMMENT_START = re.compile(r"(//+|#+|/\*+|\*+|--|<!--|;+|\"\"\"|''')\s*(.*)")
+BLOCK_END = {"/*": "*/", "<!--": "-->", '"""': '"""', "'''": "'''"}
+LOCKFILE_KEYS = re.compile(r'"(?:integrity|resolved|version|dist|shasum)"\s*:')
+WORD = re.compile(r"\w+")
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+
+
+def byte_entropy(data: bytes) -> float:
+    """Shannon entropy in bits per byte."""
+    if not data:
+        return 0.0
+    counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    probabilities = counts[counts > 0] / len(data)
+    return float(-(probabilities * np.log2(probabilities)).sum())
+
+
+def has_generator_header(content: str, max_lines: int = 40) -> bool:
+    """Whether the comments at the top of a file (before its first line of code) carry a generator marker."""
+    block_end = None
+    for line in content[:4096].splitlines()[:max_lines]:
+        text = line.strip()
+        if block_end:
+            if block_end in text:
+                block_end = None
+        elif not text:
+            continue
+        else:
+            match = COMMENT_START.match(text)
+            if not match:
+                return False
+            opener, text = match.groups()
+            end = BLOCK_END.get(opener[:2] if opener.startswith("/*") else opener)
+            if end and end not in text:
+                block_end = end
+        if GENERATED_MARKER.search(text.lstrip("*/# ")):
+            return True
+    return False
+
+
+def generated_reason(path: str, content: str) -> Optional[str]:
+    """Why a file looks generated, minified or lockfile-like, or None if it looks hand-written."""
+    name = path.rsplit("/", 1)[-1]
+    if name in LOCKFILE_NAMES:
+        return "lockfile"
+    if name.endswith(GENERATED_SUFFIXES):
+        return "generated"
+    if has_generator_header(content):
+        return "generated"
+
+    lines = content.splitlines() or [""]
+    if len(content) > 2000:
+        mean_length = len(content) / len(lines)
+        longest = max(len(line) for line in lines)
+        if mean_length > 200 or (longest > 1000 and len(lines) < 20):
+            return "minified"
+
+    if name.endswith(".json") and len(content) > 50000:
+        if len(LOCKFILE_KEYS.findall(content)) / len(lines) > 0.3:
+            return "lockfile"
+
+    if len(content) > 4096 and byte_entropy(content.encode("utf-8", errors="ignore")) > 5.8:
+        return "high-entropy"
+
+    return None
+
+
+class MinHasher:
+    """MinHash signatures over word shingles, computed for a whole batch of documents with NumPy"""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, max_shingles: int = 2000, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_shingles = max_shingles
+        self.a = rng.integers(1, 1 << 29, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def shingle_hashes(self, text: str) -> np.ndarray:
+        words = WORD.findall(text.lower())
+        k = self.shingle_size
+        shingles = {" ".join(words[i:i + k]) for i in range(max(len(words) - k + 1, 1))}
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles if s), dtype=np.uint64)
+        # Bottom-k sample keeps the signature of huge files consistent and cheap.
+        if len(hashes) > self.max_shingles:
+            hashes = np.partition(hashes, self.max_shingles)[:self.max_shingles]
+        return hashes
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), num_perm) signature matrix; empty documents get an all-max row."""
+        empty = np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        per_doc = [self.shingle_hashes(text) for text in texts]
+        lengths = np.array([len(h) for h in per_doc])
+        result = np.tile(empty, (len(texts), 1))
+        if lengths.sum() == 0:
+            return result
+
+        all_hashes = np.concatenate([h for h in per_doc if len(h)])
+        permuted = (self.a[:, None] * all_hashes[None, :] + self.b[:, None]) % MERSENNE_PRIME
+        starts = np.concatenate([[0], np.cumsum(lengths[lengths > 0])[:-1]])
+        result[lengths > 0] = np.minimum.reduceat(permuted, starts, axis=1).T
+        return result
+
+
+class NearDuplicateIndex:
+    """LSH over MinHash bands; the first file seen in a cluster becomes its representative"""
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, threshold: float = 0.85):
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.threshold = threshold
+        self.buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self.signatures: Dict[str, np.ndarray] = {}
+
+    def add(self, key: str, signature: np.ndarray) -> Optional[str]:
+        """Register a file; returns the representative it duplicates, or None if it is new."""
+        if (signature == MERSENNE_PRIME).all():
+            return None
+
+        band_keys = [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+        candidates = {other for band_key in band_keys for other in self.buckets.get(band_key, [])}
+        for other in sorted(candidates):
+            if np.mean(self.signatures[other] == signature) >= self.threshold:
+                return other
+
+        self.signatures[key] = signature
+        for band_key in band_keys:
+            self.buckets.setdefault(band_key, []).append(key)
+        return None
+
+
+class PreFilter:
+    """
+    Drops generated/minified files and near-duplicates before they reach the LLM.
+    Thread-safe, and counts every skip by reason for the per-run report.
+    """
+
+    def __init__(self, threshold: float = 0.85):
+        self.hasher = MinHasher()
+        self.index = NearDuplicateIndex(num_perm=self.hasher.num_perm, threshold=threshold)
+        self.skipped = Counter()
+        self.duplicates: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def filter_batch(self, items: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Keeps the (path, content) pairs worth analysing, in their original order."""
+        candidates = []
+        for path, content in items:
+            reason = generated_reason(path, content)
+            if reason:
+                with self._lock:
+                    self.skipped[reason] += 1
+            else:
+                candidates.append((path, content))
+
+        if not candidates:
+            return []
+
+        signatures = self.hasher.signatures([content for _, content in candidates])
+        kept = []
+        with self._lock:
+            for (path, content), signature in zip(candidates, signatures):
+                representative = self.index.add(path, signature)
+                if representative:
+                    self.skipped["near-duplicate"] += 1
+                    self.duplicates[path] = representative
+                else:
+                    kept.append((path, content))
+        return kept
+
+    def keep(self, path: str, content: str) -> bool:
+        return bool(self.filter_batch([(path, content)]))
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.skipped)
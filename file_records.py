@@ -0,0 +1,170 @@
+import base64
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from typing import Callable, Optional
+import requests
+from partial_fetch import NotTextError, fetch_prefix, raw_url, sniff
+
+LANGUAGES = {
+    ".py": "Python", ".js": "JavaScript", ".jsx": "JavaScript", ".ts": "TypeScript", ".tsx": "TypeScript",
+    ".java": "Java", ".kt": "Kotlin", ".go": "Go", ".rs": "Rust", ".rb": "Ruby", ".php": "PHP",
+    ".cs": "C#", ".cpp": "C++", ".cc": "C++", ".c": "C", ".h": "C", ".swift": "Swift", ".dart": "Dart",
+    ".scala": "Scala", ".vue": "Vue", ".sql": "SQL", ".sh": "Shell"
+}
+
+
+def language_for(path: str) -> Optional[str]:
+    return LANGUAGES.get(os.path.splitext(path)[1].lower())
+
+
+class SpillDirectory:
+    """
+    Blob contents kept on disk instead of in memory, one file per blob SHA.
+    Blobs are immutable, so a SHA already on disk is never written twice.
+    """
+
+    def __init__(self, path: str = None):
+        self._owned = not path
+        self.path = path or tempfile.mkdtemp(prefix="docs-spill-")
+        os.makedirs(self.path, exist_ok=True)
+
+    def path_for(self, sha: str) -> str:
+        return os.path.join(self.path, sha)
+
+    def write(self, sha: str, data: bytes) -> str:
+        path = self.path_for(sha)
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return path
+
+    def cleanup(self):
+        """Removes the directory if it was created here (a configured directory is left alone)."""
+        if self._owned:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+
+class BlobFetcher:
+    """
+    Reads file contents from one repository: whole blobs through the git blob API, or,
+    when only a prefix will be used, just that prefix through an HTTP Range request on
+    raw content. Binary and non-UTF-8 files raise NotTextError, large ones after their
+    first few KB. Prefixes are read at ref, the commit the files were listed at (by default
+    the head of the default branch when the fetcher is made), so they match the blob SHAs.
+    """
+
+    def __init__(self, repo, token: str = None, partial: bool = True, ref: str = None):
+        self.repo = repo
+        self.partial = partial
+        self.ref = ref or repo.get_branch(repo.default_branch).commit.sha
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+        # Bytes of large files that were never downloaded thanks to prefix fetches.
+        self.bytes_skipped = 0
+
+    def fetch(self, path: str, sha: str, size: int, limit: int = None) -> bytes:
+        if self.partial and limit is not None and size > limit:
+            data = fetch_prefix(self.session, raw_url(self.repo.full_name, self.ref, path), limit, path=path)
+            self.bytes_skipped += size - len(data)
+            return data
+
+        data = fetch_blob(self.repo, sha)
+        complete = limit is None or len(data) <= limit
+        data = data if complete else data[:limit]
+        reason = sniff(data, complete)
+        if reason:
+            raise NotTextError(path, reason)
+        return data
+
+
+class RemoteContent:
+    """Content that stays in the repository until read; nothing is kept in memory between reads."""
+    __slots__ = ("_fetch",)
+
+    def __init__(self, fetch: Callable[[Optional[int]], bytes]):
+        self._fetch = fetch
+
+    def read(self, limit: int = None) -> bytes:
+        return self._fetch(limit)
+
+
+class SpilledContent:
+    """Content in a spill file, read through a read-only memory map."""
+    __slots__ = ("path",)
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def read(self, limit: int = None) -> bytes:
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped[:limit] if limit is not None else mapped[:]
+
+
+class FileRecord:
+    """
+    What the pipeline keeps per repository file: path, blob SHA, size and language.
+    The content sits behind a handle (remote until read, or spilled to disk) and is
+    only loaded when read, so memory no longer grows with the size of the repository.
+    """
+    __slots__ = ("path", "sha", "size", "language", "handle")
+
+    def __init__(self, path: str, sha: str, size: int, handle=None):
+        self.path = path
+        self.sha = sha
+        self.size = size
+        self.language = language_for(path)
+        self.handle = handle
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+    @classmethod
+    def from_content_file(cls, content_file, fetcher: BlobFetcher) -> "FileRecord":
+        """Record for a PyGithub ContentFile; the content is fetched when read."""
+        path, sha, size = content_file.path, content_file.sha, content_file.size
+        return cls(path, sha, size, RemoteContent(lambda limit: fetcher.fetch(path, sha, size, limit)))
+
+    def read(self, limit: int = None) -> bytes:
+        if self.handle is None:
+            raise ValueError(f"No content handle for {self.path}")
+        return self.handle.read(limit)
+
+    def text(self, max_chars: int = None) -> str:
+        """Decoded content; with max_chars only the bytes that can hold those characters are read."""
+        if max_chars is None:
+            return self.read().decode("utf-8", errors="ignore")
+        return self.read(max_chars * 4).decode("utf-8", errors="ignore")[:max_chars]
+
+    def spill(self, spill_dir: SpillDirectory, data: bytes = None) -> "FileRecord":
+        """Moves the content to disk (data, if already loaded, saves fetching it again)."""
+        if not isinstance(self.handle, SpilledContent):
+            self.handle = SpilledContent(spill_dir.write(self.sha, self.read() if data is None else data))
+        return self
+
+    def __getstate__(self):
+        # Remote handles close over the repository client, so only the metadata and a spill path survive pickling.
+        handle = self.handle if isinstance(self.handle, SpilledContent) else None
+        return self.path, self.sha, self.size, self.language, handle
+
+    def __setstate__(self, state):
+        self.path, self.sha, self.size, self.language, self.handle = state
+
+    def __repr__(self) -> str:
+        return f"FileRecord({self.path!r}, sha={self.sha[:8] if self.sha else None}, size={self.size})"
+
+
+def fetch_blob(repo, sha: str) -> bytes:
+    blob = repo.get_git_blob(sha)
+    if blob.encoding == "base64":
+        return base64.b64decode(blob.content)
+    return blob.content.encode("utf-8")
@@ -1,9 +1,17 @@
-from github import Github
-import base64
-from llm import LLMDiagramGenerator, DiagramExporter
+from llm import CLASS_DIAGRAM_MAX_CHARS, LLMDiagramGenerator
 from integration import SetUpGithub
-from ai_models_connection.main import InitModelAI
+from ai_models_connection.tiering import ModelTierPolicy
 from dotenv import load_dotenv
+from pipeline import Pipeline, Stage, StageCache
+from streaming import StreamingPipeline, StreamStage
+from duplicate_filter import PreFilter
+from file_ranking import extract_skeleton
+from run_export import RunRecorder, write_run
+from diagram_export import BatchDiagramExporter
+from file_records import BlobFetcher, FileRecord, SpillDirectory
+from partial_fetch import NotTextError
+from exclusions import ExclusionEngine
+import json
 import os
 import time
 
@@ -12,95 +20,228 @@ load_dotenv()
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 REPO_NAME = os.getenv("REPO_NAME")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-repoClass = SetUpGithub(github_token=GITHUB_TOKEN, repo_name=REPO_NAME)
-repo = repoClass.authenticate()
-
-languages = repo.get_languages()
-
-repo_languages = list(languages.keys())
-
-api_key = GOOGLE_API_KEY
-
-print("Initializing LLM Diagram Generator...")
-generator = LLMDiagramGenerator(repo_languages=repo_languages, model="gemini-2.5-flash", api_key=api_key, user_choice="google")
-exporter = DiagramExporter()
-
-
-def get_all_files(contents):
+MODEL_TIERS_CONFIG = os.getenv("MODEL_TIERS_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_tiers.json"))
+
+STAGE_CACHE_DIR = os.getenv("STAGE_CACHE_DIR", ".cache/stages")
+CODE_EXTENSIONS = ('.py',)
+# Directories never listed; .gitignore, .gitattributes and .docgen.json rules apply on top.
+IGNORED_DIRS = {'.git', '.github', '.vscode', 'node_modules', 'venv', 'env', '__pycache__', 'dist', 'build', 'vendor'}
+MAX_FILE_BYTES = int(os.getenv("MAX_FILE_BYTES", str(1024 * 1024)))
+
+# Streaming class-diagram pipeline: per-stage concurrency and bounded queue size.
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "4"))
+ANALYZE_WORKERS = int(os.getenv("ANALYZE_WORKERS", "1"))
+QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "8"))
+# Pause after each LLM call (per analyze worker) to stay under provider rate limits.
+LLM_CALL_INTERVAL = float(os.getenv("LLM_CALL_INTERVAL", "20"))
+MULTI_FILE_SAMPLE = 10
+MULTI_FILE_SAMPLE_CHARS = 1000
+# Files are only fetched up to what the class-diagram prompt uses (HTTP Range on raw content).
+PARTIAL_FETCH = os.getenv("PARTIAL_FETCH", "true").lower() == "true"
+# Where the multi-file sample is spilled until it is needed; empty uses a temporary directory.
+SPILL_DIR = os.getenv("SPILL_DIR", "")
+
+# Columnar export of the whole run (files + diagrams); empty disables it.
+RUN_EXPORT_DIR = os.getenv("RUN_EXPORT_DIR", "")
+RUN_EXPORT_FORMAT = os.getenv("RUN_EXPORT_FORMAT", "arrow")
+
+DIAGRAMS_DIR = os.getenv("DIAGRAMS_DIR", "docs/diagrams")
+# Remove diagrams of files that no longer exist in the repository.
+PRUNE_DIAGRAMS = os.getenv("PRUNE_DIAGRAMS", "false").lower() == "true"
+
+tier_policy = ModelTierPolicy.load(MODEL_TIERS_CONFIG)
+exporter = BatchDiagramExporter(DIAGRAMS_DIR, prune=PRUNE_DIAGRAMS)
+run_recorder = RunRecorder()
+spill_dir = SpillDirectory(SPILL_DIR)
+
+
+def authenticate(token, repo_name):
+    repoClass = SetUpGithub(github_token=token, repo_name=repo_name)
+    return repoClass.authenticate()
+
+
+def get_languages(repo):
+    return list(repo.get_languages().keys())
+
+
+def build_generator(repo_languages):
+    print("Initializing LLM Diagram Generator...")
+    return LLMDiagramGenerator(repo_languages=repo_languages, api_key=GOOGLE_API_KEY, user_choice="google", tier_policy=tier_policy)
+
+
+def get_all_files(repo):
+    """
+    Lists the repository as FileRecords; contents are only fetched when a stage reads them.
+    Ignored, generated, vendored and oversized files are dropped before anything is fetched.
+    """
+    print(f"Fetching files from repository: {repo.full_name}")
+    # Everything is listed and read at one commit, so a push mid-run can't mix versions.
+    ref = repo.get_branch(repo.default_branch).commit.sha
+    contents = repo.get_contents("", ref=ref)
+    fetcher = BlobFetcher(repo, GITHUB_TOKEN, partial=PARTIAL_FETCH, ref=ref)
     files = []
     while contents:
         file_content = contents.pop(0)
         if file_content.type == "dir":
-            contents.extend(repo.get_contents(file_content.path))
+            if file_content.name not in IGNORED_DIRS:
+                contents.extend(repo.get_contents(file_content.path, ref=ref))
         else:
-            files.append(file_content)
-    return files
-
-
-print(f"Fetching files from repository: {REPO_NAME}")
-contents = repo.get_contents("")
-all_files = get_all_files(contents)
-
-print(f"Found {len(all_files)} total files")
-
-code_extensions = ('.py')
-code_files = [f for f in all_files if f.path.endswith(code_extensions)]
-
-print(f"Found {len(code_files)} code files to analyze\n")
-
-all_code_contents = []
-
-for idx, file in enumerate(code_files, 1):
-    print(f"[{idx}/{len(code_files)}] Processing: {file.path}")
-    
-    try:
-        content = file.decoded_content.decode("utf-8", errors="ignore")
-        
-        all_code_contents.append((file.path, content))
-        
-        print(f"  → Generating diagram with LLM...")
-        result = generator.generate_class_diagram(file.path, content)
-        
-        if result.success:
-            output_path = exporter.save_diagram(result)
-            print(f"  ✓ Diagram saved: {output_path}")
-            
-     
-            if result.description:
-                print(f"  📝 {result.description[:100]}...")
-        else:
-            print(f"  ✗ Failed: {result.error}")
-
-        print("  zzZ Sleeping for 20s...")
-        time.sleep(20)
-            
-    except Exception as e:
-        print(f"  ✗ Error: {e}")
-    
-    print()
+            files.append(FileRecord.from_content_file(file_content, fetcher))
+
+    by_path = {file.path: file for file in files}
+    engine = ExclusionEngine.for_tree(by_path, lambda path: by_path[path].text(), max_file_bytes=MAX_FILE_BYTES)
+    kept = engine.filter(files)
+    print(f"Found {len(files)} total files, {len(files) - len(kept)} excluded: {engine.report()}")
+    return kept, engine.report()
+
+
+def select_code_files(all_files):
+    code_files = [f for f in all_files if f.path.endswith(CODE_EXTENSIONS)]
+    print(f"Found {len(code_files)} code files to analyze\n")
+    return code_files
+
+
+def generate_class_diagrams(generator, code_files):
+    """
+    Streams code files through fetch -> analyze -> export, connected by bounded queues,
+    so downloads overlap with LLM calls and only a few files are in memory at a time.
+    Generated files and near-duplicates are dropped right after the fetch.
+    The first MULTI_FILE_SAMPLE files are spilled to disk for the multi-file diagram
+    instead of being held in memory until the end of the run.
+    """
+    code_sample = {}
+    total = len(code_files)
+    prefilter = PreFilter()
+
+    def fetch(entry):
+        idx, file = entry
+        print(f"[{idx + 1}/{total}] Fetching: {file.path}")
+        try:
+            data = file.read(CLASS_DIAGRAM_MAX_CHARS)
+        except NotTextError as e:
+            print(f"  ⏭ Skipped ({e.reason}): {file.path}")
+            run_recorder.add_file(file.path, file.sha, file.size, status="skipped")
+            return None
+        content = data.decode("utf-8", errors="ignore")
+        if not prefilter.keep(file.path, content):
+            print(f"  ⏭ Skipped (generated or near-duplicate): {file.path}")
+            run_recorder.add_file(file.path, file.sha, file.size, status="skipped")
+            return None
+        if idx < MULTI_FILE_SAMPLE:
+            code_sample[idx] = file.spill(spill_dir, data)
+        return file, content
+
+    def analyze(entry):
+        file, content = entry
+        print(f"  → Generating diagram with LLM: {file.path}")
+        started = time.perf_counter()
+        result = generator.generate_class_diagram(file.path, content, truncated=file.size > CLASS_DIAGRAM_MAX_CHARS)
+        latency = time.perf_counter() - started
+        if LLM_CALL_INTERVAL:
+            time.sleep(LLM_CALL_INTERVAL)
+        return file, content, result, latency
+
+    def export(entry):
+        file, content, result, latency = entry
+        run_recorder.add_file(
+            file.path, file.sha, file.size, skeleton=extract_skeleton(file.path, content),
+            diagram=result.mermaid_code if result.success else None, description=result.description,
+            status="ok" if result.success else "failed", tokens=result.tokens, latency=latency
+        )
+        if not result.success:
+            print(f"  ✗ Failed: {result.file_path}: {result.error}")
+            return None
+        output_path = exporter.submit(result)
+        print(f"  ✓ Diagram queued: {output_path}")
+        if result.description:
+            print(f"  📝 {result.description[:100]}...")
+        return output_path
+
+    stream = StreamingPipeline([
+        StreamStage("fetch", fetch, workers=FETCH_WORKERS, queue_size=QUEUE_SIZE),
+        StreamStage("analyze", analyze, workers=ANALYZE_WORKERS, queue_size=QUEUE_SIZE),
+        StreamStage("export", export, workers=1, queue_size=QUEUE_SIZE),
+    ])
+    processed, failed = stream.run(enumerate(code_files))
+    print(f"Class diagrams: {processed} processed, {failed} failed")
+    print(f"Skipped files: {prefilter.report()}\n")
+
+    return processed, [code_sample[idx] for idx in sorted(code_sample)]
+
+
+def generate_structure_diagram(generator, all_files):
+    print("Generating repository structure diagram...")
+    return generator.generate_repository_structure([f.path for f in all_files], {f.path: f.size for f in all_files})
+
+
+def generate_multi_file_diagram(generator, code_sample):
+    if len(code_sample) <= 1:
+        return None
+    files = [(record.path, record.text(MULTI_FILE_SAMPLE_CHARS)) for record in code_sample]
+
+    print("  zzZ Sleeping before next diagram...")
+    time.sleep(LLM_CALL_INTERVAL)
+    print("\nGenerating multi-file architecture diagram...")
+    return generator.generate_multi_file_diagram(files)
 
-print("=" * 60)
-print("Generating repository structure diagram...")
-file_paths = [f.path for f in all_files]
-structure_result = generator.generate_repository_structure(file_paths)
 
-if structure_result.success:
-    exporter.save_diagram(structure_result)
-    print("✓ Repository structure diagram created")
+def export_diagrams(structure_result, multi_result):
+    run_recorder.add_diagram("structure", structure_result)
+    if multi_result:
+        run_recorder.add_diagram("multi_file", multi_result)
 
-print("  zzZ Sleeping 20s before next diagram...")
-time.sleep(20)
+    if structure_result.success:
+        exporter.submit(structure_result)
+        print("✓ Repository structure diagram created")
 
-if len(all_code_contents) > 1:
-    print("\nGenerating multi-file architecture diagram...")
-    multi_result = generator.generate_multi_file_diagram(all_code_contents)
-    
-    if multi_result.success:
-        exporter.save_diagram(multi_result)
+    if multi_result and multi_result.success:
+        exporter.submit(multi_result)
         print("✓ Multi-file architecture diagram created")
-
-print("\n" + "=" * 60)
-print("✓ All diagrams generated successfully!")
-print(f"📁 Check the 'docs/diagrams' folder for all diagrams")
-print("=" * 60)
+    return exporter.close()
+
+
+def export_run(repo, class_summary, exported, excluded_files):
+    if not RUN_EXPORT_DIR:
+        return None
+    metadata = {"repository": repo.full_name, "excluded_files": json.dumps(excluded_files, sort_keys=True)}
+    paths = write_run(run_recorder, RUN_EXPORT_DIR, RUN_EXPORT_FORMAT, metadata=metadata)
+    print(f"✓ Run exported: {', '.join(paths.values())}")
+    return paths
+
+
+# The per-file class diagrams and the structure diagram only share the file listing,
+# so they run concurrently; LLM stages are cached by their inputs (paths + blob SHAs).
+# class_diagrams writes its diagrams as it streams, so it is never served from the cache.
+STAGES = [
+    Stage("authenticate", authenticate, inputs=["token", "repo_name"], outputs=["repo"]),
+    Stage("languages", get_languages, inputs=["repo"], outputs=["repo_languages"]),
+    Stage("files", get_all_files, inputs=["repo"], outputs=["all_files", "excluded_files"]),
+    Stage("generator", build_generator, inputs=["repo_languages"], outputs=["generator"]),
+    Stage("code_files", select_code_files, inputs=["all_files"], outputs=["code_files"]),
+    Stage("class_diagrams", generate_class_diagrams, inputs=["generator", "code_files"], outputs=["class_summary", "code_sample"]),
+    Stage(
+        "structure_diagram", generate_structure_diagram,
+        inputs=["generator", "all_files"], outputs=["structure_result"],
+        cache_inputs=["all_files"], cache_if=lambda result: result.success
+    ),
+    Stage(
+        "multi_file_diagram", generate_multi_file_diagram,
+        inputs=["generator", "code_sample"], outputs=["multi_result"],
+        cache_inputs=["code_sample"], cache_if=lambda result: result is None or result.success
+    ),
+    Stage("export", export_diagrams, inputs=["structure_result", "multi_result"], outputs=["exported"]),
+    Stage("run_export", export_run, inputs=["repo", "class_summary", "exported", "excluded_files"], outputs=["run_files"]),
+]
+
+
+if __name__ == "__main__":
+    pipeline = Pipeline(STAGES, cache=StageCache(cache_dir=STAGE_CACHE_DIR))
+    try:
+        pipeline.run(token=GITHUB_TOKEN, repo_name=REPO_NAME)
+    finally:
+        spill_dir.cleanup()
+
+    print("\n" + "=" * 60)
+    print("✓ All diagrams generated successfully!")
+    print(f"📁 Check {DIAGRAMS_DIR}/index.md for all diagrams")
+    print("=" * 60)
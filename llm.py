@@ -9,10 +9,19 @@ from dotenv import load_dotenv
 from pathlib import Path
 from ai_models_connection.llm_provider import LLMProviderFactory
 from ai_models_connection.main import InitModelAI
+from ai_models_connection.tiering import ModelTierPolicy
+from structure_summary import render_structure_diagram, summarize_structure
 
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path, override=True)
 
+STRUCTURE_TOKEN_BUDGET = int(os.getenv("STRUCTURE_TOKEN_BUDGET", "3000"))
+# The structure diagram is rendered locally; the LLM only writes its description when enabled.
+STRUCTURE_LLM_ANNOTATE = os.getenv("STRUCTURE_LLM_ANNOTATE", "false").lower() == "true"
+STRUCTURE_MAX_DEPTH = int(os.getenv("STRUCTURE_MAX_DEPTH", "3"))
+# Source files are cut to this many characters in the class-diagram prompt.
+CLASS_DIAGRAM_MAX_CHARS = 15000
+
 private_key = os.getenv("PRIVATE_KEY").replace("\\n", "\n") 
 
 type = os.getenv('GOOGLE_TYPE')
@@ -63,14 +72,22 @@ class DiagramResult:
     file_path: str
     success: bool = True
     error: str = None
+    tokens: int = None
 
 
 class LLMDiagramGenerator:
     """Generate code diagrams using Google Gemini LLM"""
     
-    def __init__(self, credentials_json: str = None, user_choice: str = "google", model: str = "gemini-2.0-flash", repo_languages: List[str] = None, api_key: str = None):
-        """Initialize LLM with credentials"""
-        if api_key and user_choice:
+    def __init__(self, credentials_json: str = None, user_choice: str = "google", model: str = "gemini-2.0-flash", repo_languages: List[str] = None, api_key: str = None, tier_policy: ModelTierPolicy = None, api_keys: Dict[str, str] = None):
+        """Initialize LLM with credentials. With a tier_policy, each request picks its own model tier."""
+        self.tier_policy = tier_policy
+        self.api_keys = api_keys or {user_choice: api_key}
+        self._tier_llms = {}
+
+        if tier_policy:
+            self.llm = self._llm_for_tier(tier_policy.default_tier)
+
+        elif api_key and user_choice:
             print(f"Using {user_choice} model: {model}, cred: {api_key}")
             provider = LLMProviderFactory.create_provider(provider_name=user_choice, api_key=api_key, model=model)
             model_ai = InitModelAI(provider)
@@ -84,6 +101,21 @@ class LLMDiagramGenerator:
         self.languages = repo_languages or []
         self._setup_prompts()
     
+    def _llm_for_tier(self, tier: str):
+        """Lazily build (and reuse) the LLM for a model tier"""
+        if tier not in self._tier_llms:
+            provider = LLMProviderFactory.create_tier_provider(self.tier_policy, tier, self.api_keys)
+            self._tier_llms[tier] = InitModelAI(provider).llm
+        return self._tier_llms[tier]
+
+    def _chain_for(self, prompt, default_chain, diagram_type: str, content: str = None, file_path: str = ""):
+        """Pick the chain for a request, routed to the model tier the policy chooses"""
+        if not self.tier_policy:
+            return default_chain
+        tier = self.tier_policy.tier_for(diagram_type, content, file_path)
+        print(f"  → {diagram_type} [{file_path or '-'}] routed to tier '{tier}' ({self.tier_policy.model_for(tier)[1]})")
+        return prompt | self._llm_for_tier(tier)
+
     def _setup_prompts(self):
         """Setup prompts for diagram generation"""
         self.analysis_prompt = ChatPromptTemplate.from_messages([
@@ -154,12 +186,12 @@ class LLMDiagramGenerator:
         self.analysis_chain = self.analysis_prompt | self.llm
         self.structure_chain = self.structure_prompt | self.llm
     
-    def generate_class_diagram(self, file_path: str, code_content: str) -> DiagramResult:
-        """Generate class diagram for a single file"""
+    def generate_class_diagram(self, file_path: str, code_content: str, truncated: bool = False) -> DiagramResult:
+        """Generate class diagram for a single file; truncated marks content that is only a prefix of the file"""
         try:
 
-            max_chars = 15000
-            if len(code_content) > max_chars:
+            max_chars = CLASS_DIAGRAM_MAX_CHARS
+            if truncated or len(code_content) > max_chars:
                 code_content = code_content[:max_chars] + "\n\n... (truncated)"
             
             messages = [
@@ -182,16 +214,19 @@ class LLMDiagramGenerator:
                 }
             ]
             
-            response = self.analysis_chain.invoke({"messages": messages})
+            chain = self._chain_for(self.analysis_prompt, self.analysis_chain, "class", code_content, file_path)
+            response = chain.invoke({"messages": messages})
             
             mermaid_code = self._extract_mermaid_code(response.content)
             description = self._extract_description(response.content)
+            usage = getattr(response, "usage_metadata", None) or {}
             
             return DiagramResult(
                 mermaid_code=mermaid_code,
                 description=description,
                 file_path=file_path,
-                success=True
+                success=True,
+                tokens=usage.get("total_tokens")
             )
             
         except Exception as e:
@@ -203,34 +238,10 @@ class LLMDiagramGenerator:
                 error=str(e)
             )
     
-    def generate_repository_structure(self, file_list: List[str]) -> DiagramResult:
-        """Generate overall repository structure diagram"""
+    def generate_repository_structure(self, file_list: List[str], file_sizes: Dict[str, int] = None, annotate: bool = None) -> DiagramResult:
+        """Render the repository structure diagram locally; the LLM optionally annotates it with a description"""
         try:
-        
-            structure_summary = self._summarize_structure(file_list)
-            
-            messages = [
-                {
-                    "role": "user",
-                    "content": f"""Create a Mermaid graph diagram showing the structure of this repository.
-
-                    Repository structure:
-                    {structure_summary}
-
-                    Create a clear, hierarchical diagram showing directories and their key files."""
-                }
-            ]
-            
-            response = self.structure_chain.invoke({"messages": messages})
-            mermaid_code = self._extract_mermaid_code(response.content)
-            
-            return DiagramResult(
-                mermaid_code=mermaid_code,
-                description="Repository structure diagram",
-                file_path="repository_structure",
-                success=True
-            )
-            
+            mermaid_code = render_structure_diagram(file_list, file_sizes, max_depth=STRUCTURE_MAX_DEPTH)
         except Exception as e:
             return DiagramResult(
                 mermaid_code="",
@@ -239,6 +250,38 @@ class LLMDiagramGenerator:
                 success=False,
                 error=str(e)
             )
+
+        description = "Repository structure diagram"
+        if STRUCTURE_LLM_ANNOTATE if annotate is None else annotate:
+            try:
+                structure_summary = self._summarize_structure(file_list, file_sizes)
+                messages = [
+                    {
+                        "role": "user",
+                        "content": f"""Here is the structure diagram of this repository:
+
+                        ```mermaid
+                        {mermaid_code}
+                        ```
+
+                        Repository structure:
+                        {structure_summary}
+
+                        Do NOT return a diagram. Describe in one short paragraph what each top-level area of the repository is for."""
+                    }
+                ]
+                chain = self._chain_for(self.structure_prompt, self.structure_chain, "structure", structure_summary)
+                response = chain.invoke({"messages": messages})
+                description = self._extract_description(response.content) if "```" in response.content else response.content.strip()
+            except Exception as e:
+                print(f"Structure annotation failed, keeping the plain diagram: {e}")
+
+        return DiagramResult(
+            mermaid_code=mermaid_code,
+            description=description,
+            file_path="repository_structure",
+            success=True
+        )
     
     def generate_multi_file_diagram(self, files: List[Tuple[str, str]]) -> DiagramResult:
         """Generate diagram showing relationships across multiple files"""
@@ -269,7 +312,8 @@ class LLMDiagramGenerator:
                 }
             ]
             
-            response = self.analysis_chain.invoke({"messages": messages})
+            chain = self._chain_for(self.analysis_prompt, self.analysis_chain, "multi_file", combined)
+            response = chain.invoke({"messages": messages})
             mermaid_code = self._extract_mermaid_code(response.content)
             description = self._extract_description(response.content)
             
@@ -309,29 +353,9 @@ class LLMDiagramGenerator:
             return parts[-1].strip()
         return "No description provided"
     
-    def _summarize_structure(self, file_list: List[str]) -> str:
-        """Summarize repository structure"""
-        from collections import defaultdict
-        
-        structure = defaultdict(list)
-        for file_path in file_list:
-            parts = file_path.split('/')
-            if len(parts) > 1:
-                directory = '/'.join(parts[:-1])
-                filename = parts[-1]
-                structure[directory].append(filename)
-            else:
-                structure['root'].append(file_path)
-        
-        summary = []
-        for directory, files in sorted(structure.items()):
-            summary.append(f"\n{directory}/")
-            for file in sorted(files)[:10]: 
-                summary.append(f"  - {file}")
-            if len(files) > 10:
-                summary.append(f"  ... ({len(files) - 10} more files)")
-        
-        return "\n".join(summary)
+    def _summarize_structure(self, file_list: List[str], file_sizes: Dict[str, int] = None) -> str:
+        """Summarize repository structure hierarchically, within STRUCTURE_TOKEN_BUDGET tokens"""
+        return summarize_structure(file_list, file_sizes, token_budget=STRUCTURE_TOKEN_BUDGET)
 
 
 class DiagramExporter:
@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from job_budget import CHARS_PER_TOKEN
+
+ACCEPT = "accept"
+DEFER = "defer"
+REJECT = "reject"
+
+# Bytes of each language that end up costing what a byte of ordinary source does. Markup,
+# styles and notebooks rank low and are mostly cut or skipped, so they count for less.
+LANGUAGE_WEIGHTS = {
+    "HTML": 0.3, "CSS": 0.3, "SCSS": 0.3, "Less": 0.3, "Sass": 0.3,
+    "Jupyter Notebook": 0.1, "TeX": 0.2, "Roff": 0.1, "Makefile": 0.5, "Dockerfile": 0.5,
+}
+AVERAGE_FILE_BYTES = 6 * 1024
+
+
+@dataclass
+class JobEstimate:
+    """What a job is expected to cost before it runs."""
+    tokens: int
+    github_requests: int
+    seconds: float
+    files: int
+
+
+@dataclass
+class Decision:
+    """Admission outcome: accepted (possibly deferred by start_in seconds) or rejected with an HTTP status."""
+    action: str
+    status: int = 202
+    eta_seconds: float = 0.0
+    start_in: float = 0.0
+    retry_after: float = 0.0
+    reason: str = ""
+
+
+class CostModel:
+    """
+    Estimates a job from a repository profile (see SetUpGithub.get_profile): the file
+    count comes from the last tree listing when there is one, else from the language
+    byte counts; the language mix decides how much of that is code the ranking stage
+    fetches and the prompt carries. Token and time figures are capped by the job's budget.
+    """
+
+    def __init__(self, prompt_char_limit: int, fixed_tokens: int, llm_calls: int = 2, llm_call_seconds: float = 30.0,
+                 blobs_per_request: int = 25, seconds_per_request: float = 0.5, default_code_bytes: int = 1024 * 1024):
+        self.prompt_char_limit = prompt_char_limit
+        self.fixed_tokens = fixed_tokens
+        self.llm_calls = llm_calls
+        self.llm_call_seconds = llm_call_seconds
+        self.blobs_per_request = max(blobs_per_request, 1)
+        self.seconds_per_request = seconds_per_request
+        self.default_code_bytes = default_code_bytes
+
+    def estimate(self, profile: Optional[dict], technical: bool, budget=None) -> JobEstimate:
+        """profile None (it could not be fetched) is estimated as a repository of default_code_bytes."""
+        languages = (profile or {}).get("languages") or {}
+        total_bytes = sum(languages.values()) or self.default_code_bytes
+        code_bytes = sum(size * LANGUAGE_WEIGHTS.get(name, 1.0) for name, size in languages.items()) if languages else total_bytes
+        file_sizes = (profile or {}).get("file_sizes")
+        files = len(file_sizes) if file_sizes is not None else math.ceil(total_bytes / AVERAGE_FILE_BYTES)
+
+        # Repository, languages, branch head and tree listings, plus (technical docs) one batched
+        # query per group of code files the ranking reads.
+        requests = 5
+        tokens = self.fixed_tokens
+        if technical:
+            code_files = math.ceil(files * code_bytes / total_bytes)
+            requests += math.ceil(code_files / self.blobs_per_request)
+            tokens += int(min(code_bytes, self.prompt_char_limit) // CHARS_PER_TOKEN)
+        seconds = requests * self.seconds_per_request + self.llm_calls * self.llm_call_seconds
+
+        if budget is not None:
+            if budget.max_tokens is not None:
+                tokens = min(tokens, budget.max_tokens)
+            if budget.deadline_seconds is not None:
+                seconds = min(seconds, budget.deadline_seconds)
+        return JobEstimate(tokens=tokens, github_requests=requests, seconds=round(seconds, 1), files=files)
+
+
+class AdmissionController:
+    """
+    Decides, when a job is submitted, whether it can be served in reasonable time:
+    - rejected with 503 while a backend is down, the queue is full, or the work already
+      queued would take the workers longer than max_backlog_seconds to get through;
+    - deferred (accepted, but started later) when the GitHub token or the LLM token rate
+      cannot cover it yet and will within max_defer_seconds, rejected with 429 otherwise;
+    - accepted otherwise, with an ETA from the queued work and its own estimate.
+    Estimates are scaled by how long finished jobs actually took compared to theirs.
+    """
+
+    def __init__(self, workers: int, max_backlog_seconds: float = 900.0, max_jobs: int = 100,
+                 llm_tokens_per_minute: int = 0, max_defer_seconds: float = 300.0):
+        self.workers = max(workers, 1)
+        self.max_backlog_seconds = max_backlog_seconds
+        self.max_jobs = max_jobs
+        self.llm_tokens_per_minute = llm_tokens_per_minute
+        self.max_defer_seconds = max_defer_seconds
+        # Actual / estimated duration of finished jobs, smoothed.
+        self.correction = 1.0
+        self._jobs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def _remaining(self, job: dict, now: float) -> float:
+        expected = job["estimate"].seconds * self.correction
+        return max(expected - (now - job["started"]), 1.0) if job["started"] else expected
+
+    def _backlog_seconds(self, now: float) -> float:
+        return sum(self._remaining(job, now) for job in self._jobs.values()) / self.workers
+
+    def admit(self, job_id: str, estimate: JobEstimate, github_headroom: Tuple[Optional[int], float] = (None, 0.0),
+              unavailable: Optional[Tuple[str, float]] = None) -> Decision:
+        """
+        Decision for a job and, unless it is rejected, its place in the books.
+        github_headroom is (requests left, seconds to reset) for the job's token;
+        unavailable is (backend, retry_after) for a backend that is down.
+        """
+        with self._lock:
+            now = time.monotonic()
+            decision = self._decide(estimate, github_headroom, unavailable, now)
+            if decision.action != REJECT:
+                self._jobs[job_id] = {"estimate": estimate, "started": None}
+        return decision
+
+    def _decide(self, estimate: JobEstimate, github_headroom, unavailable, now: float) -> Decision:
+        if unavailable:
+            backend, retry_after = unavailable
+            return Decision(REJECT, 503, retry_after=max(retry_after, 1.0), reason=f"{backend} is unavailable")
+
+        backlog = self._backlog_seconds(now)
+        if len(self._jobs) >= self.max_jobs:
+            return Decision(REJECT, 503, retry_after=max(backlog / len(self._jobs), 1.0), reason="Too many jobs queued")
+        if backlog > self.max_backlog_seconds:
+            return Decision(REJECT, 503, retry_after=backlog - self.max_backlog_seconds, reason="Job queue is saturated")
+
+        start_in = 0.0
+        available, reset_in = github_headroom
+        if available is not None and available < estimate.github_requests:
+            if reset_in > self.max_defer_seconds:
+                return Decision(REJECT, 429, retry_after=reset_in, reason="GitHub rate limit of this token is exhausted")
+            start_in = reset_in
+
+        if self.llm_tokens_per_minute:
+            # The provider gets through llm_tokens_per_minute; this job's tokens come after everything queued.
+            queued_tokens = sum(job["estimate"].tokens for job in self._jobs.values())
+            quota_eta = (queued_tokens + estimate.tokens) / self.llm_tokens_per_minute * 60
+            wait = quota_eta - backlog - estimate.seconds * self.correction
+            if wait > self.max_defer_seconds:
+                return Decision(REJECT, 429, retry_after=wait - self.max_defer_seconds, reason="LLM token quota is saturated")
+            start_in = max(start_in, wait)
+
+        eta = start_in + backlog + estimate.seconds * self.correction
+        if start_in > 0:
+            return Decision(DEFER, 202, eta_seconds=eta, start_in=start_in, reason="Waiting for quota")
+        return Decision(ACCEPT, 202, eta_seconds=eta)
+
+    def started(self, job_id: str):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id]["started"] = time.monotonic()
+
+    def finished(self, job_id: str):
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+            if job and job["started"] and job["estimate"].seconds > 0:
+                ratio = (time.monotonic() - job["started"]) / job["estimate"].seconds
+                self.correction = min(max(0.8 * self.correction + 0.2 * ratio, 0.1), 10.0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "jobs": len(self._jobs),
+                "running": sum(1 for job in self._jobs.values() if job["started"]),
+                "backlog_seconds": round(self._backlog_seconds(now), 1),
+                "queued_tokens": sum(job["estimate"].tokens for job in self._jobs.values()),
+                "estimate_correction": round(self.correction, 2),
+            }
@@ -3,16 +3,30 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from google.oauth2 import service_account
 import json
 import os
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Union
 from dataclasses import dataclass
 from dotenv import load_dotenv
 from pathlib import Path
 from ai_models_connection.llm_provider import LLMProviderFactory
 from ai_models_connection.main import InitModelAI
+from ai_models_connection.tiering import ModelTierPolicy
+from structure_summary import render_structure_diagram, summarize_structure
+from doc_memo import DocumentationMemo
+from path_index import ROOT, PathIndex
+from circuit_breaker import CircuitOpenError, breakers
+from ai_models_connection.router import is_retryable_error
+from job_budget import JobBudget, tokens_used
 
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path, override=True)
 
+STRUCTURE_TOKEN_BUDGET = int(os.getenv("STRUCTURE_TOKEN_BUDGET", "3000"))
+# The structure diagram is rendered locally; the LLM only writes its description when enabled.
+STRUCTURE_LLM_ANNOTATE = os.getenv("STRUCTURE_LLM_ANNOTATE", "false").lower() == "true"
+STRUCTURE_MAX_DEPTH = int(os.getenv("STRUCTURE_MAX_DEPTH", "3"))
+# Source files are cut to this many characters in the class-diagram prompt.
+CLASS_DIAGRAM_MAX_CHARS = 15000
+
 private_key = os.getenv("PRIVATE_KEY").replace("\\n", "\n") 
 
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
@@ -58,6 +72,8 @@ json_string = """
     universe_domain=universe_domain
 )
 
+llm_breaker = breakers.get("llm", is_failure=is_retryable_error)
+
 @dataclass
 class DiagramResult:
     """Store diagram generation results"""
@@ -66,14 +82,41 @@ class DiagramResult:
     file_path: str
     success: bool = True
     error: str = None
+    # Produced by a cheaper fallback because the job's budget ran out.
+    degraded: bool = False
 
 
 class LLM:
     """Generate code diagrams using Google Gemini LLM"""
     
-    def __init__(self, credentials_json: str = None, user_choice: str = "google", model: str = "gemini-2.0-flash", repo_languages: List[str] = None, api_key: str = None):
-        """Initialize LLM with credentials"""
-        if api_key and user_choice:
+    def __init__(self, credentials_json: str = None, user_choice: str = "google", model: str = "gemini-2.0-flash", repo_languages: List[str] = None, api_key: str = None, provider_pool: List[Tuple[str, str, str]] = None, hedge: bool = False, tier_policy: ModelTierPolicy = None, api_keys: Dict[str, str] = None, doc_memo: DocumentationMemo = None, budget: JobBudget = None):
+        """Initialize LLM with credentials.
+
+        provider_pool is an ordered list of (provider_name, model, api_key); when given, calls
+        fail over between them on 429/5xx and can be hedged across the first two.
+        With a tier_policy, every request picks its model tier (see _chain_for) and
+        provider_pool becomes the fallback list shared by all tiers.
+        A doc_memo lets generate_documentation reuse text written for the same diagram.
+        With a budget, every call is charged against it and none is made once it is spent.
+        """
+        self.tier_policy = tier_policy
+        self.budget = budget
+        self.doc_memo = doc_memo
+        self.api_keys = api_keys or {}
+        self.fallback_pool = provider_pool or []
+        self.hedge = hedge
+        self._tier_llms = {}
+
+        if tier_policy:
+            self.llm = self._llm_for_tier(tier_policy.default_tier)
+
+        elif provider_pool:
+            print(f"Using provider pool: {[f'{name}:{pool_model}' for name, pool_model, _ in provider_pool]} (hedge={hedge})")
+            provider = LLMProviderFactory.create_router(pool=provider_pool, hedge=hedge)
+            model_ai = InitModelAI(provider)
+            self.llm = model_ai.llm
+
+        elif api_key and user_choice:
             print(f"Using {user_choice} model: {model}, cred: {api_key}")
             provider = LLMProviderFactory.create_provider(provider_name=user_choice, api_key=api_key, model=model)
             model_ai = InitModelAI(provider)
@@ -88,32 +131,64 @@ class LLM:
         self.languages = repo_languages or []
         self._setup_prompts()
 
-    def detect_framework(self, file_paths: List[str]) -> str:
+    def _llm_for_tier(self, tier: str):
+        """Lazily build (and reuse) the LLM for a model tier"""
+        if tier not in self._tier_llms:
+            provider = LLMProviderFactory.create_tier_provider(self.tier_policy, tier, self.api_keys, fallbacks=self.fallback_pool, hedge=self.hedge)
+            self._tier_llms[tier] = InitModelAI(provider).llm
+        return self._tier_llms[tier]
+
+    def _invoke(self, chain, payload):
+        """
+        Invokes a chain through the shared "llm" circuit breaker. Failover between providers
+        happens inside the chain; the breaker only sees calls that every provider failed
+        (429/5xx/timeouts), and once open it fails calls at once instead of waiting them out.
+        The call is charged to the job's budget, if any, and not waited on past its deadline.
+        """
+        if not self.budget:
+            return llm_breaker.call(chain.invoke, payload)
+        self.budget.check()
+        response = self.budget.within_deadline(llm_breaker.call, chain.invoke, payload)
+        self.budget.charge(tokens_used(payload, response))
+        return response
+
+    def _chain_for(self, prompt, default_chain, diagram_type: str, content: str = None, file_path: str = ""):
+        """Pick the chain for a request, routed to the model tier the policy chooses"""
+        if not self.tier_policy:
+            return default_chain
+        tier = self.tier_policy.tier_for(diagram_type, content, file_path)
+        print(f"  → {diagram_type} [{file_path or '-'}] routed to tier '{tier}' ({self.tier_policy.model_for(tier)[1]})")
+        return prompt | self._llm_for_tier(tier)
+
+    def detect_framework(self, file_paths: Union[List[str], PathIndex]) -> str:
         """
         Analyzes file list to determine the primary framework.
+        Marker files are looked up at the repository root, case-insensitively.
         """
-        files_set = set(f.lower() for f in file_paths)
+        index = PathIndex.of(file_paths)
+        def has(*names):
+            return any(index.child(ROOT, name, ignore_case=True) is not None for name in names)
         
         # PHP / Laravel
-        if 'artisan' in files_set and 'composer.json' in files_set:
+        if has('artisan') and has('composer.json'):
             return "Laravel"
         
         # JS / Frontend frameworks
-        if 'package.json' in files_set:
+        if has('package.json'):
             # In a real scenario, we'd read package.json, but simplified check:
-            if 'next.config.js' in files_set or 'next.config.ts' in files_set:
+            if has('next.config.js', 'next.config.ts'):
                 return "Next.js"
-            if 'angular.json' in files_set:
+            if has('angular.json'):
                 return "Angular"
-            if any(f.endswith('.jsx') or f.endswith('.tsx') for f in files_set):
+            if index.count_extension('.jsx', '.tsx'):
                 return "React"
-            if 'vue.config.js' in files_set:
+            if has('vue.config.js'):
                 return "Vue.js"
                 
         # Python
-        if 'manage.py' in files_set:
+        if has('manage.py'):
             return "Django"
-        if 'app.py' in files_set or 'wsgi.py' in files_set:
+        if has('app.py', 'wsgi.py'):
             return "Flask/FastAPI"
             
         return "Generic " + (self.languages[0] if self.languages else "Code")
@@ -275,12 +350,12 @@ class LLM:
         self.analysis_chain = self.analysis_prompt | self.llm
         self.structure_chain = self.structure_prompt | self.llm
     
-    def generate_class_diagram(self, file_path: str, code_content: str) -> DiagramResult:
-        """Generate class diagram for a single file"""
+    def generate_class_diagram(self, file_path: str, code_content: str, truncated: bool = False) -> DiagramResult:
+        """Generate class diagram for a single file; truncated marks content that is only a prefix of the file"""
         try:
 
-            max_chars = 15000
-            if len(code_content) > max_chars:
+            max_chars = CLASS_DIAGRAM_MAX_CHARS
+            if truncated or len(code_content) > max_chars:
                 code_content = code_content[:max_chars] + "\n\n... (truncated)"
             
             messages = [
@@ -303,7 +378,8 @@ class LLM:
                 }
             ]
             
-            response = self.analysis_chain.invoke({"messages": messages})
+            chain = self._chain_for(self.analysis_prompt, self.analysis_chain, "class", code_content, file_path)
+            response = self._invoke(chain, {"messages": messages})
             
             mermaid_code = self._extract_mermaid_code(response.content)
             description = self._extract_description(response.content)
@@ -315,6 +391,9 @@ class LLM:
                 success=True
             )
             
+        except CircuitOpenError:
+            # The job fails fast with a retry hint instead of carrying an error result.
+            raise
         except Exception as e:
             return DiagramResult(
                 mermaid_code="",
@@ -339,7 +418,8 @@ class LLM:
                 }
             ]
             
-            response = self.high_level_chain.invoke({
+            chain = self._chain_for(self.high_level_prompt, self.high_level_chain, "high_level", file_summary)
+            response = self._invoke(chain, {
                 "messages": messages, 
                 "framework": framework
             })
@@ -352,10 +432,12 @@ class LLM:
                 file_path="architecture_overview",
                 success=True
             )
+        except CircuitOpenError:
+            raise
         except Exception as e:
             return DiagramResult("", "", "", False, str(e))
         
-    def generate_technical_architecture(self, framework: str, file_list: List[str], key_file_contents: str) -> DiagramResult:
+    def generate_technical_architecture(self, framework: str, file_list: Union[List[str], PathIndex], key_file_contents: str) -> DiagramResult:
         """Generates a detailed class/ERD diagram for developers"""
         try:
             messages = [
@@ -373,7 +455,8 @@ class LLM:
                 }
             ]
             
-            response = self.technical_chain.invoke({
+            chain = self._chain_for(self.technical_prompt, self.technical_chain, "technical", key_file_contents)
+            response = self._invoke(chain, {
                 "messages": messages, 
                 "framework": framework
             })
@@ -386,37 +469,15 @@ class LLM:
                 file_path="technical_architecture",
                 success=True
             )
+        except CircuitOpenError:
+            raise
         except Exception as e:
             return DiagramResult("", "", "", False, str(e))
 
-    def generate_repository_structure(self, file_list: List[str]) -> DiagramResult:
-        """Generate overall repository structure diagram"""
+    def generate_repository_structure(self, file_list: List[str], file_sizes: Dict[str, int] = None, annotate: bool = None) -> DiagramResult:
+        """Render the repository structure diagram locally; the LLM optionally annotates it with a description"""
         try:
-        
-            structure_summary = self._summarize_structure(file_list)
-            
-            messages = [
-                {
-                    "role": "user",
-                    "content": f"""Create a Mermaid graph diagram showing the structure of this repository.
-
-                    Repository structure:
-                    {structure_summary}
-
-                    Create a clear, hierarchical diagram showing directories and their key files."""
-                }
-            ]
-            
-            response = self.structure_chain.invoke({"messages": messages})
-            mermaid_code = self._extract_mermaid_code(response.content)
-            
-            return DiagramResult(
-                mermaid_code=mermaid_code,
-                description="Repository structure diagram",
-                file_path="repository_structure",
-                success=True
-            )
-            
+            mermaid_code = render_structure_diagram(file_list, file_sizes, max_depth=STRUCTURE_MAX_DEPTH)
         except Exception as e:
             return DiagramResult(
                 mermaid_code="",
@@ -425,6 +486,38 @@ class LLM:
                 success=False,
                 error=str(e)
             )
+
+        description = "Repository structure diagram"
+        if STRUCTURE_LLM_ANNOTATE if annotate is None else annotate:
+            try:
+                structure_summary = self._summarize_structure(file_list, file_sizes)
+                messages = [
+                    {
+                        "role": "user",
+                        "content": f"""Here is the structure diagram of this repository:
+
+                        ```mermaid
+                        {mermaid_code}
+                        ```
+
+                        Repository structure:
+                        {structure_summary}
+
+                        Do NOT return a diagram. Describe in one short paragraph what each top-level area of the repository is for."""
+                    }
+                ]
+                chain = self._chain_for(self.structure_prompt, self.structure_chain, "structure", structure_summary)
+                response = self._invoke(chain, {"messages": messages})
+                description = self._extract_description(response.content) if "```" in response.content else response.content.strip()
+            except Exception as e:
+                print(f"Structure annotation failed, keeping the plain diagram: {e}")
+
+        return DiagramResult(
+            mermaid_code=mermaid_code,
+            description=description,
+            file_path="repository_structure",
+            success=True
+        )
     
     def generate_multi_file_diagram(self, files: List[Tuple[str, str]]) -> DiagramResult:
         """Generate diagram showing relationships across multiple files"""
@@ -455,7 +548,8 @@ class LLM:
                 }
             ]
             
-            response = self.analysis_chain.invoke({"messages": messages})
+            chain = self._chain_for(self.analysis_prompt, self.analysis_chain, "multi_file", combined)
+            response = self._invoke(chain, {"messages": messages})
             mermaid_code = self._extract_mermaid_code(response.content)
             description = self._extract_description(response.content)
             
@@ -466,6 +560,8 @@ class LLM:
                 success=True
             )
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             return DiagramResult(
                 mermaid_code="",
@@ -475,8 +571,14 @@ class LLM:
                 error=str(e)
             )
         
-    def generate_documentation(self, diagram_result: DiagramResult) -> str:
-        """Generate documentation from a diagram"""
+    def generate_documentation(self, diagram_result: DiagramResult, scope: str = "") -> str:
+        """Generate documentation from a diagram, reusing memoized text for the same (or nearly the same) diagram"""
+        if self.doc_memo:
+            memoized = self.doc_memo.lookup(diagram_result.mermaid_code, scope)
+            if memoized is not None:
+                print(f"  → documentation [{scope or '-'}] served from memo")
+                return memoized
+
         try:
             messages = [
                 {
@@ -491,9 +593,14 @@ class LLM:
                 }
             ]
             
-            response = self.documentation_chain.invoke({"messages": messages})
+            chain = self._chain_for(self.documentation_prompt, self.documentation_chain, "documentation", diagram_result.mermaid_code)
+            response = self._invoke(chain, {"messages": messages})
+            if self.doc_memo:
+                self.doc_memo.store(diagram_result.mermaid_code, response.content, scope)
             return response.content
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             return f"Error generating documentation: {str(e)}"
     
@@ -517,29 +624,9 @@ class LLM:
             return parts[-1].strip()
         return "No description provided"
     
-    def _summarize_structure(self, file_list: List[str]) -> str:
-        """Summarize repository structure"""
-        from collections import defaultdict
-        
-        structure = defaultdict(list)
-        for file_path in file_list:
-            parts = file_path.split('/')
-            if len(parts) > 1:
-                directory = '/'.join(parts[:-1])
-                filename = parts[-1]
-                structure[directory].append(filename)
-            else:
-                structure['root'].append(file_path)
-        
-        summary = []
-        for directory, files in sorted(structure.items()):
-            summary.append(f"\n{directory}/")
-            for file in sorted(files)[:10]: 
-                summary.append(f"  - {file}")
-            if len(files) > 10:
-                summary.append(f"  ... ({len(files) - 10} more files)")
-        
-        return "\n".join(summary)
+    def _summarize_structure(self, file_list: Union[List[str], PathIndex], file_sizes: Dict[str, int] = None) -> str:
+        """Summarize repository structure hierarchically, within STRUCTURE_TOKEN_BUDGET tokens"""
+        return summarize_structure(file_list, file_sizes, token_budget=STRUCTURE_TOKEN_BUDGET)
 
 
 class DiagramExporter:
@@ -2,9 +2,10 @@ from langchain_anthropic import ChatAnthropic
 from ai_models_connection.ai_provider import BaseLLMProvider
 
 class ClaudeProvider(BaseLLMProvider):
-    def __init__(self, api_key: str, model: str = "claude-3-5-sonnet-20240620"):
+    def __init__(self, api_key: str, model: str = "claude-3-5-sonnet-20240620", temperature: float = 0):
         self.api_key = api_key
         self.model = model
+        self.temperature = temperature
 
     def get_llm(self):
-        return ChatAnthropic(model=self.model, api_key=self.api_key)
+        return ChatAnthropic(model=self.model, api_key=self.api_key, temperature=self.temperature)
@@ -1,9 +1,11 @@
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 import json
 from ai_models_connection.ai_provider import BaseLLMProvider
 from ai_models_connection.openai import OpenAIProvider
 from ai_models_connection.claude import ClaudeProvider
 from ai_models_connection.google import GoogleProvider
+from ai_models_connection.router import ProviderRouter
+from ai_models_connection.tiering import ModelTierPolicy
 
 
 class LLMProviderFactory:
@@ -32,3 +34,18 @@ class LLMProviderFactory:
 
         else:
             raise ValueError(f"Unsupported provider '{provider_name}'")
+
+    @staticmethod
+    def create_router(pool: List[Tuple[str, str, str]], hedge: bool = False, temperature = 0) -> ProviderRouter:
+        """Build a failover router from an ordered list of (provider_name, model, api_key)."""
+        providers = [
+            LLMProviderFactory.create_provider(provider_name=name, api_key=api_key, model=model, temperature=temperature)
+            for name, model, api_key in pool
+        ]
+        return ProviderRouter(providers, hedge=hedge)
+
+    @staticmethod
+    def create_tier_provider(policy: ModelTierPolicy, tier: str, api_keys: Dict[str, str], fallbacks: List[Tuple[str, str, str]] = None, hedge: bool = False, temperature = 0) -> ProviderRouter:
+        """Build the provider for a model tier: the tier's model first, then the shared fallbacks."""
+        pool = policy.pool_for(tier, api_keys, fallbacks)
+        return LLMProviderFactory.create_router(pool=pool, hedge=hedge, temperature=temperature)
@@ -2,9 +2,10 @@ from langchain.chat_models import ChatOpenAI
 from ai_models_connection.ai_provider import BaseLLMProvider
 
 class OpenAIProvider(BaseLLMProvider):
-    def __init__(self, api_key: str, model: str = "gpt-4"):
+    def __init__(self, api_key: str, model: str = "gpt-4", temperature: float = 0):
         self.api_key = api_key
         self.model = model
+        self.temperature = temperature
 
     def get_llm(self):
-        return ChatOpenAI(model_name=self.model, openai_api_key=self.api_key)
+        return ChatOpenAI(model_name=self.model, openai_api_key=self.api_key, temperature=self.temperature)
@@ -0,0 +1,85 @@
+"""
+Memory and latency of PathIndex against the plain list/set/dict path handling it replaced.
+
+    python bench_path_index.py --paths 1000000
+
+Paths are synthetic (a monorepo-like tree with hot and cold directories); the "list"
+column reproduces the previous helpers: a list of path strings, the lowercased set of
+detect_framework, a dict-of-lists directory tree, and the substring scans of sort_priority.
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+from path_index import ROOT, PathIndex
+from structure_summary import summarize_structure
+
+PATTERNS = ["app/Models", "database/migrations", "app/Http/Controllers", "routes"]
+TOP = ["services", "packages", "apps", "libs", "tools", "docs", "tests", "vendor", "app", "routes"]
+MIDDLE = ["src", "lib", "components", "models", "Http", "Controllers", "Models", "utils", "api", "migrations", "fixtures"]
+EXTENSIONS = [".py", ".ts", ".tsx", ".js", ".php", ".go", ".md", ".json", ".css", ""]
+
+
+def synthetic_paths(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    paths, sizes = [], []
+    for i in range(count):
+        parts = [rng.choice(TOP), f"pkg{rng.randint(0, 400)}"]
+        parts += [rng.choice(MIDDLE) for _ in range(rng.randint(0, 4))]
+        parts.append(f"file_{i}{rng.choice(EXTENSIONS)}")
+        paths.append("/".join(parts))
+        sizes.append(rng.randint(100, 50000))
+    return paths, sizes
+
+
+def measure(label, func):
+    """Times an untraced run (tracemalloc slows allocation-heavy code a lot), then measures a traced one."""
+    gc.collect()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<44} {elapsed * 1000:>10.1f} ms {current / 2**20:>10.1f} MB {peak / 2**20:>10.1f} MB")
+    return result
+
+
+def legacy_tree(paths):
+    tree = defaultdict(list)
+    for path in paths:
+        directory, _, name = path.rpartition("/")
+        tree[directory].append(name)
+    return tree
+
+
+def main(count: int):
+    paths, sizes = synthetic_paths(count)
+    print(f"{count} paths\n")
+    print(f"{'':<44} {'time':>13} {'retained':>13} {'peak':>13}")
+
+    measure("list: file_paths list", lambda: [p for p in paths])
+    files_set = measure("list: detect_framework lowercased set", lambda: set(p.lower() for p in paths))
+    measure("list: detect_framework lookups", lambda: ("artisan" in files_set, any(p.endswith((".jsx", ".tsx")) for p in files_set)))
+    measure("list: directory tree (defaultdict)", lambda: legacy_tree(paths))
+    measure("list: sort_priority substring scan", lambda: [0 if any(p in path for p in PATTERNS) else 1 for path in paths])
+    del files_set
+    print()
+
+    index = measure("index: build", lambda: PathIndex.build(paths, sizes))
+    print(f"{'index: arrays + interned segments':<44} {'':>13} {index.memory_bytes() / 2**20:>10.1f} MB")
+    measure("index: detect_framework lookups", lambda: (index.child(ROOT, "artisan", ignore_case=True), index.count_extension(".jsx", ".tsx")))
+    measure("index: sort_priority (match_mask)", lambda: index.input_mask(index.match_mask(PATTERNS)))
+    measure("index: prefix query (files under apps/)", lambda: len(index.file_nodes("apps")))
+    measure("index: basename query", lambda: len(index.with_basename("file_123.py")))
+    measure("index: summarize_structure (3000 tokens)", lambda: summarize_structure(index, token_budget=3000))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PathIndex against list-based path handling.")
+    parser.add_argument("--paths", type=int, default=1_000_000)
+    main(parser.parse_args().paths)
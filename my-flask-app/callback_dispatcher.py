@@ -0,0 +1,258 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import requests
+from requests.adapters import HTTPAdapter
+from collections import Counter
+from typing import Dict, List, Set, Tuple
+
+
+def progress_jobs(payload: dict) -> Set[str]:
+    """Jobs whose progress a payload reports (none for a job's result)."""
+    if payload.get("status") == "progress_batch":
+        return {event.get("job_id") for event in payload.get("events", [])}
+    return {payload.get("job_id")} if payload.get("status") == "progress" else set()
+
+
+class CallbackDispatcher:
+    """
+    Delivers job results to the callback URL from background threads, so job workers
+    never block on the receiver. Failed deliveries are retried with exponential backoff
+    and then persisted to a dead-letter directory from which they can be replayed.
+    A job's result is held back until every progress payload of that job queued before
+    it is delivered or dead-lettered, so the receiver never gets progress after a result.
+    Delivery is best-effort: payloads waiting in the queue or for a retry live in memory.
+    close() dead-letters whatever it could not deliver in time, but a crash loses them.
+    """
+
+    def __init__(self, dead_letter_dir: str = "dead_letters", workers: int = 2, timeout: float = 10.0,
+                 max_retries: int = 5, backoff: float = 1.0, max_backoff: float = 60.0,
+                 batch_progress: bool = False, batch_size: int = 20, batch_interval: float = 2.0):
+        self.dead_letter_dir = dead_letter_dir
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.batch_progress = batch_progress
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers * 2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._queue = queue.Queue()
+        self._progress: Dict[str, List[dict]] = {}
+        self._progress_lock = threading.Lock()
+        # Per (callback_url, job_id): progress payloads not yet delivered or dead-lettered,
+        # and the results held back until there are none.
+        self._unsettled = Counter()
+        self._held: Dict[Tuple[str, str], List[dict]] = {}
+        self._order_lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Deliveries waiting out their backoff: timer -> (callback_url, payload, last error).
+        self._retries: Dict[threading.Timer, Tuple[str, dict, str]] = {}
+        self._retries_lock = threading.Lock()
+
+        os.makedirs(self.dead_letter_dir, exist_ok=True)
+
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(workers)]
+        if batch_progress:
+            self._threads.append(threading.Thread(target=self._flush_loop, daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def send(self, callback_url: str, payload: dict):
+        """
+        Queue a payload for delivery and return immediately. A job's buffered progress
+        events are queued first, and its result waits until they are settled.
+        """
+        events = self._take_progress(callback_url, payload.get("job_id")) if self.batch_progress else []
+        if events:
+            self._put(callback_url, {"status": "progress_batch", "events": events})
+        self._put(callback_url, payload)
+
+    def _put(self, callback_url: str, payload: dict):
+        """Queues a new payload; a result with progress of its job still unsettled is held instead."""
+        jobs = progress_jobs(payload)
+        with self._order_lock:
+            key = (callback_url, payload.get("job_id"))
+            if not jobs and self._unsettled[key]:
+                self._held.setdefault(key, []).append(payload)
+                return
+            for job_id in jobs:
+                self._unsettled[(callback_url, job_id)] += 1
+        self._queue.put((callback_url, payload, 0))
+
+    def _settle(self, callback_url: str, payload: dict):
+        """A payload was delivered or dead-lettered: results waiting only on it are queued."""
+        released = []
+        with self._order_lock:
+            for job_id in progress_jobs(payload):
+                key = (callback_url, job_id)
+                self._unsettled[key] -= 1
+                if self._unsettled[key] <= 0:
+                    del self._unsettled[key]
+                    released += self._held.pop(key, [])
+        for held in released:
+            self._queue.put((callback_url, held, 0))
+
+    def _take_progress(self, callback_url: str, job_id) -> List[dict]:
+        with self._progress_lock:
+            events = self._progress.get(callback_url, [])
+            taken = [event for event in events if event["job_id"] == job_id]
+            if taken:
+                self._progress[callback_url] = [event for event in events if event["job_id"] != job_id]
+        return taken
+
+    def send_progress(self, callback_url: str, job_id: str, stage: str, **details):
+        """
+        Report a progress event. With batching enabled, events for the same callback URL
+        are grouped and flushed every batch_interval seconds or batch_size events.
+        """
+        event = {"job_id": job_id, "status": "progress", "stage": stage, "timestamp": time.time(), **details}
+        if not self.batch_progress:
+            self.send(callback_url, event)
+            return
+
+        with self._progress_lock:
+            events = self._progress.setdefault(callback_url, [])
+            events.append(event)
+            if len(events) < self.batch_size:
+                return
+            self._progress[callback_url] = []
+        self._put(callback_url, {"status": "progress_batch", "events": events})
+
+    def flush_progress(self):
+        """Send every buffered progress event now."""
+        with self._progress_lock:
+            pending, self._progress = self._progress, {}
+        for callback_url, events in pending.items():
+            if events:
+                self._put(callback_url, {"status": "progress_batch", "events": events})
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.batch_interval):
+            self.flush_progress()
+
+    def _worker(self):
+        while True:
+            callback_url, payload, attempt = self._queue.get()
+            try:
+                self._deliver(callback_url, payload, attempt)
+            except Exception as e:
+                # Never let one payload take the worker down, nor hold back a result behind it.
+                print(f"[{payload.get('job_id', '-')}] Callback delivery crashed: {e}")
+                self._settle(callback_url, payload)
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, callback_url: str, payload: dict, attempt: int):
+        label = payload.get("job_id", payload.get("status"))
+        try:
+            response = self.session.post(callback_url, json=payload, timeout=self.timeout)
+            if response.status_code < 400:
+                print(f"[{label}] Callback delivered ({response.status_code}).")
+                self._settle(callback_url, payload)
+                return
+            # 4xx other than 408/429 will not get better by retrying.
+            retryable = response.status_code >= 500 or response.status_code in (408, 429)
+            error = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            retryable = True
+            error = str(e)
+
+        if retryable and attempt + 1 < self.max_retries:
+            delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+            print(f"[{label}] Callback failed ({error}), retrying in {delay:.0f}s...")
+            self._retry_later(delay, callback_url, payload, attempt + 1, error)
+            return
+
+        self._dead_letter(callback_url, payload, error)
+
+    def _retry_later(self, delay: float, callback_url: str, payload: dict, attempt: int, error: str):
+        def requeue():
+            with self._retries_lock:
+                if self._retries.pop(timer, None) is None:
+                    return  # close() dead-lettered it already
+            self._queue.put((callback_url, payload, attempt))
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self._retries_lock:
+            self._retries[timer] = (callback_url, payload, error)
+        timer.start()
+
+    def _dead_letter(self, callback_url: str, payload: dict, error: str):
+        """Persist an undeliverable payload; written to a temp file first so a crash never leaves half a record."""
+        try:
+            self._write_dead_letter(callback_url, payload, error)
+        finally:
+            self._settle(callback_url, payload)
+
+    def _write_dead_letter(self, callback_url: str, payload: dict, error: str):
+        name = f"{int(time.time())}_{uuid.uuid4().hex}.json"
+        path = os.path.join(self.dead_letter_dir, name)
+        record = {"callback_url": callback_url, "payload": payload, "error": error, "failed_at": time.time()}
+        try:
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            os.replace(path + ".tmp", path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"[{payload.get('job_id', '-')}] ❌ Callback lost, could not dead-letter it ({error}): {e}")
+            return
+        print(f"[{payload.get('job_id', '-')}] ❌ Callback dead-lettered: {path} ({error})")
+
+    def dead_letters(self) -> List[str]:
+        return sorted(f for f in os.listdir(self.dead_letter_dir) if f.endswith(".json"))
+
+    def replay_dead_letters(self) -> int:
+        """Re-queue every dead-lettered payload. Returns how many were queued."""
+        replayed = 0
+        for name in self.dead_letters():
+            path = os.path.join(self.dead_letter_dir, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    record = json.load(f)
+                os.remove(path)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Skipping dead letter {name}: {e}")
+                continue
+            self.send(record["callback_url"], record["payload"])
+            replayed += 1
+        return replayed
+
+    def close(self, timeout: float = 30.0):
+        """
+        Flush buffered progress and wait (bounded) for queued deliveries. Whatever is still
+        queued or waiting for a retry then is dead-lettered, to be replayed later.
+        """
+        self.flush_progress()
+        self._stopped.set()
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        with self._retries_lock:
+            retries, self._retries = self._retries, {}
+        for timer, (callback_url, payload, error) in retries.items():
+            timer.cancel()
+            self._dead_letter(callback_url, payload, f"not retried before shutdown, last error: {error}")
+        while True:
+            try:
+                callback_url, payload, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._dead_letter(callback_url, payload, "not delivered before shutdown")
+            self._queue.task_done()
+
+        # Results still held behind progress a worker has not finished with.
+        with self._order_lock:
+            held, self._held = self._held, {}
+        for (callback_url, _), payloads in held.items():
+            for payload in payloads:
+                self._write_dead_letter(callback_url, payload, "held behind undelivered progress at shutdown")
@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open."""
+
+    def __init__(self, backend: str, retry_after: float):
+        super().__init__(f"{backend} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Tracks the outcome of calls to one backend over a rolling time window. When at least
+    min_calls happened and the error rate reaches error_rate, the circuit opens and calls
+    fail at once with CircuitOpenError. After open_seconds it goes half-open and lets
+    up to half_open_probes calls through: a success closes it, a failure opens it again
+    for twice as long (up to max_open_seconds).
+    Only errors for which is_failure(error) is true count; a 404 says nothing about health.
+    """
+
+    def __init__(self, name: str, window: float = 60.0, min_calls: int = 10, error_rate: float = 0.5,
+                 open_seconds: float = 30.0, max_open_seconds: float = 600.0, half_open_probes: int = 1,
+                 is_failure: Callable[[BaseException], bool] = None):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_probes = half_open_probes
+        self.is_failure = is_failure or (lambda error: True)
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.open_for = open_seconds
+        self.last_error: Optional[str] = None
+        self._outcomes = deque()  # (timestamp, failed)
+        self._failures = 0
+        self._probes = 0
+        self._changed = threading.Condition()
+
+    def _prune(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            _, failed = self._outcomes.popleft()
+            self._failures -= failed
+
+    def _retry_after(self, now: float) -> float:
+        return max(self.opened_at + self.open_for - now, 0.0)
+
+    def before_call(self):
+        """Admits a call or raises CircuitOpenError."""
+        with self._changed:
+            now = time.monotonic()
+            if self.state == OPEN and now >= self.opened_at + self.open_for:
+                self.state = HALF_OPEN
+                self._probes = 0
+                print(f"Circuit {self.name}: half-open, probing")
+            if self.state == OPEN:
+                raise CircuitOpenError(self.name, self._retry_after(now))
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    raise CircuitOpenError(self.name, 1.0)
+                self._probes += 1
+
+    def record_success(self):
+        with self._changed:
+            now = time.monotonic()
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self.open_for = self.open_seconds
+                self._outcomes.clear()
+                self._failures = 0
+                print(f"Circuit {self.name}: closed")
+                self._changed.notify_all()
+            self._outcomes.append((now, False))
+            self._prune(now)
+
+    def record_failure(self, error: BaseException = None):
+        with self._changed:
+            now = time.monotonic()
+            self.last_error = str(error)[:200] if error else self.last_error
+            if self.state == HALF_OPEN:
+                self._open(now, min(self.open_for * 2, self.max_open_seconds))
+                return
+            self._outcomes.append((now, True))
+            self._failures += 1
+            self._prune(now)
+            calls = len(self._outcomes)
+            if self.state == CLOSED and calls >= self.min_calls and self._failures / calls >= self.error_rate:
+                self._open(now, self.open_seconds)
+
+    def _open(self, now: float, open_for: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.open_for = open_for
+        print(f"Circuit {self.name}: open for {open_for:.0f}s ({self.last_error})")
+
+    def call(self, func: Callable, *args, failed: Callable[[Any], bool] = None, **kwargs):
+        """
+        Runs func through the breaker. Exceptions are recorded (if is_failure) and re-raised;
+        failed(result), if given, marks a returned result as a failure (e.g. an HTTP 503).
+        """
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if self.is_failure(e):
+                self.record_failure(e)
+            else:
+                self.record_success()
+            raise
+        if failed and failed(result):
+            self.record_failure(RuntimeError(f"{self.name} returned {getattr(result, 'status_code', result)}"))
+        else:
+            self.record_success()
+        return result
+
+    def wait_until_available(self, timeout: float) -> bool:
+        """Blocks up to timeout until calls would be admitted again; True if they would."""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while self.state == OPEN:
+                now = time.monotonic()
+                wake_at = min(self.opened_at + self.open_for, deadline)
+                if now >= self.opened_at + self.open_for:
+                    return True
+                if now >= deadline:
+                    return False
+                self._changed.wait(wake_at - now)
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._changed:
+            now = time.monotonic()
+            self._prune(now)
+            calls = len(self._outcomes)
+            return {
+                "state": self.state,
+                "calls": calls,
+                "error_rate": round(self._failures / calls, 3) if calls else 0.0,
+                "retry_after": round(self._retry_after(now), 1) if self.state == OPEN else 0,
+                "last_error": self.last_error,
+            }
+
+
+class BreakerRegistry:
+    """Process-wide breakers by backend name, so every job shares what the others learned."""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._settings: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, **settings):
+        """Settings (window, min_calls, error_rate, open_seconds...) for every breaker, existing or future."""
+        with self._lock:
+            self._settings.update(settings)
+            for breaker in self._breakers.values():
+                for key, value in settings.items():
+                    setattr(breaker, key, value)
+                breaker.open_for = breaker.open_seconds
+
+    def get(self, name: str, is_failure: Callable[[BaseException], bool] = None) -> CircuitBreaker:
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, is_failure=is_failure, **self._settings)
+            return self._breakers[name]
+
+    def wait_for(self, names: Iterable[str], timeout: float = 0.0):
+        """Holds a job up to timeout for the named backends; raises CircuitOpenError if one stays open."""
+        deadline = time.monotonic() + timeout
+        for name in names:
+            breaker = self.get(name)
+            if not breaker.wait_until_available(max(deadline - time.monotonic(), 0.0)):
+                raise CircuitOpenError(name, breaker.snapshot()["retry_after"])
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.snapshot() for name, breaker in sorted(breakers.items())}
+
+
+breakers = BreakerRegistry()
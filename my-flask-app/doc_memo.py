@@ -0,0 +1,137 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+from mermaid_graph import MermaidGraph, parse_mermaid
+
+CHANGES_HEADING = "### Changes since the previous revision"
+CHANGES_SECTION = re.compile(r"\n*" + re.escape(CHANGES_HEADING) + r".*\Z", re.DOTALL)
+
+
+class DocumentationMemo:
+    """
+    Documentation generated for a diagram, keyed by the fingerprint of its normalized
+    Mermaid graph and kept in SQLite across runs. An identical diagram reuses the stored
+    text as is. When only a few edges changed since the last fully generated revision of
+    the same diagram (same scope), that text is reused with a short change note instead
+    of a new LLM call; bigger changes fall through to the LLM.
+    The latest diagram of each scope is kept too, so a new revision that is only
+    cosmetically different can be replaced by the previous one.
+    """
+
+    def __init__(self, path: str = "doc_memo.db", max_patch_edges: int = 3, max_patch_ratio: float = 0.1):
+        self.max_patch_edges = max_patch_edges
+        self.max_patch_ratio = max_patch_ratio
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                fingerprint TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                graph TEXT NOT NULL,
+                docs TEXT NOT NULL,
+                patched INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_scope ON docs(scope, patched, updated_at);
+            CREATE TABLE IF NOT EXISTS diagrams (
+                scope TEXT PRIMARY KEY,
+                mermaid_code TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        self._db.commit()
+
+    def lookup(self, mermaid_code: str, scope: str = "") -> Optional[str]:
+        """Stored or patched documentation for this diagram, or None if it needs a full LLM call."""
+        graph = parse_mermaid(mermaid_code)
+        fingerprint = graph.fingerprint()
+        with self._lock:
+            # Full documentation is shared across scopes; a patched one carries a change note
+            # about its own scope's previous revision, so only that scope gets it back.
+            row = self._db.execute(
+                "SELECT docs FROM docs WHERE fingerprint = ? AND (patched = 0 OR scope = ?)", (fingerprint, scope)
+            ).fetchone()
+            if row:
+                self._db.execute("UPDATE docs SET updated_at = ? WHERE fingerprint = ?", (time.time(), fingerprint))
+                self._db.commit()
+                return row[0]
+            if not scope:
+                return None
+            base = self._db.execute(
+                "SELECT graph, docs FROM docs WHERE scope = ? AND patched = 0 ORDER BY updated_at DESC LIMIT 1",
+                (scope,)
+            ).fetchone()
+        if not base:
+            return None
+
+        previous, current = json.loads(base[0]), _summary(graph)
+        # Only edge-level changes are patched; anything else (other statements, diagram type) needs the LLM.
+        if any(previous.get(key) != current[key] for key in ("kind", "statements", "isolated")):
+            return None
+        old_edges = {tuple(edge) for edge in previous["edges"]}
+        new_edges = {tuple(edge) for edge in current["edges"]}
+        added, removed = sorted(new_edges - old_edges), sorted(old_edges - new_edges)
+        changed = len(added) + len(removed)
+        if changed > self.max_patch_edges or changed > self.max_patch_ratio * max(len(new_edges), 1):
+            return None
+
+        docs = self._patch(base[1], added, removed)
+        self._put(fingerprint, scope, graph, docs, patched=True)
+        return docs
+
+    def store(self, mermaid_code: str, docs: str, scope: str = ""):
+        """Records documentation produced by the LLM as the new base revision of the scope."""
+        graph = parse_mermaid(mermaid_code)
+        self._put(graph.fingerprint(), scope, graph, docs, patched=False)
+
+    def _put(self, fingerprint: str, scope: str, graph: MermaidGraph, docs: str, patched: bool):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO docs (fingerprint, scope, graph, docs, patched, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (fingerprint, scope, json.dumps(_summary(graph)), docs, int(patched), time.time())
+            )
+            self._db.commit()
+
+    def previous_diagram(self, scope: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT mermaid_code FROM diagrams WHERE scope = ?", (scope,)).fetchone()
+        return row[0] if row else None
+
+    def record_diagram(self, scope: str, mermaid_code: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO diagrams (scope, mermaid_code, updated_at) VALUES (?, ?, ?)",
+                (scope, mermaid_code, time.time())
+            )
+            self._db.commit()
+
+    @staticmethod
+    def _patch(docs: str, added, removed) -> str:
+        def describe(edge):
+            source, _, target, label = edge
+            return f"{source} → {target}" + (f" ({label})" if label else "")
+
+        if not added and not removed:
+            return docs
+        lines = ["", "", CHANGES_HEADING, ""]
+        lines += [f"- Added: {describe(edge)}" for edge in added]
+        lines += [f"- Removed: {describe(edge)}" for edge in removed]
+        return CHANGES_SECTION.sub("", docs) + "\n".join(lines) + "\n"
+
+
+def _summary(graph: MermaidGraph) -> dict:
+    """What a later revision is compared against: node ids are replaced by labels."""
+    connected = {node for source, _, target, _ in graph.edges for node in (source, target)}
+    return {
+        "kind": graph.kind,
+        "edges": sorted(graph.labeled_edges()),
+        "statements": sorted(graph.statements),
+        "isolated": sorted(label for node, label in graph.nodes.items() if node not in connected),
+    }
@@ -0,0 +1,242 @@
+import json
+import posixpath
+import re
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+REPO_CONFIG_NAME = ".docgen.json"
+LINGUIST_ATTRIBUTES = ("linguist-generated", "linguist-vendored")
+
+
+def _translate(pattern: str) -> str:
+    """Regex for one gitignore-style glob: * and ? stay within a path component, ** crosses them."""
+    out, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == len(pattern):
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            close = pattern.index("]", i + 2)
+            body = pattern[i + 1:close]
+            out.append("[" + ("^" + body[1:] if body.startswith("!") else body).replace("\\", "\\\\") + "]")
+            i = close + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+
+class Rule:
+    """One compiled pattern line, scoped to the directory of the file it came from."""
+    __slots__ = ("regex", "negate", "dir_only", "source", "pattern")
+
+    def __init__(self, pattern: str, base: str = "", source: str = "", negate: bool = False, dir_only: bool = False):
+        self.pattern = pattern
+        self.source = source
+        self.negate = negate
+        self.dir_only = dir_only
+        body = pattern.rstrip("/")
+        # A pattern with a slash (other than a trailing one) is relative to its file's directory;
+        # without one it matches a name at any depth below that directory.
+        anchored = "/" in body
+        body = body.lstrip("/")
+        prefix = re.escape(base + "/") if base else ""
+        self.regex = prefix + ("" if anchored else "(?:.*/)?") + _translate(body)
+
+    @classmethod
+    def parse(cls, line: str, base: str = "", source: str = "") -> Optional["Rule"]:
+        """A .gitignore line (with ! negation and trailing-/ directory patterns), or None for blanks and comments."""
+        line = line.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            return None
+        negate = line.startswith("!")
+        if negate or line.startswith("\\!") or line.startswith("\\#"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        if not line.strip("/"):
+            return None
+        return cls(line, base, source, negate, dir_only)
+
+    @property
+    def kind(self) -> str:
+        return posixpath.basename(self.source)
+
+    def describe(self) -> str:
+        return f"{self.source}: {'!' if self.negate else ''}{self.pattern}"
+
+
+class _Matcher:
+    """
+    Ordered rules compiled into one alternation, latest rule first, so a single regex
+    match finds the rule that wins (the last one that matches, as in git).
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        if rules:
+            alternatives = [f"(?P<r{i}>{rules[i].regex})" for i in reversed(range(len(rules)))]
+            self._regex = re.compile("|".join(alternatives))
+        else:
+            self._regex = None
+
+    def match(self, path: str) -> Optional[Rule]:
+        if self._regex is None:
+            return None
+        match = self._regex.fullmatch(path)
+        return self.rules[int(match.lastgroup[1:])] if match else None
+
+
+class ExclusionEngine:
+    """
+    Decides which files of a repository tree are worth fetching, before any blob is
+    downloaded, and says why the others were left out. Rules come from (lowest to
+    highest precedence) the built-in ignored directories, every .gitignore in the tree
+    (scoped to its directory, deeper files winning), and the "exclude" list of the
+    repository's .docgen.json. On top of those, files marked linguist-generated or
+    linguist-vendored in .gitattributes and files above max_file_bytes are excluded.
+    """
+
+    def __init__(self, ignore_rules: List[Rule] = None, attribute_rules: Dict[str, List[Rule]] = None,
+                 max_file_bytes: int = None):
+        self.max_file_bytes = max_file_bytes
+        self._ignore_files = _Matcher([rule for rule in ignore_rules or [] if not rule.dir_only])
+        self._ignore_dirs = _Matcher(list(ignore_rules or []))
+        self._attributes = {name: _Matcher(rules) for name, rules in (attribute_rules or {}).items()}
+        self._dir_reasons: Dict[str, Optional[Tuple[str, str]]] = {"": None}
+        self.excluded: Dict[str, str] = {}
+        self._kinds = Counter()
+
+    @classmethod
+    def for_tree(cls, paths: Iterable[str], read_text: Callable[[str], str], ignored_dirs: Iterable[str] = (),
+                 max_file_bytes: int = None) -> "ExclusionEngine":
+        """
+        Builds the engine for a tree listing. read_text(path) returns the text of a
+        .gitignore, .gitattributes or .docgen.json from the tree; unreadable files are skipped.
+        Rule files are read from shallow to deep, and none is read from a directory the
+        rules above it already exclude. The repository may lower max_file_bytes, not raise it.
+        """
+        rule_files = sorted(
+            (path for path in paths if posixpath.basename(path) in (".gitignore", ".gitattributes") or path == REPO_CONFIG_NAME),
+            key=lambda path: (path.count("/"), path)
+        )
+        ignore_rules = [Rule(f"{name}/", source="ignored directory", dir_only=True) for name in sorted(ignored_dirs)]
+        attribute_rules: Dict[str, List[Rule]] = {name: [] for name in LINGUIST_ATTRIBUTES}
+        config, config_rules = {}, []
+        depth, engine = None, None
+
+        for path in rule_files:
+            base = posixpath.dirname(path)
+            if path.count("/") != depth:
+                # Files at one depth cannot exclude each other's directories, so the rules
+                # are recompiled once per depth.
+                depth, engine = path.count("/"), cls(ignore_rules + config_rules)
+            reason = engine._directory_reason(base)
+            if reason:
+                print(f"Not reading {path}: {reason[1]}")
+                continue
+            try:
+                text = read_text(path)
+            except Exception as e:
+                print(f"Could not read {path}: {e}")
+                continue
+            if path == REPO_CONFIG_NAME:
+                config = cls._parse_config(text)
+                config_rules = [rule for rule in (Rule.parse(line, "", REPO_CONFIG_NAME) for line in config.get("exclude", [])) if rule]
+            elif path.endswith(".gitignore"):
+                ignore_rules += [rule for rule in (Rule.parse(line, base, path) for line in text.splitlines()) if rule]
+            else:
+                for name, rule in cls._parse_attributes(text, base, path):
+                    attribute_rules[name].append(rule)
+
+        limit = config.get("max_file_bytes")
+        if isinstance(limit, int) and limit > 0:
+            max_file_bytes = min(limit, max_file_bytes) if max_file_bytes else limit
+        return cls(ignore_rules + config_rules, attribute_rules, max_file_bytes)
+
+    @staticmethod
+    def _parse_config(text: str) -> dict:
+        try:
+            config = json.loads(text)
+        except ValueError as e:
+            print(f"Ignoring invalid {REPO_CONFIG_NAME}: {e}")
+            return {}
+        return config if isinstance(config, dict) else {}
+
+    @staticmethod
+    def _parse_attributes(text: str, base: str, source: str):
+        """
+        (attribute, rule) for each linguist attribute on a .gitattributes line; unsetting it
+        ("-linguist-generated", "linguist-generated=false") becomes a negated rule.
+        """
+        for line in text.splitlines():
+            parts = line.split()
+            if not parts or parts[0].startswith(("#", "[", "!")):
+                continue
+            for attribute in parts[1:]:
+                name, _, value = attribute.lstrip("-!").partition("=")
+                if name in LINGUIST_ATTRIBUTES:
+                    unset = attribute.startswith(("-", "!")) or value.lower() in ("false", "0")
+                    yield name, Rule(parts[0], base, source, negate=unset)
+
+    def _directory_reason(self, directory: str) -> Optional[Tuple[str, str]]:
+        """(kind, reason) if a directory is excluded; an excluded parent counts and cannot be undone."""
+        if directory in self._dir_reasons:
+            return self._dir_reasons[directory]
+        reason = self._directory_reason(posixpath.dirname(directory))
+        if reason is None:
+            rule = self._ignore_dirs.match(directory)
+            reason = (rule.kind, rule.describe()) if rule and not rule.negate else None
+        self._dir_reasons[directory] = reason
+        return reason
+
+    def explain(self, path: str, size: int = 0) -> Optional[Tuple[str, str]]:
+        """(kind, reason) if the file should not be fetched, e.g. (".gitignore", "web/.gitignore: dist/")."""
+        reason = self._directory_reason(posixpath.dirname(path))
+        if reason:
+            return reason
+        rule = self._ignore_files.match(path)
+        if rule and not rule.negate:
+            return rule.kind, rule.describe()
+        for name, matcher in self._attributes.items():
+            rule = matcher.match(path)
+            if rule and not rule.negate:
+                return name, f"{name} ({rule.describe()})"
+        if self.max_file_bytes and size and size > self.max_file_bytes:
+            return "size", f"larger than {self.max_file_bytes} bytes"
+        return None
+
+    def reason(self, path: str, size: int = 0) -> Optional[str]:
+        """Why the file would be excluded, or None if it should be fetched."""
+        explained = self.explain(path, size)
+        return explained[1] if explained else None
+
+    def filter(self, files: list) -> list:
+        """The files (anything with .path and .size) to keep; the rest are recorded in `excluded`."""
+        kept = []
+        for file in files:
+            explained = self.explain(file.path, file.size or 0)
+            if explained:
+                self._kinds[explained[0]] += 1
+                self.excluded[file.path] = explained[1]
+            else:
+                kept.append(file)
+        return kept
+
+    def report(self) -> Dict[str, int]:
+        """Excluded file counts by kind of reason (".gitignore", "linguist-vendored", "size"...)."""
+        return dict(self._kinds)
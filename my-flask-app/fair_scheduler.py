@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Tuple
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+
+class _Job:
+    __slots__ = ("job_id", "cost", "func", "args", "enqueued_at")
+
+    def __init__(self, job_id: str, cost: float, func: Callable, args: tuple):
+        self.job_id = job_id
+        self.cost = cost
+        self.func = func
+        self.args = args
+        self.enqueued_at = time.monotonic()
+
+
+class _Flow:
+    """The queued jobs of one tenant in one priority class, with its DRR deficit."""
+    __slots__ = ("tenant", "priority", "weight", "jobs", "deficit")
+
+    def __init__(self, tenant: str, priority: str, weight: float):
+        self.tenant = tenant
+        self.priority = priority
+        self.weight = weight
+        self.jobs = deque()
+        self.deficit = 0.0
+
+
+class FairScheduler:
+    """
+    Runs jobs on a fixed set of worker threads, fairly across tenants instead of first
+    come, first served. Jobs are charged by cost (estimated tokens plus GitHub requests,
+    see main.py), not by count. Each priority class runs deficit round robin across its
+    tenants: each turn a tenant's deficit grows by quantum * weight, and a job only starts
+    once the deficit covers its cost. A tenant with one huge job therefore waits rounds
+    while the others' small jobs go through.
+    When a job has finished, settle() corrects the charge with the job's actual cost, so a
+    tenant whose jobs run over their estimates pays for it on its next jobs.
+    Interactive jobs go before background ones, except that every background_share-th
+    start goes to a waiting background job. reserved_interactive workers never run
+    background jobs, so a small job never waits behind a wall of big ones.
+    The queues live in this process: with several gunicorn workers, each one schedules
+    fairly only among the jobs it accepted (run one worker for fairness across all jobs).
+    """
+
+    def __init__(self, workers: int, quantum: float = 10000.0, reserved_interactive: int = 1, background_share: int = 4,
+                 tenant_weights: Dict[str, float] = None, name: str = "generation-job"):
+        # A deficit that never grows would leave _next() spinning forever.
+        if quantum <= 0:
+            raise ValueError(f"quantum must be positive, got {quantum}")
+        bad_weights = {tenant: weight for tenant, weight in (tenant_weights or {}).items() if weight <= 0}
+        if bad_weights:
+            raise ValueError(f"Tenant weights must be positive, got {bad_weights}")
+        self.workers = max(workers, 1)
+        self.quantum = quantum
+        self.reserved_interactive = min(reserved_interactive, self.workers - 1)
+        self.background_share = max(background_share, 1)
+        self.tenant_weights = tenant_weights or {}
+        self._flows: Dict[Tuple[str, str], _Flow] = {}
+        self._active: Dict[str, deque] = {priority: deque() for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._since_background = 0
+        self._closed = False
+        self._changed = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True) for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, job_id: str, tenant: str, priority: str, cost: float, func: Callable, *args: Any):
+        """Queues func(*args) for the tenant; cost is in the same units as quantum."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority {priority!r}, expected one of {PRIORITIES}")
+        with self._changed:
+            if self._closed:
+                raise RuntimeError(f"Scheduler is shut down, job {job_id} was not queued")
+            flow = self._flow(tenant, priority)
+            if not flow.jobs:
+                self._active[priority].append(flow)
+            flow.jobs.append(_Job(job_id, max(cost, 1.0), func, args))
+            self._changed.notify()
+
+    def settle(self, tenant: str, priority: str, estimated: float, actual: float):
+        """Refunds or charges the difference between a finished job's estimated and actual cost."""
+        with self._changed:
+            flow = self._flow(tenant, priority)
+            flow.deficit += estimated - actual
+            if not flow.jobs:
+                # An idle tenant keeps its debt but banks no credit.
+                flow.deficit = min(flow.deficit, 0.0)
+                if flow.deficit == 0:
+                    del self._flows[(tenant, priority)]
+
+    def _flow(self, tenant: str, priority: str) -> _Flow:
+        key = (tenant, priority)
+        if key not in self._flows:
+            self._flows[key] = _Flow(tenant, priority, self.tenant_weights.get(tenant, 1.0))
+        return self._flows[key]
+
+    def _eligible(self) -> Optional[str]:
+        """The priority class the next free worker should serve, or None if nothing may start."""
+        interactive, background = self._active[INTERACTIVE], self._active[BACKGROUND]
+        background_allowed = background and self._running[BACKGROUND] < self.workers - self.reserved_interactive
+        if background_allowed and (not interactive or self._since_background + 1 >= self.background_share):
+            return BACKGROUND
+        return INTERACTIVE if interactive else None
+
+    def _next(self, priority: str) -> _Job:
+        """Deficit round robin over the class's active flows."""
+        active = self._active[priority]
+        while True:
+            flow = active[0]
+            job = flow.jobs[0]
+            if job.cost <= flow.deficit:
+                flow.jobs.popleft()
+                flow.deficit -= job.cost
+                if not flow.jobs:
+                    active.popleft()
+                    flow.deficit = min(flow.deficit, 0.0)
+                return job
+            active.rotate(-1)
+            active[-1].deficit += self.quantum * active[-1].weight
+
+    def shutdown(self, timeout: float = 30.0) -> int:
+        """
+        Stops accepting jobs and waits (bounded) for the queued and running ones to finish.
+        Returns how many were still queued or running when the time ran out.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            self._closed = True
+            self._changed.notify_all()
+            while self._pending() and time.monotonic() < deadline:
+                self._changed.wait(max(deadline - time.monotonic(), 0.0))
+            return self._pending()
+
+    def _pending(self) -> int:
+        return sum(self._running.values()) + sum(len(flow.jobs) for flow in self._flows.values())
+
+    def _work(self):
+        while True:
+            with self._changed:
+                priority = self._eligible()
+                while priority is None:
+                    self._changed.wait()
+                    priority = self._eligible()
+                job = self._next(priority)
+                self._running[priority] += 1
+                self._since_background = 0 if priority == BACKGROUND else self._since_background + 1
+            print(f"Starting {priority} job {job.job_id} after {time.monotonic() - job.enqueued_at:.1f}s queued")
+            try:
+                job.func(*job.args)
+            except Exception as e:
+                print(f"Job {job.job_id} failed: {e}")
+            finally:
+                with self._changed:
+                    self._running[priority] -= 1
+                    self._changed.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._changed:
+            return {
+                priority: {
+                    "running": self._running[priority],
+                    "queued": sum(len(flow.jobs) for flow in self._active[priority]),
+                    "tenants": {flow.tenant: {"queued": len(flow.jobs), "deficit": round(flow.deficit)} for flow in self._active[priority]},
+                }
+                for priority in PRIORITIES
+            }
@@ -0,0 +1,152 @@
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from typing import Callable, List
+
+SKELETON_LINE = re.compile(
+    r"^\s*(?:export\s+|public\s+|private\s+|protected\s+|static\s+|abstract\s+|async\s+)*"
+    r"(?:class|interface|trait|struct|enum|type|def|function|fn|func|model|table|"
+    r"import|from|use|require|include|namespace|package|module|Route::|@app\.|@router\.|router\.)\b"
+)
+TOKEN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def extract_skeleton(path: str, content: str, max_lines: int = 80) -> str:
+    """Path plus the declaration/import lines of a file: what the file is about, not how it works."""
+    lines = [line.strip() for line in content.splitlines() if SKELETON_LINE.match(line)]
+    return path + "\n" + "\n".join(lines[:max_lines])
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits camelCase, snake_case and paths into lowercase word tokens."""
+    return [token.lower() for token in TOKEN.findall(text) if len(token) > 1]
+
+
+class HashedTfidf:
+    """
+    TF-IDF without a vocabulary: tokens are hashed into a fixed number of buckets.
+    Term frequencies are stored per file (so they can be reused by blob SHA);
+    IDF is computed over whatever set of files is being ranked.
+    """
+
+    def __init__(self, dim: int = 4096):
+        self.dim = dim
+
+    def term_frequencies(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            vector[zlib.crc32(token.encode("utf-8")) % self.dim] += 1.0
+        return np.log1p(vector)
+
+    def weight(self, tf_matrix: np.ndarray) -> np.ndarray:
+        document_frequency = np.count_nonzero(tf_matrix, axis=0)
+        idf = np.log((1 + len(tf_matrix)) / (1 + document_frequency)) + 1.0
+        return self.normalize(tf_matrix * idf.astype(np.float32))
+
+    @staticmethod
+    def normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class VectorIndex:
+    """Term-frequency vectors keyed by blob SHA, persisted per repository as a compressed .npz"""
+
+    def __init__(self, path: str = None, dim: int = 4096):
+        self.path = path
+        self.dim = dim
+        self.vectors = {}
+
+        if path and os.path.exists(path):
+            try:
+                data = np.load(path, allow_pickle=False)
+                if data["vectors"].shape[1:] == (dim,):
+                    self.vectors = dict(zip(data["shas"].tolist(), data["vectors"]))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring unreadable vector index {path}: {e}")
+
+    def save(self, keep_shas: set):
+        """Persist only the vectors of files that still exist, so the index doesn't grow forever."""
+        if not self.path:
+            return
+        shas = [sha for sha in self.vectors if sha in keep_shas]
+        vectors = np.stack([self.vectors[sha] for sha in shas]) if shas else np.zeros((0, self.dim), dtype=np.float32)
+        # Unique per writer (jobs on the same repository may save at once); ends in .npz so numpy keeps the name.
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            np.savez_compressed(tmp_path, shas=np.array(shas, dtype=str), vectors=vectors)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            # Only a cache: the next job re-embeds what is missing.
+            print(f"Could not save vector index {self.path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def rank_files(files: list, query: str, index_path: str = None, similarity_weight: float = 0.7,
+               dim: int = 4096, max_candidates: int = 2000, pre_rank: Callable = None,
+               prefetch: Callable[[list], None] = None, deadline: float = None,
+               read: Callable[[object], str] = None) -> list:
+    """
+    Orders files by similarity of their skeleton to the query, blended with centrality
+    (how similar a file is to the rest of the repo). Vectors of unchanged files are read
+    from the per-repo index instead of being fetched and re-embedded; prefetch, if given,
+    is called once with the files that do need fetching (e.g. to load them in batches).
+    Past deadline (a time.monotonic() value) no more files are fetched: only those already
+    read or in the index are ranked. read, if given, returns the text to embed for a file
+    (e.g. a bounded prefix); by default the whole blob is decoded.
+    """
+    if pre_rank:
+        files = sorted(files, key=pre_rank)
+    files = files[:max_candidates]
+
+    vectorizer = HashedTfidf(dim)
+    index = VectorIndex(index_path, dim)
+
+    if prefetch:
+        prefetch([file for file in files if file.sha not in index.vectors])
+
+    kept, tf_rows = [], []
+    embedded = late = 0
+    for file in files:
+        vector = index.vectors.get(file.sha)
+        if vector is None and deadline is not None and time.monotonic() >= deadline:
+            late += 1
+            continue
+        if vector is None:
+            try:
+                content = read(file) if read else file.decoded_content.decode("utf-8")
+            except Exception:
+                continue
+            vector = vectorizer.term_frequencies(extract_skeleton(file.path, content))
+            index.vectors[file.sha] = vector
+            embedded += 1
+        kept.append(file)
+        tf_rows.append(vector)
+
+    if not kept:
+        return []
+
+    index.save({file.sha for file in kept})
+    print(f"Ranking {len(kept)} files ({embedded} embedded, {len(kept) - embedded} from index"
+          f"{f', {late} left out at the deadline' if late else ''})")
+
+    documents = vectorizer.weight(np.stack(tf_rows))
+    query_vector = HashedTfidf.normalize(vectorizer.term_frequencies(query))
+    similarity = documents @ query_vector
+    # Mean cosine similarity to every file, computed in O(n * dim) via the column sum.
+    centrality = documents @ documents.sum(axis=0) / len(documents)
+
+    def scaled(values):
+        spread = values.max() - values.min()
+        return (values - values.min()) / spread if spread > 0 else np.zeros_like(values)
+
+    scores = similarity_weight * scaled(similarity) + (1 - similarity_weight) * scaled(centrality)
+    return [kept[i] for i in np.argsort(-scores, kind="stable")]
@@ -1,10 +1,95 @@
 from github import Github
-from urllib.parse import urlparse
+from urllib.parse import quote, urlparse
+import base64
+import json
+import os
+import requests
+from typing import Dict, List
+from partial_fetch import NotTextError, decode_text, fetch_prefix, raw_url, sniff
+from circuit_breaker import breakers
+from graphql_blobs import RETRYABLE_ERRORS, RETRYABLE_STATUS, GraphQLBlobFetcher, GraphQLQueryError
+from snapshot_store import SnapshotStore
+from token_manager import GitHubClientManager, RateLimitExhausted
+from job_budget import JobBudget
+
+# GITHUB_API_URL points the service at GitHub Enterprise, or at load_test.py's fake GitHub.
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+GRAPHQL_URL = f"{GITHUB_API_URL}/graphql"
+
+
+def is_github_failure(error: BaseException) -> bool:
+    """Errors that say GitHub itself is unwell: connection problems and 5xx, not 404s or rate limits."""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    status = getattr(error, "status", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+
+def server_error(response) -> bool:
+    return response.status_code >= 500
+
+
+# Shared by every job: when GitHub degrades, jobs fail fast instead of each waiting out its timeouts.
+github_breaker = breakers.get("github", is_failure=is_github_failure)
+
+
+class RepoFile:
+    """A file from the repository tree. Its content is fetched (or read from the snapshot store) on access."""
+    # A job holds one per file of the tree, next to the path index.
+    __slots__ = ("path", "sha", "size", "_service")
+    type = "file"
+
+    def __init__(self, service: "SetUpGithub", path: str, sha: str, size: int):
+        self.path = path
+        self.sha = sha
+        self.size = size
+        self._service = service
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit("/", 1)[-1]
+
+    @property
+    def decoded_content(self) -> bytes:
+        return self._service.get_blob(self.sha)
+
+    def read_text(self, max_bytes: int = None) -> str:
+        """
+        UTF-8 text of the file, or only its first max_bytes when it is larger.
+        Raises NotTextError for binary and non-UTF-8 files.
+        """
+        return self._service.get_text(self.path, self.sha, self.size, max_bytes)
+
 
 class SetUpGithub:
-    def __init__(self, github_token: str, repo_url: str):
+    def __init__(self, github_token: str, repo_url: str, snapshot_store: SnapshotStore = None, client_manager: GitHubClientManager = None,
+                 partial_fetch: bool = True, graphql_batch_size: int = 25, reservation=None, budget: JobBudget = None):
         self.github_token = github_token
         self.repo_url = repo_url
+        self.snapshot_store = snapshot_store
+        self.client_manager = client_manager
+        self.partial_fetch = partial_fetch
+        self.requests_made = 0
+        # The job's rate-limit reservation (see GitHubClientManager.acquire), told about every core API request.
+        self.reservation = reservation
+        # The job's budget, if any: no request waits past its deadline.
+        self.budget = budget
+        # Bytes of large files that were never downloaded thanks to prefix fetches.
+        self.bytes_skipped = 0
+        # The commit get_tree() listed; raw content is read at it, so it matches the blob SHAs.
+        self.commit_sha = None
+        # Blobs are fetched dozens per GraphQL query when graphql_batch_size > 0.
+        self.graphql = GraphQLBlobFetcher(self._post_graphql, batch_size=graphql_batch_size) if graphql_batch_size > 0 else None
+        self._prefetched: Dict[str, bytes] = {}
+        self._binary = set()
+
+        if client_manager:
+            self.session = client_manager.session_for(github_token)
+        else:
+            self.session = requests.Session()
+            self.session.headers["Accept"] = "application/vnd.github+json"
+            if github_token:
+                self.session.headers["Authorization"] = f"Bearer {github_token}"
 
     def _extract_repo_path(self, url: str) -> str:
         """
@@ -21,14 +106,237 @@ class SetUpGithub:
         return path
 
     def authenticate(self):
-        self.github = Github(self.github_token)
+        self.github = self.client_manager.client_for(self.github_token) if self.client_manager else Github(self.github_token, base_url=GITHUB_API_URL)
     
         repo_path = self._extract_repo_path(self.repo_url)
         
         try:
-            self.repo = self.github.get_repo(repo_path)
+            self.repo = github_breaker.call(self.github.get_repo, repo_path)
+            self._count_request()
+            if self.client_manager:
+                self.client_manager.record_client(self.github_token, self.github)
             print(f"Successfully accessed: {self.repo.full_name}")
             return self.repo
         except Exception as e:
             print(f"Error accessing repo '{repo_path}': {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    def _get(self, url: str, headers: dict = None, timeout: float = 30, wait_for_reset: bool = True):
+        """
+        GET against the GitHub API that keeps the shared rate-limit state current.
+        If the token runs dry mid-job, waits for the reset and retries once instead of failing.
+        """
+        for attempt in range(2 if wait_for_reset else 1):
+            response = github_breaker.call(self.session.get, url, headers=headers or {}, timeout=self._timeout(timeout), failed=server_error)
+            self._count_request()
+            if not self.client_manager:
+                return response
+
+            self.client_manager.record(self.github_token, response.headers)
+            exhausted = response.status_code in (403, 429) and response.headers.get("X-RateLimit-Remaining") == "0"
+            if not exhausted or attempt:
+                return response
+            # Only waits for the reset (not past the job's deadline); the retry is covered by
+            # the job's own reservation.
+            wait = lambda limit: self.client_manager.acquire(self.github_token, needed=1, max_wait=limit)
+            if self.budget:
+                reservation = self.budget.bounded_wait(wait, self.client_manager.max_wait, RateLimitExhausted)
+            else:
+                reservation = wait(self.client_manager.max_wait)
+            self.client_manager.release(reservation)
+        return response
+
+    def _timeout(self, default: float) -> float:
+        return self.budget.timeout(default) if self.budget else default
+
+    def _count_request(self, core: bool = True):
+        self.requests_made += 1
+        if core and self.reservation is not None and self.client_manager:
+            self.client_manager.consume(self.reservation)
+
+    def _post_graphql(self, query: str, variables: dict) -> dict:
+        response = github_breaker.call(
+            self.session.post, GRAPHQL_URL, json={"query": query, "variables": variables}, timeout=self._timeout(60), failed=server_error
+        )
+        # GraphQL has its own rate limit, apart from the core limit the reservation is made against.
+        self._count_request(core=False)
+        if response.status_code in RETRYABLE_STATUS:
+            raise GraphQLQueryError(f"HTTP {response.status_code}", retryable=True)
+        if not response.ok:
+            raise GraphQLQueryError(f"HTTP {response.status_code}: {response.text[:200]}", retryable=False)
+        body = response.json()
+        errors = body.get("errors") or []
+        if errors and not body.get("data"):
+            retryable = any(error.get("type") in RETRYABLE_ERRORS for error in errors)
+            raise GraphQLQueryError(errors[0].get("message", "GraphQL error"), retryable=retryable)
+        return body
+
+    def _conditional_get(self, url: str, **get_options):
+        """
+        GET with If-None-Match against the ETag we stored last time. A 304 does not count
+        against the GitHub rate limit, and we answer it from the snapshot store.
+        """
+        cached = self.snapshot_store.get_response(url) if self.snapshot_store else None
+        headers = {"If-None-Match": cached[0]} if cached else {}
+
+        response = self._get(url, headers=headers, **get_options)
+        if response.status_code == 304 and cached:
+            return json.loads(cached[1])
+
+        response.raise_for_status()
+        etag = response.headers.get("ETag")
+        if self.snapshot_store and etag:
+            self.snapshot_store.put_response(url, etag, response.text)
+        return response.json()
+
+    def get_languages(self) -> Dict[str, int]:
+        return self._conditional_get(f"{GITHUB_API_URL}/repos/{self.repo.full_name}/languages")
+
+    def get_profile(self, timeout: float = 5) -> dict:
+        """
+        What a job on this repository will be up against, cheap enough to ask before
+        accepting it: size, language mix (bytes per language) and, when the snapshot store
+        still has the last tree listing, the size of every file. Two conditional requests,
+        no PyGithub client, and no waiting for a rate-limit reset.
+        """
+        repo_path = self._extract_repo_path(self.repo_url)
+        repo = self._conditional_get(f"{GITHUB_API_URL}/repos/{repo_path}", timeout=timeout, wait_for_reset=False)
+        languages = self._conditional_get(f"{GITHUB_API_URL}/repos/{repo_path}/languages", timeout=timeout, wait_for_reset=False)
+
+        file_sizes = None
+        head = self.snapshot_store.get_response(self._head_url(repo["full_name"], repo["default_branch"])) if self.snapshot_store else None
+        cached = self.snapshot_store.get_response(self._tree_url(repo["full_name"], json.loads(head[1])["object"]["sha"])) if head else None
+        if cached:
+            file_sizes = [entry.get("size", 0) for entry in json.loads(cached[1])["tree"] if entry["type"] == "blob"]
+        return {"size_kb": repo.get("size", 0), "languages": languages, "file_sizes": file_sizes}
+
+    @staticmethod
+    def _head_url(full_name: str, branch: str) -> str:
+        return f"{GITHUB_API_URL}/repos/{full_name}/git/ref/heads/{quote(branch, safe='/')}"
+
+    @staticmethod
+    def _tree_url(full_name: str, commit_sha: str) -> str:
+        return f"{GITHUB_API_URL}/repos/{full_name}/git/trees/{commit_sha}?recursive=1"
+
+    def get_tree(self) -> List[dict]:
+        """
+        Every blob entry of the default branch's head commit, listed in a single (conditional)
+        request after the one resolving the commit. When GitHub truncates that listing, the
+        tree is listed again subtree by subtree.
+        """
+        head = self._conditional_get(self._head_url(self.repo.full_name, self.repo.default_branch))
+        self.commit_sha = head["object"]["sha"]
+        tree = self._conditional_get(self._tree_url(self.repo.full_name, self.commit_sha))
+        if not tree.get("truncated"):
+            return [entry for entry in tree["tree"] if entry["type"] == "blob"]
+        print(f"Tree listing for {self.repo.full_name} was truncated by GitHub, listing it by subtree")
+        return self._list_subtree(tree["sha"], "")
+
+    def _list_subtree(self, sha: str, prefix: str) -> List[dict]:
+        """
+        Blob entries under a tree, with paths from the repository root: its own entries in
+        one request, then each subdirectory recursively, split again where that is truncated too.
+        """
+        tree_url = f"{GITHUB_API_URL}/repos/{self.repo.full_name}/git/trees"
+        listing = self._conditional_get(f"{tree_url}/{sha}")
+        if listing.get("truncated"):
+            print(f"Warning: listing of {prefix or '/'} in {self.repo.full_name} was truncated by GitHub")
+        blobs = []
+        for entry in listing["tree"]:
+            path = prefix + entry["path"]
+            if entry["type"] == "blob":
+                blobs.append({**entry, "path": path})
+            elif entry["type"] == "tree":
+                subtree = self._conditional_get(f"{tree_url}/{entry['sha']}?recursive=1")
+                if subtree.get("truncated"):
+                    blobs.extend(self._list_subtree(entry["sha"], path + "/"))
+                else:
+                    blobs.extend({**child, "path": f"{path}/{child['path']}"} for child in subtree["tree"] if child["type"] == "blob")
+        return blobs
+
+    def get_blob(self, sha: str) -> bytes:
+        """Blob content by SHA. Blobs are immutable, so a stored copy never needs revalidating."""
+        if self.snapshot_store:
+            content = self.snapshot_store.get_blob(sha)
+            if content is not None:
+                return content
+        elif sha in self._prefetched:
+            return self._prefetched.pop(sha)
+
+        response = self._get(f"{GITHUB_API_URL}/repos/{self.repo.full_name}/git/blobs/{sha}")
+        response.raise_for_status()
+        content = base64.b64decode(response.json()["content"])
+
+        if self.snapshot_store:
+            self.snapshot_store.put_blob(sha, content)
+        return content
+
+    def get_text(self, path: str, sha: str, size: int, max_bytes: int = None) -> str:
+        """
+        Text of a blob, cut to max_bytes. A file larger than that is not downloaded whole:
+        only its prefix is fetched from raw content with a Range request (unless the full
+        blob is stored already), and a binary or non-UTF-8 file is rejected after its first
+        few KB. Raises NotTextError for such files.
+        """
+        if sha in self._binary:
+            raise NotTextError(path, "binary")
+        stored = self.snapshot_store.get_blob(sha) if self.snapshot_store else self._prefetched.get(sha)
+        if stored is None and self.partial_fetch and max_bytes and size > max_bytes:
+            return decode_text(self._get_prefix(path, sha, size, max_bytes), complete=False)
+
+        content = stored if stored is not None else self.get_blob(sha)
+        complete = max_bytes is None or len(content) <= max_bytes
+        content = content if complete else content[:max_bytes]
+        reason = sniff(content, complete)
+        if reason:
+            raise NotTextError(path, reason)
+        return decode_text(content, complete)
+
+    def _get_prefix(self, path: str, sha: str, size: int, max_bytes: int) -> bytes:
+        # Prefixes are stored apart from full blobs, keyed by SHA and length.
+        key = f"{sha}-{max_bytes}"
+        if self.snapshot_store:
+            content = self.snapshot_store.get_blob(key)
+            if content is not None:
+                return content
+
+        url = raw_url(self.repo.full_name, self.commit_sha or self.repo.default_branch, path)
+        content = github_breaker.call(fetch_prefix, self.session, url, max_bytes, path=path, headers={"Accept": "application/octet-stream"},
+                                      timeout=self._timeout(30))
+        self.bytes_skipped += size - len(content)
+
+        if self.snapshot_store:
+            self.snapshot_store.put_blob(key, content)
+        return content
+
+    def prefetch_blobs(self, files, deadline: float = None) -> int:
+        """
+        Loads the blobs of many files with batched GraphQL queries, so the reads that follow
+        are local: into the snapshot store, or held until read once when there is none.
+        Blobs GraphQL cannot return whole, or not before deadline (a time.monotonic() value),
+        are left for the per-file REST path. Returns how many blobs were fetched.
+        """
+        if not self.graphql:
+            return 0
+        missing = {}
+        for file in files:
+            stored = self.snapshot_store.has_blob(file.sha) if self.snapshot_store else file.sha in self._prefetched
+            if not stored and file.sha not in self._binary:
+                missing[file.sha] = file.size
+        if not missing:
+            return 0
+
+        owner, name = self.repo.full_name.split("/", 1)
+        blobs = self.graphql.fetch(owner, name, list(missing.items()), deadline=deadline)
+        for sha, content in blobs.items():
+            if content is None:
+                self._binary.add(sha)
+            elif self.snapshot_store:
+                self.snapshot_store.put_blob(sha, content)
+            else:
+                self._prefetched[sha] = content
+        print(f"Prefetched {len(blobs)} of {len(missing)} blobs in {self.graphql.queries} GraphQL queries so far")
+        return len(blobs)
+
+    def get_files(self) -> List[RepoFile]:
+        return [RepoFile(self, entry["path"], entry["sha"], entry.get("size", 0)) for entry in self.get_tree()]
@@ -0,0 +1,124 @@
+import hashlib
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Errors GitHub returns when a query is too big or too slow; the batch is split and retried.
+RETRYABLE_ERRORS = {"RESOURCE_LIMITS_EXCEEDED", "MAX_NODE_LIMIT_EXCEEDED", "TIMEOUT"}
+RETRYABLE_STATUS = {502, 503, 504}
+
+BLOB_FIELDS = "... on Blob { isBinary isTruncated byteSize text }"
+
+
+class GraphQLQueryError(Exception):
+    def __init__(self, message: str, retryable: bool):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+def git_blob_sha(data: bytes) -> str:
+    """The object id git gives a blob with this content."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def blobs_query(count: int) -> str:
+    """A query for `count` blobs by oid, one aliased field each, plus the query's rate-limit cost."""
+    variables = ", ".join(f"$o{i}: GitObjectID!" for i in range(count))
+    fields = "\n".join(f"    b{i}: object(oid: $o{i}) {{ {BLOB_FIELDS} }}" for i in range(count))
+    return (
+        f"query($owner: String!, $name: String!, {variables}) {{\n"
+        f"  rateLimit {{ cost remaining }}\n"
+        f"  repository(owner: $owner, name: $name) {{\n{fields}\n  }}\n}}"
+    )
+
+
+class GraphQLBlobFetcher:
+    """
+    Fetches the text of many blobs per GitHub GraphQL query instead of one REST request
+    per file. Batches are capped by count and by the blobs' total size from the tree.
+    The count adapts: it grows while queries succeed within max_cost, shrinks in
+    proportion when a query costs more, and halves when GitHub rejects or times out a
+    query (which is then retried in two halves).
+    post(query, variables) sends one query and returns the decoded JSON response.
+    """
+
+    def __init__(self, post: Callable[[str, dict], dict], batch_size: int = 25, min_batch: int = 1,
+                 max_batch: int = 100, max_batch_bytes: int = 2 * 1024 * 1024, max_cost: int = 5):
+        self.post = post
+        self.batch_size = batch_size
+        self.min_batch = min_batch
+        self.max_batch = max_batch
+        self.max_batch_bytes = max_batch_bytes
+        self.max_cost = max_cost
+        self.queries = 0
+
+    def fetch(self, owner: str, name: str, blobs: List[Tuple[str, int]], deadline: float = None) -> Dict[str, Optional[bytes]]:
+        """
+        Content by SHA for (sha, size) pairs. Binary blobs map to None; blobs GitHub
+        truncates or cannot return are left out, for the caller to fetch another way.
+        So are blobs whose text does not re-encode to the blob's own bytes (GraphQL only
+        returns decoded text, which loses non-UTF-8 content): the result is always safe to
+        store under its SHA. No query is started after deadline (a time.monotonic() value),
+        nor after post fails other than with GraphQLQueryError. Never raises.
+        """
+        results: Dict[str, Optional[bytes]] = {}
+        pending = deque(dict.fromkeys(blobs))
+        while pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                print(f"GraphQL: deadline reached, {len(pending)} blobs left unfetched")
+                break
+            batch = self._next_batch(pending)
+            started = time.monotonic()
+            try:
+                response = self.post(blobs_query(len(batch)), {
+                    "owner": owner, "name": name, **{f"o{i}": sha for i, (sha, _) in enumerate(batch)}
+                })
+            except GraphQLQueryError as e:
+                if not e.retryable or len(batch) == 1:
+                    print(f"GraphQL batch of {len(batch)} blobs failed: {e}")
+                    continue
+                self.batch_size = max(self.min_batch, len(batch) // 2)
+                pending.extendleft(reversed(batch))
+                continue
+            except Exception as e:
+                # Connection errors, timeouts, an open circuit: batching is only a shortcut,
+                # so the rest is left to the caller's per-file path instead of failing it.
+                print(f"GraphQL unavailable ({type(e).__name__}: {e}), leaving {len(batch) + len(pending)} blobs unfetched")
+                break
+            self.queries += 1
+
+            repository = (response.get("data") or {}).get("repository") or {}
+            for i, (sha, _) in enumerate(batch):
+                blob = repository.get(f"b{i}")
+                if not blob or blob.get("isTruncated"):
+                    continue
+                if blob.get("isBinary") or blob.get("text") is None:
+                    results[sha] = None
+                    continue
+                data = blob["text"].encode("utf-8")
+                if git_blob_sha(data) != sha:
+                    print(f"GraphQL text of blob {sha[:8]} is not its content (not UTF-8?), leaving it to REST")
+                    continue
+                results[sha] = data
+
+            cost = ((response.get("data") or {}).get("rateLimit") or {}).get("cost", 1)
+            self._adapt(len(batch), cost, time.monotonic() - started)
+        return results
+
+    def _next_batch(self, pending: deque) -> List[Tuple[str, int]]:
+        batch, total = [], 0
+        while pending and len(batch) < self.batch_size:
+            size = pending[0][1] or 0
+            if batch and total + size > self.max_batch_bytes:
+                break
+            batch.append(pending.popleft())
+            total += size
+        return batch
+
+    def _adapt(self, size: int, cost: int, elapsed: float):
+        if cost > self.max_cost:
+            self.batch_size = max(self.min_batch, size * self.max_cost // cost)
+        elif size >= self.batch_size:
+            # Additive increase, only when the batch was actually full.
+            self.batch_size = min(self.max_batch, self.batch_size + max(1, self.batch_size // 4))
+        print(f"  GraphQL: {size} blobs, cost {cost}, {elapsed:.1f}s -> next batch {self.batch_size}")
@@ -0,0 +1,27 @@
+import os
+
+# Every setting can be overridden from the environment (or the .env used by main.py).
+bind = os.getenv("HTTP_BIND", "0.0.0.0:8001")
+# One worker by default: job admission and fair scheduling across tenants are per process.
+workers = int(os.getenv("HTTP_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("HTTP_THREADS", "8"))
+timeout = int(os.getenv("HTTP_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("HTTP_GRACEFUL_TIMEOUT", "60"))
+keepalive = int(os.getenv("HTTP_KEEPALIVE", "5"))
+max_requests = int(os.getenv("HTTP_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("HTTP_MAX_REQUESTS_JITTER", "0"))
+accesslog = os.getenv("HTTP_ACCESS_LOG", "-")
+errorlog = "-"
+
+# The callback dispatcher, job pool and snapshot store start threads and open SQLite
+# connections at import time, so each worker must import the app after the fork.
+preload_app = False
+
+
+def worker_exit(server, worker):
+    """Lets the exiting worker finish its jobs and callbacks within the graceful timeout."""
+    import sys
+    main = sys.modules.get("main")
+    if main is not None:
+        main.shutdown(timeout=max(graceful_timeout - 5, 1))
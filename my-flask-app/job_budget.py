@@ -0,0 +1,161 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Same rough ratio the structure summarizer budgets with.
+CHARS_PER_TOKEN = 4
+
+
+class BudgetExhausted(Exception):
+    """Raised instead of an LLM call once a job has no tokens or time left."""
+
+
+def estimate_tokens(text_or_chars) -> int:
+    chars = text_or_chars if isinstance(text_or_chars, int) else len(text_or_chars or "")
+    return chars // CHARS_PER_TOKEN + 1
+
+
+def tokens_used(payload: Any, response) -> int:
+    """Tokens an LLM call cost: the provider's usage report, else an estimate from prompt and answer."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("total_tokens"):
+        return int(usage["total_tokens"])
+    return estimate_tokens(str(payload)) + estimate_tokens(getattr(response, "content", "") or "")
+
+
+class JobBudget:
+    """
+    Time and token ceiling for one generation job. The clock starts when the job is
+    accepted; LLM calls charge the tokens they used. Stages ask can_afford() before
+    expensive work and take a cheaper path when the answer is no, recording what they
+    gave up with degrade(), so the job ends with a partial result instead of running on.
+    None means no limit.
+    """
+
+    def __init__(self, deadline_seconds: float = None, max_tokens: int = None):
+        for name, value in (("deadline_seconds", deadline_seconds), ("max_tokens", max_tokens)):
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+                raise ValueError(f"{name} must be a positive number")
+        self.deadline_seconds = deadline_seconds
+        self.max_tokens = int(max_tokens) if max_tokens is not None else None
+        self.started = time.monotonic()
+        self.tokens_used = 0
+        # Set by the pipeline when the job is done; GitHub requests are not limited, only accounted.
+        self.github_requests = 0
+        self.degradations: List[Dict[str, str]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self) -> bool:
+        return self.deadline_seconds is not None or self.max_tokens is not None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def deadline(self) -> Optional[float]:
+        """The deadline as a time.monotonic() value."""
+        return None if self.deadline_seconds is None else self.started + self.deadline_seconds
+
+    def seconds_left(self) -> Optional[float]:
+        if self.deadline_seconds is None:
+            return None
+        return max(self.deadline_seconds - self.elapsed(), 0.0)
+
+    def timeout(self, default: float) -> float:
+        """A per-call timeout: default, but never past the deadline (and at least a second)."""
+        seconds_left = self.seconds_left()
+        return default if seconds_left is None else max(min(default, seconds_left), 1.0)
+
+    def bounded_wait(self, wait, max_wait: float, *give_up):
+        """
+        wait(limit) for a blocking wait of up to max_wait seconds, with limit cut to the time
+        left. If the wait gives up (raises one of give_up) after being cut short, the deadline
+        is what stopped it: BudgetExhausted is raised instead.
+        """
+        seconds_left = self.seconds_left()
+        if seconds_left is None or seconds_left >= max_wait:
+            return wait(max_wait)
+        try:
+            return wait(seconds_left)
+        except give_up as e:
+            raise BudgetExhausted(f"Deadline passed after {self.elapsed():.0f}s waiting: {e}") from e
+
+    def within_deadline(self, func, *args):
+        """
+        func(*args), given up on with BudgetExhausted when the deadline comes first. The call
+        cannot be cancelled: it finishes in the background and its result is dropped.
+        """
+        seconds_left = self.seconds_left()
+        if seconds_left is None:
+            return func(*args)
+        outcome = {}
+
+        def run():
+            try:
+                outcome["result"] = func(*args)
+            except Exception as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=run, name="budget-call", daemon=True)
+        thread.start()
+        thread.join(seconds_left)
+        if thread.is_alive():
+            raise BudgetExhausted(f"Deadline passed after {self.elapsed():.0f}s waiting on a call")
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def tokens_left(self) -> Optional[int]:
+        if self.max_tokens is None:
+            return None
+        with self._lock:
+            return max(self.max_tokens - self.tokens_used, 0)
+
+    def exhausted(self) -> bool:
+        return self.seconds_left() == 0 or self.tokens_left() == 0
+
+    def can_afford(self, tokens: int = 0, seconds: float = 0) -> bool:
+        tokens_left, seconds_left = self.tokens_left(), self.seconds_left()
+        return (tokens_left is None or tokens <= tokens_left) and (seconds_left is None or seconds <= seconds_left)
+
+    def char_allowance(self, limit: int, reserve_tokens: int = 0) -> int:
+        """Prompt characters affordable (at most limit) while keeping reserve_tokens for later calls."""
+        tokens_left = self.tokens_left()
+        if tokens_left is None:
+            return limit
+        return max(min(limit, (tokens_left - reserve_tokens) * CHARS_PER_TOKEN), 0)
+
+    def charge(self, tokens: int):
+        with self._lock:
+            self.tokens_used += tokens
+
+    def check(self):
+        """Raises BudgetExhausted when nothing is left."""
+        if self.exhausted():
+            raise BudgetExhausted(f"Job budget exhausted after {self.elapsed():.0f}s and {self.tokens_used} tokens")
+
+    def degrade(self, stage: str, note: str):
+        print(f"  [{stage}] budget: {note}")
+        with self._lock:
+            self.degradations.append({"stage": stage, "note": note})
+
+    @property
+    def partial(self) -> bool:
+        return bool(self.degradations)
+
+    def fingerprint(self) -> str:
+        # Stage results only depend on the token ceiling (a deadline cut is never cached).
+        return "unlimited" if self.max_tokens is None else f"tokens:{self.max_tokens}"
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            degradations = list(self.degradations)
+        return {
+            "deadline_seconds": self.deadline_seconds,
+            "elapsed_seconds": round(self.elapsed(), 1),
+            "max_tokens": self.max_tokens,
+            "tokens_used": self.tokens_used,
+            "github_requests": self.github_requests,
+            "degradations": degradations,
+        }
@@ -0,0 +1,390 @@
+"""
+Load test for /api/start-generation.
+
+Self-contained: starts a fake GitHub (REST, GraphQL and raw content for one generated
+repository), a fake OpenAI-compatible LLM and a receiver for the job callbacks, then
+starts the service under gunicorn pointed at them, with fresh snapshot, index and memo
+directories so every run starts cold. It fires concurrent generation requests and
+reports request latency and throughput, plus how many job callbacks came back.
+
+    python load_test.py --requests 500 --concurrency 50
+
+With --url, an already running server is tested instead. Give the fakes fixed ports
+(--github-port, --llm-port) and start that server with the environment the test prints,
+so that it talks to the fakes and not to GitHub.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+REPO = "loadtest/shop"
+COMMIT_SHA = "c0" * 20
+FAKE_DIAGRAM = "graph TD\n  Client[Client] --> Api[API]\n  Api --> Orders[Order service]\n  Orders --> Db[(Database)]\n"
+
+
+def git_blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def fake_repository(files: int) -> dict:
+    """Content by path of a small Flask-style repository with files source files, one large file and a .gitignore."""
+    contents = {
+        ".gitignore": b"dist/\n*.log\n",
+        "requirements.txt": b"flask\nsqlalchemy\n",
+        "app.py": b"from flask import Flask\nfrom routes import register\n\napp = Flask(__name__)\nregister(app)\n",
+        "data/fixtures.json": json.dumps([{"id": i, "name": f"item {i}"} for i in range(20000)]).encode("utf-8"),
+    }
+    layers = ("models", "routes", "services", "schemas")
+    for i in range(files):
+        layer = layers[i % len(layers)]
+        contents[f"{layer}/module_{i}.py"] = (
+            f"from models.module_{i % 7} import Base\n\n\n"
+            f"class {layer.title()}{i}(Base):\n"
+            f"    def handle(self, request):\n        return self.repository.find({i})\n"
+        ).encode("utf-8")
+    return contents
+
+
+class FakeGitHub(ThreadingHTTPServer):
+    """
+    Serves one repository the way the GitHub API does: repository, languages, branch ref,
+    recursive tree, blobs, GraphQL blob queries and raw content with Range. Every response
+    carries an ETag and a rate limit that never runs out.
+    """
+
+    def __init__(self, files: int, port: int = 0):
+        super().__init__(("127.0.0.1", port), GitHubHandler)
+        self.contents = fake_repository(files)
+        self.blobs = {git_blob_sha(content): content for content in self.contents.values()}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def rest(self, path: str):
+        """The JSON body for a REST path, or None for a 404."""
+        owner, name = REPO.split("/")
+        prefix = f"/repos/{REPO}"
+        if path == prefix:
+            size_kb = sum(len(content) for content in self.contents.values()) // 1024
+            return {"id": 1, "name": name, "full_name": REPO, "owner": {"login": owner}, "default_branch": "main",
+                    "size": size_kb, "private": False, "url": f"{self.url}{prefix}"}
+        if path == f"{prefix}/languages":
+            return {"Python": sum(len(content) for path, content in self.contents.items() if path.endswith(".py"))}
+        if path == f"{prefix}/git/ref/heads/main":
+            return {"ref": "refs/heads/main", "object": {"sha": COMMIT_SHA, "type": "commit"}}
+        if path == f"{prefix}/git/trees/{COMMIT_SHA}":
+            tree = [{"path": path, "type": "blob", "sha": git_blob_sha(content), "size": len(content)}
+                    for path, content in sorted(self.contents.items())]
+            return {"sha": "7e" * 20, "truncated": False, "tree": tree}
+        if path.startswith(f"{prefix}/git/blobs/") and path.rsplit("/", 1)[1] in self.blobs:
+            content = self.blobs[path.rsplit("/", 1)[1]]
+            return {"sha": path.rsplit("/", 1)[1], "size": len(content), "encoding": "base64",
+                    "content": base64.b64encode(content).decode("ascii")}
+        return None
+
+    def graphql(self, variables: dict) -> dict:
+        repository = {}
+        for name, oid in variables.items():
+            if not re.fullmatch(r"o\d+", name):
+                continue
+            content = self.blobs.get(oid)
+            repository[f"b{name[1:]}"] = None if content is None else {
+                "isBinary": False, "isTruncated": False, "byteSize": len(content), "text": content.decode("utf-8")
+            }
+        return {"data": {"rateLimit": {"cost": 1, "remaining": 4999}, "repository": repository}}
+
+
+class GitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status: int, body: bytes, content_type: str = "application/json", headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", "4999")
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        self.send_header("X-RateLimit-Resource", "core")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+        path = urlparse(self.path).path
+        raw_prefix = f"/raw/{REPO}/{COMMIT_SHA}/"
+        if path.startswith(raw_prefix):
+            content = self.server.contents.get(unquote(path[len(raw_prefix):]))
+            if content is None:
+                return self.reply(404, b"Not Found", "text/plain")
+            match = re.fullmatch(r"bytes=0-(\d+)", self.headers.get("Range", ""))
+            if match:
+                part = content[:int(match.group(1)) + 1]
+                return self.reply(206, part, "application/octet-stream",
+                                  {"Content-Range": f"bytes 0-{len(part) - 1}/{len(content)}"})
+            return self.reply(200, content, "application/octet-stream")
+
+        body = self.server.rest(path)
+        if body is None:
+            return self.reply(404, b'{"message": "Not Found"}')
+        out = json.dumps(body).encode("utf-8")
+        etag = f'"{hashlib.sha1(out).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self.reply(304, b"", headers={"ETag": etag})
+        self.reply(200, out, headers={"ETag": etag})
+
+    def do_POST(self):
+        with self.server.lock:
+            self.server.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if urlparse(self.path).path != "/graphql":
+            return self.reply(404, b'{"message": "Not Found"}')
+        self.reply(200, json.dumps(self.server.graphql(body.get("variables") or {})).encode("utf-8"))
+
+
+class FakeLLM(ThreadingHTTPServer):
+    """An OpenAI-compatible chat completions endpoint that answers every prompt with the same diagram after `latency` seconds."""
+
+    def __init__(self, latency: float, port: int = 0):
+        super().__init__(("127.0.0.1", port), LLMHandler)
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class LLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with self.server.lock:
+            self.server.calls += 1
+        time.sleep(self.server.latency)
+        prompt_tokens = len(json.dumps(request.get("messages", []))) // 4
+        content = f"```mermaid\n{FAKE_DIAGRAM}```\nThe API hands orders to the order service, which stores them in the database."
+        out = json.dumps({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 60, "total_tokens": prompt_tokens + 60},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+class FakeBackend(ThreadingHTTPServer):
+    """Counts the callbacks the service posts back for each job"""
+
+    def __init__(self, port: int):
+        super().__init__(("127.0.0.1", port), CallbackHandler)
+        self.callbacks = 0
+        self.statuses = {}
+        self.lock = threading.Lock()
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            status = json.loads(body or b"{}").get("status", "unknown")
+        except ValueError:
+            status = "unreadable"
+        with self.server.lock:
+            self.server.callbacks += 1
+            self.server.statuses[status] = self.server.statuses.get(status, 0) + 1
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def service_environment(github: FakeGitHub, llm: FakeLLM, state_dir: str) -> dict:
+    """Settings that point the service at the fakes (the model tiers config is written to state_dir)."""
+    tiers_path = os.path.join(state_dir, "model_tiers.json")
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_tiers.json")) as f:
+        tiers = json.load(f)
+    for tier in tiers["tiers"].values():
+        tier.update(provider="openai", model="fake-model")
+    with open(tiers_path, "w") as f:
+        json.dump(tiers, f)
+    return {
+        "GITHUB_API_URL": github.url,
+        "GITHUB_RAW_URL": f"{github.url}/raw",
+        "OPENAI_API_KEY": "load-test",
+        "OPENAI_API_BASE": llm.url,
+        "OPENAI_BASE_URL": llm.url,
+        "MODEL_TIERS_CONFIG": tiers_path,
+        "LLM_FALLBACK_PROVIDERS": "",
+    }
+
+
+def cold_state(state_dir: str) -> dict:
+    """Snapshot, index and memo directories of their own, so a started service begins cold."""
+    return {
+        "SNAPSHOT_DIR": os.path.join(state_dir, "snapshots"),
+        "VECTOR_INDEX_DIR": os.path.join(state_dir, "vector_index"),
+        "DOC_MEMO_PATH": os.path.join(state_dir, "doc_memo", "docs.db"),
+        "CALLBACK_DEAD_LETTER_DIR": os.path.join(state_dir, "dead_letters"),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_service(environment: dict, log_path: str, startup_timeout: float = 60.0):
+    """Runs the service under gunicorn (gunicorn.conf.py) and returns (process, url) once /health answers."""
+    port = free_port()
+    env = {**os.environ, "PRIVATE_KEY": os.environ.get("PRIVATE_KEY", ""), **environment,
+           "HTTP_BIND": f"127.0.0.1:{port}", "HTTP_GRACEFUL_TIMEOUT": "10"}
+    with open(log_path, "w") as log:
+        process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                                   cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The service exited during startup, see {log_path}")
+        try:
+            requests.get(f"{url}/health", timeout=1)
+            return process, url
+        except requests.exceptions.RequestException:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"The service did not start within {startup_timeout:.0f}s, see {log_path}")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(url: str, total: int, concurrency: int, technical: bool, callback_port: int, wait: float, files: int, llm_latency: float,
+        github_port: int = 0, llm_port: int = 0):
+    backend = serve(FakeBackend(callback_port))
+    github = serve(FakeGitHub(files, github_port))
+    llm = serve(FakeLLM(llm_latency, llm_port))
+    callback_url = f"http://127.0.0.1:{backend.server_address[1]}/callback"
+    state_dir = tempfile.mkdtemp(prefix="docgen-load-")
+    environment = service_environment(github, llm, state_dir)
+
+    process = None
+    if url:
+        print(f"Testing the running server at {url}; it must have been started with:")
+        print("\n".join(f"  {key}={value}" for key, value in environment.items()))
+    else:
+        log_path = os.path.join(state_dir, "service.log")
+        process, url = start_service({**environment, **cold_state(state_dir)}, log_path)
+        print(f"Service started at {url} (log: {log_path})")
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def send(_):
+        payload = {
+            "job_id": str(uuid.uuid4()),
+            "repo_url": f"https://github.com/{REPO}",
+            "callback_url": callback_url,
+            "tehnical": technical,
+        }
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{url}/api/start-generation", json=payload, timeout=30)
+            status = response.status_code
+        except requests.exceptions.RequestException:
+            status = "error"
+        return time.perf_counter() - start, status
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(send, range(total)))
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency * 1000 for latency, _ in results]
+        codes = {}
+        for _, status in results:
+            codes[status] = codes.get(status, 0) + 1
+
+        print(f"Requests:    {total} ({concurrency} concurrent) in {elapsed:.2f}s")
+        print(f"Throughput:  {total / elapsed:.1f} req/s")
+        print(f"Latency ms:  p50={percentile(latencies, 0.5):.1f} p95={percentile(latencies, 0.95):.1f} "
+              f"p99={percentile(latencies, 0.99):.1f} max={max(latencies):.1f}")
+        print(f"Responses:   {codes}")
+
+        accepted = codes.get(202, 0)
+        if wait > 0:
+            deadline = time.time() + wait
+            while time.time() < deadline and backend.callbacks < accepted:
+                time.sleep(0.5)
+        print(f"Callbacks:   {backend.callbacks} received {backend.statuses}")
+        print(f"Backends:    {github.requests} GitHub requests, {llm.calls} LLM calls")
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+        for server in (backend, github, llm):
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test /api/start-generation against local fake backends.")
+    parser.add_argument("--url", help="A running server to test instead of starting one.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--technical", action="store_true")
+    parser.add_argument("--files", type=int, default=200, help="Source files in the fake repository.")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the fake LLM takes per call.")
+    parser.add_argument("--callback-port", type=int, default=0)
+    # Fixed ports let a server started by hand (--url) be configured before the test runs.
+    parser.add_argument("--github-port", type=int, default=0)
+    parser.add_argument("--llm-port", type=int, default=0)
+    parser.add_argument("--wait", type=float, default=60.0, help="Seconds to wait for job callbacks.")
+    args = parser.parse_args()
+    run(args.url, args.requests, args.concurrency, args.technical, args.callback_port, args.wait, args.files, args.llm_latency,
+        args.github_port, args.llm_port)
@@ -1,46 +1,240 @@
 from flask import Flask, jsonify, request
 import time
+import dataclasses
+import numpy as np
+import math
+from urllib.parse import urlparse
 import threading
-import requests
-from github_service import SetUpGithub
+from concurrent.futures import ThreadPoolExecutor
+from github_service import GITHUB_API_URL, SetUpGithub
+from snapshot_store import SnapshotStore
+from token_manager import GitHubClientManager, RateLimitExhausted
+from callback_dispatcher import CallbackDispatcher
+from pipeline import Pipeline, Stage, StageCache
+from file_ranking import extract_skeleton, rank_files
+from duplicate_filter import PreFilter
+from doc_memo import DocumentationMemo
+from mermaid_graph import semantic_diff
+from path_index import PathIndex
+from exclusions import ExclusionEngine
+from circuit_breaker import CircuitOpenError, breakers
+from job_budget import CHARS_PER_TOKEN, JobBudget, estimate_tokens
+from admission import REJECT, AdmissionController, CostModel
+from fair_scheduler import BACKGROUND, INTERACTIVE, PRIORITIES, FairScheduler
 import os
 from dotenv import load_dotenv
-from ai import LLM
+from ai import LLM, STRUCTURE_TOKEN_BUDGET
+from ai_models_connection.tiering import ModelTierPolicy
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 REPO_NAME = os.getenv("REPO_NAME")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
+# Ordered fallbacks tried after the primary Google model, e.g. "openai:gpt-4o-mini,claude:claude-3-5-haiku-20241022"
+LLM_FALLBACK_PROVIDERS = os.getenv("LLM_FALLBACK_PROVIDERS", "")
+LLM_HEDGE_REQUESTS = os.getenv("LLM_HEDGE_REQUESTS", "false").lower() == "true"
+PROVIDER_API_KEYS = {
+    "google": GOOGLE_API_KEY,
+    "openai": os.getenv("OPENAI_API_KEY"),
+    "claude": os.getenv("ANTHROPIC_API_KEY"),
+}
+MODEL_TIERS_CONFIG = os.getenv("MODEL_TIERS_CONFIG", os.path.join(os.path.dirname(__file__), "model_tiers.json"))
+TIER_POLICY = ModelTierPolicy.load(MODEL_TIERS_CONFIG)
+
+CALLBACK_DEAD_LETTER_DIR = os.getenv("CALLBACK_DEAD_LETTER_DIR", os.path.join(os.path.dirname(__file__), "dead_letters"))
+CALLBACK_TIMEOUT = float(os.getenv("CALLBACK_TIMEOUT", "10"))
+CALLBACK_MAX_RETRIES = int(os.getenv("CALLBACK_MAX_RETRIES", "5"))
+CALLBACK_PROGRESS_EVENTS = os.getenv("CALLBACK_PROGRESS_EVENTS", "false").lower() == "true"
+CALLBACK_BATCH_PROGRESS = os.getenv("CALLBACK_BATCH_PROGRESS", "true").lower() == "true"
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(__file__), "snapshots"))
+SNAPSHOT_MAX_BYTES = int(os.getenv("SNAPSHOT_MAX_BYTES", str(512 * 1024 * 1024)))
+
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "4"))
+STAGE_CACHE_ENTRIES = int(os.getenv("STAGE_CACHE_ENTRIES", "256"))
+STAGE_CACHE_DIR = os.getenv("STAGE_CACHE_DIR")
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(os.path.dirname(__file__), "vector_index"))
+RANK_TOP_K = int(os.getenv("RANK_TOP_K", "40"))
+# Documentation memoized by normalized Mermaid fingerprint, shared across runs.
+DOC_MEMO_PATH = os.getenv("DOC_MEMO_PATH", os.path.join(os.path.dirname(__file__), "doc_memo", "docs.db"))
+DOC_MEMO_MAX_PATCH_EDGES = int(os.getenv("DOC_MEMO_MAX_PATCH_EDGES", "3"))
+
+ARCHITECTURE_QUERY = "model entity schema table migration controller route view service repository api handler component store state database"
+
+# Requests reserved against a token's rate limit before a job starts, and how long a job
+# may wait for an exhausted token to reset before it is failed up front.
+JOB_GITHUB_REQUESTS = int(os.getenv("JOB_GITHUB_REQUESTS", "100"))
+GITHUB_MAX_RATE_WAIT = float(os.getenv("GITHUB_MAX_RATE_WAIT", "900"))
+GITHUB_APP_ID = os.getenv("GITHUB_APP_ID")
+GITHUB_APP_PRIVATE_KEY = (os.getenv("GITHUB_APP_PRIVATE_KEY") or "").replace("\\n", "\n") or None
+
+# Background generation jobs run on their own bounded pool, never on the HTTP worker threads.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Jobs are scheduled fairly across tenants ("tenant_id" in the request, else the installation
+# or the repository owner), charged by estimated tokens plus SCHEDULER_REQUEST_COST per GitHub
+# request and corrected by what they actually used. A job is "interactive" (served first) when
+# its cost is at most INTERACTIVE_MAX_COST, else "background"; a request may ask for "background".
+# TENANT_WEIGHTS gives tenants a larger share, e.g. "acme:2,trial:0.5" (weights must be positive).
+# Queues are per process, so fairness holds across all jobs with one gunicorn worker.
+SCHEDULER_QUANTUM = float(os.getenv("SCHEDULER_QUANTUM", "10000"))
+SCHEDULER_REQUEST_COST = float(os.getenv("SCHEDULER_REQUEST_COST", "200"))
+SCHEDULER_RESERVED_INTERACTIVE = int(os.getenv("SCHEDULER_RESERVED_INTERACTIVE", "1"))
+SCHEDULER_BACKGROUND_SHARE = int(os.getenv("SCHEDULER_BACKGROUND_SHARE", "4"))
+INTERACTIVE_MAX_COST = float(os.getenv("INTERACTIVE_MAX_COST", "40000"))
+TENANT_WEIGHTS = {
+    tenant.strip(): float(weight) for tenant, _, weight in
+    (entry.partition(":") for entry in os.getenv("TENANT_WEIGHTS", "").split(",") if ":" in entry)
+}
+FLASK_DEBUG = os.getenv("FLASK_DEBUG", "false").lower() == "true"
+
+# Files are cut to this many characters in the prompt, so larger ones are only fetched up to it
+# (as bytes; HTTP Range against raw content). PARTIAL_FETCH=false downloads whole blobs.
+KEY_FILE_MAX_CHARS = int(os.getenv("KEY_FILE_MAX_CHARS", "20000"))
+PARTIAL_FETCH = os.getenv("PARTIAL_FETCH", "true").lower() == "true"
+# Blobs per GraphQL query to start with (it adapts to the query cost); 0 fetches one blob per REST request.
+GRAPHQL_BATCH_SIZE = int(os.getenv("GRAPHQL_BATCH_SIZE", "25"))
+
+# Circuit breakers around GitHub and the LLM providers: a backend whose error rate over
+# BREAKER_WINDOW seconds reaches BREAKER_ERROR_RATE (after BREAKER_MIN_CALLS calls) is cut
+# off for BREAKER_OPEN_SECONDS, then probed. A new job waits up to BREAKER_HOLD_SECONDS
+# for an open backend before it is failed.
+BREAKER_WINDOW = float(os.getenv("BREAKER_WINDOW", "60"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HOLD_SECONDS = float(os.getenv("BREAKER_HOLD_SECONDS", "30"))
+BACKENDS = ("github", "llm")
+
+# Default per-job ceilings, overridable per request with "deadline_seconds" and "max_tokens"
+# (0 = none). A job short of either gets skeleton-only key files, fewer files, the locally
+# rendered structure diagram and no LLM-written docs, and is delivered with "partial": true.
+JOB_DEADLINE_SECONDS = float(os.getenv("JOB_DEADLINE_SECONDS", "0"))
+JOB_TOKEN_BUDGET = int(os.getenv("JOB_TOKEN_BUDGET", "0"))
+# What a diagram or documentation call is expected to take, to decide whether it still fits.
+LLM_CALL_SECONDS = float(os.getenv("LLM_CALL_SECONDS", "30"))
+DIAGRAM_OUTPUT_TOKENS = int(os.getenv("DIAGRAM_OUTPUT_TOKENS", "2000"))
+DOCS_OUTPUT_TOKENS = int(os.getenv("DOCS_OUTPUT_TOKENS", "3000"))
+DOCS_SKIPPED = "Documentation was not generated: the job ran out of budget."
+
+# Admission control: a job is estimated from the repository's size and language mix and
+# rejected (503) when the queued work would keep the workers busy for more than
+# ADMISSION_MAX_BACKLOG_SECONDS or ADMISSION_MAX_JOBS are queued. A job the GitHub token or
+# the LLM token rate (LLM_TOKENS_PER_MINUTE, 0 = unknown) can't cover yet is started up to
+# ADMISSION_MAX_DEFER_SECONDS later, or rejected (429). Repository profiles are fetched in the
+# background and refreshed after ADMISSION_PROFILE_TTL seconds; until a repository has one, its
+# jobs get a default estimate.
+ADMISSION_MAX_BACKLOG_SECONDS = float(os.getenv("ADMISSION_MAX_BACKLOG_SECONDS", "900"))
+ADMISSION_MAX_JOBS = int(os.getenv("ADMISSION_MAX_JOBS", "100"))
+ADMISSION_MAX_DEFER_SECONDS = float(os.getenv("ADMISSION_MAX_DEFER_SECONDS", "300"))
+ADMISSION_PROFILE_TTL = float(os.getenv("ADMISSION_PROFILE_TTL", "600"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+
+# Files above this size are excluded before fetching (a repo's .docgen.json may set max_file_bytes).
+MAX_FILE_BYTES = int(os.getenv("MAX_FILE_BYTES", str(1024 * 1024)))
+
+KEY_FILES_CHAR_LIMIT = 400000
+
 IGNORED_DIRS = {'.git', '.github', '.vscode', 'node_modules', 'venv', 'env', '__pycache__', 'dist', 'build', 'vendor'}
 ALLOWED_EXTENSIONS = {'.py', '.js', '.jsx', '.ts', '.tsx', '.php', '.java', '.go', '.rb', '.rs', '.c', '.cpp', '.h', '.cs', '.html', '.css', '.sql', '.prisma', '.json', '.yaml', '.yml', '.xml', '.md'}
 
 app = Flask(__name__)
 
-def get_all_files(contents, repo):
+breakers.configure(window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS, error_rate=BREAKER_ERROR_RATE, open_seconds=BREAKER_OPEN_SECONDS)
+
+scheduler = FairScheduler(
+    workers=JOB_WORKERS,
+    quantum=SCHEDULER_QUANTUM,
+    reserved_interactive=SCHEDULER_RESERVED_INTERACTIVE,
+    background_share=SCHEDULER_BACKGROUND_SHARE,
+    tenant_weights=TENANT_WEIGHTS
+)
+
+snapshot_store = SnapshotStore(root_dir=SNAPSHOT_DIR, max_bytes=SNAPSHOT_MAX_BYTES)
+stage_cache = StageCache(max_entries=STAGE_CACHE_ENTRIES, cache_dir=STAGE_CACHE_DIR)
+doc_memo = DocumentationMemo(DOC_MEMO_PATH, max_patch_edges=DOC_MEMO_MAX_PATCH_EDGES)
+github_clients = GitHubClientManager(max_wait=GITHUB_MAX_RATE_WAIT, app_id=GITHUB_APP_ID, app_private_key=GITHUB_APP_PRIVATE_KEY,
+                                     api_url=GITHUB_API_URL)
+
+cost_model = CostModel(
+    prompt_char_limit=KEY_FILES_CHAR_LIMIT,
+    fixed_tokens=STRUCTURE_TOKEN_BUDGET + 2 * DIAGRAM_OUTPUT_TOKENS + DOCS_OUTPUT_TOKENS,
+    llm_call_seconds=LLM_CALL_SECONDS,
+    blobs_per_request=GRAPHQL_BATCH_SIZE or 1
+)
+admission = AdmissionController(
+    workers=JOB_WORKERS,
+    max_backlog_seconds=ADMISSION_MAX_BACKLOG_SECONDS,
+    max_jobs=ADMISSION_MAX_JOBS,
+    llm_tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+    max_defer_seconds=ADMISSION_MAX_DEFER_SECONDS
+)
+# Profiles by (repository, credential), fetched off the request thread; see repo_profile().
+repo_profiles = {}
+repo_profiles_refreshing = set()
+repo_profiles_lock = threading.Lock()
+profile_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="repo-profile")
+
+callbacks = CallbackDispatcher(
+    dead_letter_dir=CALLBACK_DEAD_LETTER_DIR,
+    timeout=CALLBACK_TIMEOUT,
+    max_retries=CALLBACK_MAX_RETRIES,
+    batch_progress=CALLBACK_BATCH_PROGRESS
+)
+
+
+def report_progress(callback_url, job_id, stage, **details):
+    """Sends a progress event to the callback URL when CALLBACK_PROGRESS_EVENTS is enabled."""
+    if CALLBACK_PROGRESS_EVENTS:
+        callbacks.send_progress(callback_url, job_id, stage, **details)
+
+
+def get_fallback_pool():
     """
-    Recursively fetches all files from the repo, skipping non-essential directories
-    to prevent timeouts and useless noise.
+    Builds the ordered (provider, model, api_key) fallbacks tried after each tier's own
+    model, keeping only the ones that have an API key.
     """
-    files = []
-    while contents:
-        file_content = contents.pop(0)
-        
-      
-        if file_content.type == "dir":
-            if file_content.name not in IGNORED_DIRS:
-                try:
-                    contents.extend(repo.get_contents(file_content.path))
-                except Exception as e:
-                    print(f"Error accessing {file_content.path}: {e}")
+    pool = []
+    for entry in LLM_FALLBACK_PROVIDERS.split(","):
+        if ":" not in entry:
+            continue
+        provider_name, model = (part.strip() for part in entry.split(":", 1))
+        api_key = PROVIDER_API_KEYS.get(provider_name.lower())
+        if api_key:
+            pool.append((provider_name, model, api_key))
         else:
-            files.append(file_content)
-    return files
+            print(f"Skipping fallback {provider_name}:{model} - no API key configured")
+    return pool
 
 
-def get_key_technical_files(all_files, framework: str):
+def get_all_files(repo_service):
+    """
+    Lists all files from the repo tree, skipping non-essential directories, ignored,
+    generated and vendored files and oversized ones (see ExclusionEngine) before any
+    blob is fetched. The tree comes from one conditional request and blob contents
+    are served from the snapshot store when unchanged.
+    Returns the files and the excluded file counts by reason.
     """
-    Filters repository files. Since we are using Gemini Flash (High Context),
-    we try to pack as much code as possible, prioritizing framework-specific paths.
+    tree = repo_service.get_files()
+    by_path = {file.path: file for file in tree}
+    engine = ExclusionEngine.for_tree(
+        by_path, lambda path: by_path[path].read_text(), ignored_dirs=IGNORED_DIRS, max_file_bytes=MAX_FILE_BYTES
+    )
+    files = engine.filter(tree)
+    print(f"Kept {len(files)} of {len(tree)} files, excluded: {engine.report()}")
+    return files, engine.report()
+
+
+def get_key_technical_files(all_files, framework: str, index_name: str = None, prefilter: PreFilter = None, path_index: PathIndex = None,
+                            repo_service: SetUpGithub = None, budget: JobBudget = None):
+    """
+    Filters repository files. Files are ranked by how closely their skeleton
+    (imports, classes, functions) matches the framework's architecture and how central
+    they are to the repo, and the top RANK_TOP_K are packed into the prompt.
+    path_index must be built from all_files, in the same order.
+    With a budget, the prompt only gets the characters its tokens can pay for (files are
+    then packed as skeletons), and fetching stops while there is still time for the LLM.
+    Returns the packed files and whether the budget cut them short.
     """
     key_files_content = ""
     
@@ -55,119 +249,410 @@ def get_key_technical_files(all_files, framework: str):
 
     search_paths = patterns.get(framework, ["src", "app", "lib", "models", "controllers"])
 
-    TOTAL_CHAR_LIMIT = 400000 
+    TOTAL_CHAR_LIMIT = KEY_FILES_CHAR_LIMIT
     current_chars = 0
     
     files_processed = 0
 
-    def sort_priority(f):
-        is_priority = any(p in f.path for p in search_paths)
-        return 0 if is_priority else 1
-
-    sorted_files = sorted(all_files, key=sort_priority)
-
-    for file in sorted_files:
-
-        if current_chars >= TOTAL_CHAR_LIMIT:
-            key_files_content += f"\n\n--- [SYSTEM] STOPPED: Context limit reached ({current_chars} chars) ---"
+    char_limit, skeletons, cut = TOTAL_CHAR_LIMIT, False, False
+    if budget:
+        # The diagram prompt also carries the structure summary, and the docs call comes after it.
+        char_limit = budget.char_allowance(TOTAL_CHAR_LIMIT, STRUCTURE_TOKEN_BUDGET + 2 * DIAGRAM_OUTPUT_TOKENS + DOCS_OUTPUT_TOKENS)
+        if char_limit < TOTAL_CHAR_LIMIT:
+            skeletons = cut = True
+            budget.degrade("key_files", f"key files packed as skeletons within {char_limit} chars")
+
+    # Files on a framework path (matched as whole path components) go first; both masks
+    # come from the path index instead of scanning every path for every pattern.
+    path_index = path_index or PathIndex.build([f.path for f in all_files])
+    allowed = path_index.input_mask(path_index.extension_mask(ALLOWED_EXTENSIONS))
+    priority = path_index.input_mask(path_index.match_mask(search_paths))
+    positions = np.flatnonzero(allowed)
+    candidates = [all_files[i] for i in positions[np.argsort(~priority[positions], kind="stable")]]
+
+    query = f"{framework} {' '.join(search_paths)} {ARCHITECTURE_QUERY}"
+    index_path = os.path.join(VECTOR_INDEX_DIR, f"{index_name.replace('/', '__')}.npz") if index_name else None
+    # Fetching for the ranking and the prompt stops in time for the LLM calls.
+    fetch_deadline = budget.deadline - 2 * LLM_CALL_SECONDS if budget and budget.deadline is not None else None
+    prefetch = (lambda files: repo_service.prefetch_blobs(files, deadline=fetch_deadline)) if repo_service else None
+    # Skeletons are embedded from the same bounded prefix the prompt reads, so a large
+    # or binary file is never downloaded whole just to be ranked.
+    ranked_files = rank_files(candidates, query, index_path=index_path, deadline=fetch_deadline,
+                              prefetch=(lambda files: prefetch([file for file in files if file.size <= KEY_FILE_MAX_CHARS])) if prefetch else None,
+                              read=lambda file: file.read_text(KEY_FILE_MAX_CHARS))
+
+    # Fetch ranked files a window at a time and let the pre-filter drop generated files
+    # and near-duplicates, until RANK_TOP_K files are packed or the budget is spent.
+    prefilter = prefilter or PreFilter()
+    position = 0
+    while position < len(ranked_files) and files_processed < RANK_TOP_K and current_chars < char_limit:
+        if budget and not budget.can_afford(seconds=2 * LLM_CALL_SECONDS):
+            cut = True
+            budget.degrade("key_files", f"deadline: stopped after {files_processed} files")
             break
-
-        _, ext = os.path.splitext(file.name)
-        if ext in ALLOWED_EXTENSIONS:
+        window = ranked_files[position:position + RANK_TOP_K - files_processed]
+        position += len(window)
+
+        # Only the part of a file that can end up in the prompt is downloaded: small files
+        # in batched GraphQL queries, large ones as a prefix.
+        if prefetch:
+            prefetch([file for file in window if file.size <= KEY_FILE_MAX_CHARS])
+        batch = []
+        for file in window:
             try:
-                
-                content = file.decoded_content.decode('utf-8')
-                
-                if len(content) > 20000: 
-                    content = content[:20000] + "\n...(truncated file too large)..."
-
-                file_entry = f"\n\n--- FILE: {file.path} ---\n{content}"
-                
-                key_files_content += file_entry
-                current_chars += len(file_entry)
-                files_processed += 1
-                
+                batch.append((file.path, file.read_text(KEY_FILE_MAX_CHARS), file.size > KEY_FILE_MAX_CHARS))
             except Exception as e:
                 continue
+        truncated = {path for path, _, cut in batch if cut}
+
+        for path, content in prefilter.filter_batch([(path, content) for path, content, _ in batch]):
+
+            if current_chars >= char_limit:
+                key_files_content += f"\n\n--- [SYSTEM] STOPPED: Context limit reached ({current_chars} chars) ---"
+                break
+
+            if skeletons:
+                file_entry = f"\n\n--- FILE: {path} (declarations only) ---\n{extract_skeleton('', content).lstrip()}"
+            else:
+                if path in truncated or len(content) > KEY_FILE_MAX_CHARS:
+                    content = content[:KEY_FILE_MAX_CHARS] + "\n...(truncated file too large)..."
+                file_entry = f"\n\n--- FILE: {path} ---\n{content}"
+            if cut and current_chars + len(file_entry) > char_limit:
+                # Over a budgeted limit nothing may spill past it; a smaller file may still fit.
+                continue
+            
+            key_files_content += file_entry
+            current_chars += len(file_entry)
+            files_processed += 1
     
+    print(f"Skipped files: {prefilter.report()}")
+    if repo_service:
+        print(f"Partial fetches skipped {repo_service.bytes_skipped / 1024:.0f} KB of large files")
     print(f"Processed {files_processed} files. Total Load: {current_chars} chars.")
-    return key_files_content
+    return key_files_content, cut
 
 
-def generate_technical_docs_process(job_id, repo_url, token, callback_url):
-    print(f"[{job_id}] ⚙️ Starting TECHNICAL generation for: {repo_url}")
-    
+def authenticate_repo(github_service):
+    github_service.authenticate()
+    return github_service
+
+
+def build_llm(languages, budget):
+    return LLM(repo_languages=languages, tier_policy=TIER_POLICY, api_keys=PROVIDER_API_KEYS, provider_pool=get_fallback_pool(), hedge=LLM_HEDGE_REQUESTS, doc_memo=doc_memo,
+               budget=budget)
+
+
+def select_key_files(all_files, framework, repo_service, path_index, budget):
+    prefilter = PreFilter()
+    key_code, cut = get_key_technical_files(all_files, framework, index_name=repo_service.repo.full_name, prefilter=prefilter,
+                                            path_index=path_index, repo_service=repo_service, budget=budget)
+    return key_code, prefilter.report(), cut
+
+
+def diagram_within_budget(kind, generate, prompt_chars, llm, path_index, budget):
+    """
+    Runs generate() (an LLM diagram call with a prompt of about prompt_chars) if the job's
+    budget can still pay for it and the documentation after it. Otherwise, or if the
+    budget ran out during the call, the structure diagram is rendered locally instead.
+    """
+    needed = estimate_tokens(prompt_chars) + 2 * DIAGRAM_OUTPUT_TOKENS + DOCS_OUTPUT_TOKENS
+    if budget.can_afford(needed, 2 * LLM_CALL_SECONDS):
+        result = generate()
+        if result.success or not budget.exhausted():
+            return result
+    budget.degrade(kind, "structure diagram rendered locally instead of an LLM diagram")
+    return dataclasses.replace(llm.generate_repository_structure(path_index, annotate=False), degraded=True)
+
+
+def docs_within_budget(kind, llm, diagram, repo_service, budget):
+    """Documentation for the diagram; when the budget cannot pay for it, only memoized text is used."""
+    scope = doc_scope(repo_service, kind)
+    if budget.can_afford(estimate_tokens(diagram.mermaid_code) + DOCS_OUTPUT_TOKENS, LLM_CALL_SECONDS):
+        return llm.generate_documentation(diagram, scope=scope)
+    memoized = doc_memo.lookup(diagram.mermaid_code, scope)
+    if memoized is not None:
+        return memoized
+    budget.degrade(f"{kind}_docs", "documentation skipped")
+    return DOCS_SKIPPED
+
+
+def doc_scope(repo_service, kind):
+    return f"{repo_service.repo.full_name}:{kind}"
+
+
+def keep_if_unchanged(result, repo_service, kind):
+    """
+    LLM output varies between runs. When the new diagram means the same as the previous
+    one for this repo, the previous diagram is kept, so clients see no change and its
+    memoized documentation is reused instead of being regenerated.
+    """
+    if result.degraded:
+        # A fallback diagram is neither compared with nor remembered as the repo's diagram.
+        return result, True
+    scope = doc_scope(repo_service, kind)
+    previous = doc_memo.previous_diagram(scope)
+    if result.success and previous:
+        diff = semantic_diff(previous, result.mermaid_code)
+        if diff.is_empty():
+            print(f"  → {kind} diagram unchanged semantically, keeping the previous one")
+            return dataclasses.replace(result, mermaid_code=previous), False
+        print(f"  → {kind} diagram changed: {diff.summary()}")
+    if result.success:
+        doc_memo.record_diagram(scope, result.mermaid_code)
+    return result, True
+
+
+def is_documentation_ok(docs):
+    return not docs.startswith("Error generating documentation") and docs != DOCS_SKIPPED
+
+
+def is_full_diagram(result):
+    return result.success and not result.degraded
+
+
+# Stages shared by every doc type: repository listing, languages and framework detection.
+# `languages` and `files` only depend on `authenticate`, so they run concurrently.
+REPO_STAGES = [
+    Stage("authenticate", authenticate_repo, inputs=["github_service"], outputs=["repo_service"]),
+    Stage("languages", lambda repo_service: list(repo_service.get_languages().keys()), inputs=["repo_service"], outputs=["languages"]),
+    Stage("files", get_all_files, inputs=["repo_service"], outputs=["all_files", "excluded_files"]),
+    Stage("llm", build_llm, inputs=["languages", "budget"], outputs=["llm"]),
+    Stage(
+        "path_index", lambda all_files: PathIndex.build([f.path for f in all_files], [f.size for f in all_files]),
+        inputs=["all_files"], outputs=["path_index"]
+    ),
+    Stage(
+        "framework", lambda llm, path_index, languages: llm.detect_framework(path_index),
+        inputs=["llm", "path_index", "languages"], outputs=["framework"],
+        cache_inputs=["path_index", "languages"]
+    ),
+]
+
+TECHNICAL_STAGES = REPO_STAGES + [
+    Stage(
+        "key_files", select_key_files,
+        inputs=["all_files", "framework", "repo_service", "path_index", "budget"], outputs=["key_code", "skipped_files", "key_files_cut"],
+        cache_inputs=["all_files", "framework", "budget"], cache_if=lambda result: not result[2]
+    ),
+    Stage(
+        "technical_diagram",
+        lambda llm, framework, path_index, key_code, budget: diagram_within_budget(
+            "technical_diagram", lambda: llm.generate_technical_architecture(framework, path_index, key_code),
+            len(key_code) + STRUCTURE_TOKEN_BUDGET * CHARS_PER_TOKEN, llm, path_index, budget
+        ),
+        inputs=["llm", "framework", "path_index", "key_code", "budget"], outputs=["tech_result"],
+        cache_inputs=["framework", "path_index", "key_code"], cache_if=is_full_diagram
+    ),
+    Stage(
+        "technical_stable", lambda tech_result, repo_service: keep_if_unchanged(tech_result, repo_service, "technical"),
+        inputs=["tech_result", "repo_service"], outputs=["tech_diagram", "diagram_changed"]
+    ),
+    Stage(
+        "technical_docs", lambda llm, tech_diagram, repo_service, budget: docs_within_budget("technical", llm, tech_diagram, repo_service, budget),
+        inputs=["llm", "tech_diagram", "repo_service", "budget"], outputs=["docs"],
+        cache_inputs=["tech_diagram"], cache_if=is_documentation_ok
+    ),
+]
+
+STANDARD_STAGES = REPO_STAGES + [
+    Stage(
+        "structure_summary", lambda llm, path_index: llm._summarize_structure(path_index),
+        inputs=["llm", "path_index"], outputs=["structure_summary"]
+    ),
+    Stage(
+        "architecture_diagram",
+        lambda llm, framework, structure_summary, path_index, budget: diagram_within_budget(
+            "architecture_diagram", lambda: llm.generate_high_level_architecture(framework, structure_summary),
+            len(structure_summary), llm, path_index, budget
+        ),
+        inputs=["llm", "framework", "structure_summary", "path_index", "budget"], outputs=["arch_result"],
+        cache_inputs=["framework", "structure_summary"], cache_if=is_full_diagram
+    ),
+    Stage(
+        "architecture_stable", lambda arch_result, repo_service: keep_if_unchanged(arch_result, repo_service, "architecture"),
+        inputs=["arch_result", "repo_service"], outputs=["arch_diagram", "diagram_changed"]
+    ),
+    Stage(
+        "architecture_docs", lambda llm, arch_diagram, repo_service, budget: docs_within_budget("architecture", llm, arch_diagram, repo_service, budget),
+        inputs=["llm", "arch_diagram", "repo_service", "budget"], outputs=["docs"],
+        cache_inputs=["arch_diagram"], cache_if=is_documentation_ok
+    ),
+]
+
+
+def run_stages(stages, job_id, callback_url, repo_url, token, budget):
+    """
+    Runs a stage DAG for a job, reporting each finished stage as progress.
+    GitHub requests are reserved against the token first, so a job on an exhausted
+    token waits for the reset here instead of failing halfway through.
+    The job's budget is an input of every stage that calls the LLM.
+    """
+    pipeline = Pipeline(
+        stages,
+        cache=stage_cache,
+        max_workers=PIPELINE_WORKERS,
+        on_stage=lambda stage, elapsed, cached: report_progress(callback_url, job_id, stage.name, elapsed=round(elapsed, 2), cached=cached)
+    )
+
+    # A job that would only hit a backend known to be down is held briefly, then failed.
+    # Neither wait outlasts the job's deadline.
+    budget.bounded_wait(lambda limit: breakers.wait_for(BACKENDS, timeout=limit), BREAKER_HOLD_SECONDS, CircuitOpenError)
+    reservation = budget.bounded_wait(lambda limit: github_clients.acquire(token, needed=JOB_GITHUB_REQUESTS, max_wait=limit),
+                                      github_clients.max_wait, RateLimitExhausted)
+    github_service = SetUpGithub(github_token=token, repo_url=repo_url, snapshot_store=snapshot_store, client_manager=github_clients,
+                                 partial_fetch=PARTIAL_FETCH, graphql_batch_size=GRAPHQL_BATCH_SIZE, reservation=reservation,
+                                 budget=budget)
     try:
-        repoClass = SetUpGithub(github_token=token, repo_url=repo_url)
-        repo = repoClass.authenticate()
-        
-        languages = list(repo.get_languages().keys())
-        llm = LLM(repo_languages=languages, model="gemini-2.5-flash", api_key=GOOGLE_API_KEY, user_choice="google")
+        return pipeline.run(github_service=github_service, budget=budget)
+    finally:
+        print(f"GitHub requests for this job: {github_service.requests_made}")
+        budget.github_requests += github_service.requests_made
+        github_clients.release(reservation)
 
-        contents = repo.get_contents("")
-        all_files = get_all_files(contents, repo)
-        file_paths = [f.path for f in all_files]
-        framework = llm.detect_framework(file_paths)
-        print(f"[{job_id}] Framework: {framework}")
 
-        print("Extracting key file contents for deep analysis...")
-        key_code = get_key_technical_files(all_files, framework)
+def failure_result(job_id, error):
+    """Callback payload for a failed job; an open circuit says when retrying makes sense."""
+    result = {"job_id": job_id, "status": "failed", "error": str(error)}
+    if isinstance(error, CircuitOpenError):
+        result["retry_after"] = round(error.retry_after)
+    return result
 
-        print("Generating technical architecture diagram...")
-        tech_result = llm.generate_technical_architecture(framework, file_paths, key_code)
 
-        print("Generating technical specs...")
-        docs = llm.generate_documentation(tech_result)
+def repo_profile(repo_url, token, installation_id=None):
+    """
+    The repository's profile for admission, as last seen with this credential (another token
+    may not see the same repository), or None for a default estimate. The request thread
+    never waits on GitHub: a missing or stale profile is fetched in the background, for the
+    next job.
+    """
+    key = (repo_url, f"installation:{installation_id}" if installation_id else github_clients.token_key(token))
+    with repo_profiles_lock:
+        cached = repo_profiles.get(key)
+        refresh = (not cached or time.monotonic() - cached[0] >= ADMISSION_PROFILE_TTL) and key not in repo_profiles_refreshing
+        if refresh:
+            repo_profiles_refreshing.add(key)
+    if refresh:
+        profile_pool.submit(refresh_profile, key, repo_url, token)
+    return cached[1] if cached else None
+
+
+def refresh_profile(key, repo_url, token):
+    try:
+        profile = SetUpGithub(github_token=token, repo_url=repo_url, snapshot_store=snapshot_store, client_manager=github_clients).get_profile()
+    except Exception as e:
+        print(f"Could not profile {repo_url}: {e}")
+        profile = None
+    now = time.monotonic()
+    with repo_profiles_lock:
+        repo_profiles_refreshing.discard(key)
+        # A failed refresh keeps the last profile (or None) until the TTL is up again.
+        if profile is None and key in repo_profiles:
+            profile = repo_profiles[key][1]
+        repo_profiles[key] = (now, profile)
+        for stale in [k for k, (fetched, _) in repo_profiles.items() if now - fetched > 10 * ADMISSION_PROFILE_TTL]:
+            del repo_profiles[stale]
+
+
+def unavailable_backend():
+    """(backend, retry_after) for a backend whose circuit is open, or None."""
+    for name, state in breakers.snapshot().items():
+        if name in BACKENDS and state["state"] == "open":
+            return name, state["retry_after"]
+    return None
+
+
+def job_cost(tokens, github_requests):
+    """What a job is charged in fair scheduling, in tokens."""
+    return tokens + github_requests * SCHEDULER_REQUEST_COST
+
+
+def tenant_for(data, repo_url):
+    tenant = data.get('tenant_id') or data.get('installation_id')
+    if tenant:
+        return str(tenant)
+    path = urlparse(repo_url).path.strip("/")
+    return path.split("/")[0] or "anonymous"
+
+
+def run_admitted(process, job_id, repo_url, token, callback_url, budget, tenant, priority, cost):
+    """
+    Runs a job process, keeping the admission controller's books on what is still queued
+    and settling the tenant's scheduling charge with what the job actually used.
+    """
+    admission.started(job_id)
+    try:
+        process(job_id, repo_url, token, callback_url, budget)
+    finally:
+        admission.finished(job_id)
+        scheduler.settle(tenant, priority, cost, job_cost(budget.tokens_used, budget.github_requests))
+
+
+def submit_deferred(*args):
+    """Queues a deferred job once its wait is over, unless the worker is shutting down by then."""
+    try:
+        scheduler.submit(*args)
+    except RuntimeError as e:
+        admission.finished(args[0])
+        print(e)
+
+
+def shutdown(timeout=30.0):
+    """
+    Drains the worker before it exits (see worker_exit in gunicorn.conf.py): no new jobs are
+    started, queued and running ones get up to timeout seconds, then buffered progress and
+    queued callbacks are delivered with whatever time is left.
+    """
+    deadline = time.monotonic() + timeout
+    profile_pool.shutdown(wait=False, cancel_futures=True)
+    unfinished = scheduler.shutdown(timeout)
+    if unfinished:
+        print(f"Shutting down with {unfinished} job(s) unfinished")
+    callbacks.close(max(deadline - time.monotonic(), 1.0))
+
+
+def budget_fields(budget):
+    """Result fields saying whether the job was cut short by its budget, and what it spent."""
+    return {"partial": budget.partial, "budget": budget.report()}
+
+
+def generate_technical_docs_process(job_id, repo_url, token, callback_url, budget):
+    print(f"[{job_id}] ⚙️ Starting TECHNICAL generation for: {repo_url}")
+    
+    try:
+        values = run_stages(TECHNICAL_STAGES, job_id, callback_url, repo_url=repo_url, token=token, budget=budget)
+        framework = values["framework"]
+        print(f"[{job_id}] Framework: {framework}")
 
-        
         final_result = {
             "job_id": job_id,
             "status": "completed",
             "type": "technical",
             "summary": f"Technical Deep Dive into {framework} Data & Logic Layer.",
-            "architecture_diagram": tech_result.mermaid_code,
-            "readme_suggestion": docs
+            "architecture_diagram": values["tech_diagram"].mermaid_code,
+            "diagram_changed": values["diagram_changed"],
+            "readme_suggestion": values["docs"],
+            "skipped_files": values["skipped_files"],
+            "excluded_files": values["excluded_files"],
+            **budget_fields(budget)
         }
         
-        requests.post(callback_url, json=final_result)
-        print(f"[{job_id}] ✅ Technical Docs Sent.")
+        callbacks.send(callback_url, final_result)
+        print(f"[{job_id}] ✅ Technical Docs queued for delivery.")
 
     except Exception as e:
         print(f"[{job_id}] ❌ Error: {e}")
-        requests.post(callback_url, json={"job_id": job_id, "status": "failed", "error": str(e)})
-
-
-def generate_docs_process(job_id, repo_url, token, callback_url):
-    repoClass = SetUpGithub(github_token=token, repo_url=repo_url)
-    repo = repoClass.authenticate()
-
-    languages = repo.get_languages()
-    repo_languages = list(languages.keys())
-
-    llm = LLM(repo_languages=repo_languages, model="gemini-2.5-flash", api_key=GOOGLE_API_KEY, user_choice="google")
-
-    print(f"Fetching files from repository: {repo_url}")
-    contents = repo.get_contents("")
-    all_files = get_all_files(contents, repo)
-
-    print("Generating repository structure diagram...")
-    file_paths = [f.path for f in all_files]
-    framework_type = llm.detect_framework(file_paths)
-    structure_summary = llm._summarize_structure(file_paths)
-    print("Generating high-level architecture diagram...")
-    arch_result = llm.generate_high_level_architecture(framework_type, structure_summary)
-
-    print("Generating documentation text...")
-    docs = llm.generate_documentation(arch_result)
+        callbacks.send(callback_url, failure_result(job_id, e))
 
 
+def generate_docs_process(job_id, repo_url, token, callback_url, budget):
     """
-    This function runs in the background. It simulates cloning, 
-    analyzing, and generating docs.
+    This function runs in the background. It lists the repository,
+    analyzes its structure and generates the high-level docs.
     """
     print(f"[{job_id}] 🚀 Starting generation for: {repo_url}")
     
     try:
+        values = run_stages(STANDARD_STAGES, job_id, callback_url, repo_url=repo_url, token=token, budget=budget)
     
         final_result = {
             "job_id": job_id,
@@ -175,29 +660,24 @@ def generate_docs_process(job_id, repo_url, token, callback_url):
             "summary": "Application handling user authentication...",
             
           
-            "architecture_diagram": arch_result.mermaid_code,
+            "architecture_diagram": values["arch_diagram"].mermaid_code,
+            "diagram_changed": values["diagram_changed"],
             
             "files": [
             
             ],
-            "readme_suggestion": docs
+            "readme_suggestion": values["docs"],
+            "excluded_files": values["excluded_files"],
+            **budget_fields(budget)
         }
         
    
-        response = requests.post(callback_url, json=final_result)
-        
-        if response.status_code == 200:
-            print(f"[{job_id}]  Laravel acknowledged receipt.")
-        else:
-            print(f"[{job_id}]  Laravel returned error: {response.status_code}")
+        callbacks.send(callback_url, final_result)
+        print(f"[{job_id}]  Result queued for delivery to Laravel.")
 
     except Exception as e:
-     
-        requests.post(callback_url, json={
-            "job_id": job_id, 
-            "status": "failed", 
-            "error": str(e)
-        })
+        print(f"[{job_id}] ❌ Error: {e}")
+        callbacks.send(callback_url, failure_result(job_id, e))
 
 
 @app.route('/api/start-generation', methods=['POST'])
@@ -208,33 +688,85 @@ def start_generation():
     job_id = data.get('job_id')
     repo_url = data.get('repo_url')
     github_token = data.get('github_token')
+    installation_id = data.get('installation_id')
     tehnical = data.get('tehnical')
     callback_url = data.get('callback_url')
 
     if not all([job_id, repo_url, callback_url]):
         return jsonify({"error": "Missing required fields"}), 400
-    
-    if tehnical:
-        print(f"Starting TECHNICAL doc generation for job: {job_id}")
-        thread = threading.Thread(
-            target=generate_technical_docs_process, 
-            args=(job_id, repo_url, github_token, callback_url)
+
+    # The clock starts now, so time spent queued counts against the deadline.
+    try:
+        budget = JobBudget(
+            deadline_seconds=data.get('deadline_seconds', JOB_DEADLINE_SECONDS or None),
+            max_tokens=data.get('max_tokens', JOB_TOKEN_BUDGET or None)
         )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if installation_id and not github_token:
+        try:
+            github_token = github_clients.installation_token(int(installation_id))
+        except Exception as e:
+            return jsonify({"error": f"Could not get an installation token: {e}"}), 400
+    
+    requested_priority = data.get('priority')
+    if requested_priority is not None and requested_priority not in PRIORITIES:
+        return jsonify({"error": f"priority must be one of {list(PRIORITIES)}"}), 400
+
+    unavailable = unavailable_backend()
+    estimate = cost_model.estimate(None if unavailable else repo_profile(repo_url, github_token, installation_id), bool(tehnical), budget)
+    decision = admission.admit(job_id, estimate, github_clients.headroom(github_token), unavailable)
+    if decision.action == REJECT:
+        print(f"Rejected job {job_id}: {decision.reason}")
+        retry_after = math.ceil(decision.retry_after)
+        response = jsonify({"error": decision.reason, "job_id": job_id, "retry_after": retry_after})
+        response.headers["Retry-After"] = str(retry_after)
+        return response, decision.status
+
+    # Only small jobs are interactive; a big one asking to be is still scheduled in the background.
+    tenant = tenant_for(data, repo_url)
+    cost = job_cost(estimate.tokens, estimate.github_requests)
+    priority = BACKGROUND if requested_priority == BACKGROUND or cost > INTERACTIVE_MAX_COST else INTERACTIVE
+
+    process = generate_technical_docs_process if tehnical else generate_docs_process
+    args = (job_id, tenant, priority, cost, run_admitted, process, job_id, repo_url, github_token, callback_url, budget, tenant, priority, cost)
+    print(f"Starting {'TECHNICAL' if tehnical else 'STANDARD'} doc generation for job: {job_id} "
+          f"(tenant {tenant}, {priority}, estimate: {estimate})")
+    if decision.start_in:
+        print(f"Deferring job {job_id} by {decision.start_in:.0f}s: {decision.reason}")
+        timer = threading.Timer(decision.start_in, submit_deferred, args=args)
+        timer.daemon = True
+        timer.start()
     else:
-        print(f"Starting STANDARD doc generation for job: {job_id}")
-        thread = threading.Thread(
-            target=generate_docs_process, 
-            args=(job_id, repo_url, github_token, callback_url)
-        )
-
-    thread.start()
+        scheduler.submit(*args)
 
     return jsonify({
-        "message": "Generation started successfully",
+        "message": "Generation deferred" if decision.start_in else "Generation started successfully",
         "job_id": job_id,
-        "status": "processing"
+        "status": "deferred" if decision.start_in else "processing",
+        "priority": priority,
+        "eta_seconds": round(decision.eta_seconds),
+        "start_in": round(decision.start_in),
+        "estimate": dataclasses.asdict(estimate)
     }), 202
 
+@app.route('/api/callbacks/replay', methods=['POST'])
+def replay_callbacks():
+    """Re-queues every dead-lettered callback for delivery."""
+    replayed = callbacks.replay_dead_letters()
+    return jsonify({"message": "Dead-lettered callbacks queued", "replayed": replayed}), 202
+
+
+@app.route("/health")
+def health():
+    """Circuit state of each backend and the admission queue; "degraded" while a backend is cut off."""
+    backends = breakers.snapshot()
+    degraded = any(backend["state"] != "closed" for backend in backends.values())
+    return jsonify({"status": "degraded" if degraded else "ok", "backends": backends, "admission": admission.snapshot(),
+                    "scheduler": scheduler.snapshot()})
+
+
 @app.route("/")
 def home():
     return "Server is running! Go to /api/users to see the JSON mock."
@@ -275,5 +807,5 @@ def get_mock_users():
     return jsonify(mock_data)
 
 if __name__ == "__main__":
-    
-    app.run(debug=True, port=8001)
\ No newline at end of file
+    # Development server only; production runs `gunicorn -c gunicorn.conf.py wsgi:app`.
+    app.run(debug=FLASK_DEBUG, port=8001)
\ No newline at end of file
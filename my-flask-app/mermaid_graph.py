@@ -0,0 +1,243 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+# Statements that only affect how a diagram looks, never what it says.
+COSMETIC = re.compile(r"^(?:style|classDef|linkStyle|click|direction|theme|accTitle|accDescr)\b")
+FLOW_CLASS_ASSIGN = re.compile(r"^class\s+[\w,]+\s+\w+;?$")
+FLOW_ARROW = re.compile(
+    r"\s*(<?(?:-{2,}|={2,}|-\.+-)(?:>|o|x)?|<?-\.+->)\s*(?:\|([^|]*)\|)?\s*"
+)
+FLOW_TEXT_ARROW = re.compile(r"\s+--\s+([^->][^>]*?)\s+-->\s+")
+NODE = re.compile(
+    r"^([\w.$:-]+)\s*"
+    r"(?:\(\[(.*)\]\)|\[\[(.*)\]\]|\[\((.*)\)\]|\(\((.*)\)\)|\{\{(.*)\}\}|\[(.*)\]|\((.*)\)|\{(.*)\}|>(.*)\])?\s*(?::::\w+)?$"
+)
+CLASS_RELATION = re.compile(
+    r'^([\w.`~<>-]+?)\s*(?:"[^"]*"\s*)?'
+    r"(<\|--|--\|>|\*--|--\*|o--|--o|<--|-->|<\.\.|\.\.>|<\|\.\.|\.\.\|>|--|\.\.)"
+    r'\s*(?:"[^"]*"\s*)?([\w.`~<>-]+?)\s*(?::\s*(.*))?$'
+)
+CLASS_BLOCK = re.compile(r"^class\s+([\w.`~<>-]+?)\s*(?:\[\"?(.*?)\"?\])?\s*(\{)?\s*$")
+CLASS_MEMBER = re.compile(r"^([\w.`~<>-]+?)\s*:\s*(.+)$")
+MEMBER_SPACING = re.compile(r"\s*([()\[\],:<>~])\s*")
+
+Edge = Tuple[str, str, str, str]
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.replace('"', " ").split())
+
+
+class MermaidGraph:
+    """
+    Order- and whitespace-insensitive model of a Mermaid diagram: its type, nodes
+    (id -> label), edges (source, arrow, target, label), class members and any other
+    statement. Cosmetic statements (styles, click handlers, comments) are dropped.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.nodes: Dict[str, str] = {}
+        self.edges: Set[Edge] = set()
+        self.members: Dict[str, Set[str]] = {}
+        self.statements: Set[str] = set()
+
+    def add_node(self, node_id: str, label: Optional[str] = None):
+        if label:
+            self.nodes[node_id] = normalize_text(label)
+        else:
+            self.nodes.setdefault(node_id, node_id)
+
+    def label(self, node_id: str) -> str:
+        return self.nodes.get(node_id, node_id)
+
+    def canonical(self) -> str:
+        lines = [self.kind]
+        lines += [f"n {node_id} {label}" for node_id, label in sorted(self.nodes.items())]
+        lines += ["e " + " ".join(edge) for edge in sorted(self.edges)]
+        lines += [f"m {node_id} {member}" for node_id in sorted(self.members) for member in sorted(self.members[node_id])]
+        lines += [f"s {statement}" for statement in sorted(self.statements)]
+        return "\n".join(lines)
+
+    def fingerprint(self) -> str:
+        return hashlib.sha256(self.canonical().encode("utf-8")).hexdigest()
+
+    def labeled_edges(self) -> Set[Edge]:
+        """Edges by node label rather than id, so renumbered node ids don't count as changes."""
+        return {(self.label(source), arrow, self.label(target), label) for source, arrow, target, label in self.edges}
+
+
+def _parse_node(token: str, graph: MermaidGraph) -> Optional[str]:
+    token = token.strip().rstrip(";")
+    match = NODE.match(token)
+    if not match:
+        return None
+    label = next((group for group in match.groups()[1:] if group is not None), None)
+    graph.add_node(match.group(1), label)
+    return match.group(1)
+
+
+def _parse_flow_line(line: str, graph: MermaidGraph) -> bool:
+    line = FLOW_TEXT_ARROW.sub(lambda m: f" -->|{m.group(1)}| ", line)
+    parts = FLOW_ARROW.split(line)
+    if len(parts) == 1:
+        return all(_parse_node(node, graph) for node in line.split("&")) if line else False
+
+    # split() interleaves node groups with (arrow, label) captures.
+    groups = parts[0::3]
+    arrows = parts[1::3]
+    labels = parts[2::3]
+    node_groups = [[_parse_node(node, graph) for node in group.split("&")] for group in groups]
+    if any(node is None for group in node_groups for node in group):
+        return False
+    for index, arrow in enumerate(arrows):
+        for source in node_groups[index]:
+            for target in node_groups[index + 1]:
+                graph.edges.add((source, arrow, target, normalize_text(labels[index] or "")))
+    return True
+
+
+def normalize_member(member: str) -> str:
+    member = MEMBER_SPACING.sub(r"\1", normalize_text(member)).rstrip(";")
+    # Visibility markers (+ - # ~) may be written with or without a following space.
+    return re.sub(r"^([+\-#~])\s+", r"\1", member)
+
+
+def _parse_class_line(line: str, graph: MermaidGraph, current_class: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Returns (parsed, class whose {...} block is open after this line)."""
+    if current_class:
+        if line == "}":
+            return True, None
+        graph.members.setdefault(current_class, set()).add(normalize_member(line))
+        return True, current_class
+
+    match = CLASS_BLOCK.match(line)
+    if match:
+        graph.add_node(match.group(1), match.group(2))
+        return True, match.group(1) if match.group(3) else None
+
+    match = CLASS_RELATION.match(line)
+    if match:
+        source, arrow, target, label = match.groups()
+        graph.add_node(source)
+        graph.add_node(target)
+        graph.edges.add((source, arrow, target, normalize_text(label or "")))
+        return True, None
+
+    match = CLASS_MEMBER.match(line)
+    if match:
+        graph.add_node(match.group(1))
+        graph.members.setdefault(match.group(1), set()).add(normalize_member(match.group(2)))
+        return True, None
+    return False, None
+
+
+def parse_mermaid(code: str) -> MermaidGraph:
+    """Parses flowchart/graph and classDiagram relationships; other lines are kept as normalized statements."""
+    lines = []
+    for raw in (code or "").splitlines():
+        line = raw.split("%%", 1)[0].strip()
+        if line:
+            lines.append(line)
+
+    if not lines:
+        return MermaidGraph("empty")
+
+    header = lines[0].split()
+    kind = header[0]
+    if kind in ("graph", "flowchart"):
+        # Direction (TD/LR...) only changes the layout.
+        kind = "flowchart"
+    graph = MermaidGraph(kind)
+    current_class = None
+
+    for line in lines[1:]:
+        if kind == "classDiagram" and current_class:
+            _, current_class = _parse_class_line(line, graph, current_class)
+            continue
+        if COSMETIC.match(line) or line in ("end", "}"):
+            continue
+        if kind == "flowchart":
+            if FLOW_CLASS_ASSIGN.match(line):
+                continue
+            if line.startswith("subgraph"):
+                graph.statements.add(normalize_text(line))
+                continue
+            parsed = _parse_flow_line(line, graph)
+        elif kind == "classDiagram":
+            parsed, current_class = _parse_class_line(line, graph, None)
+        else:
+            parsed = False
+        if not parsed:
+            graph.statements.add(normalize_text(line))
+    return graph
+
+
+def mermaid_fingerprint(code: str) -> str:
+    return parse_mermaid(code).fingerprint()
+
+
+def edge_changes(old: MermaidGraph, new: MermaidGraph) -> Tuple[List[Edge], List[Edge]]:
+    """(added, removed) edges between two versions of a diagram, compared by node label."""
+    old_edges, new_edges = old.labeled_edges(), new.labeled_edges()
+    return sorted(new_edges - old_edges), sorted(old_edges - new_edges)
+
+
+@dataclass
+class SemanticDiff:
+    """What changed in meaning between two versions of a diagram; node ids are compared by label"""
+    kind_changed: bool = False
+    added_nodes: List[str] = field(default_factory=list)
+    removed_nodes: List[str] = field(default_factory=list)
+    added_edges: List[Edge] = field(default_factory=list)
+    removed_edges: List[Edge] = field(default_factory=list)
+    added_members: List[Tuple[str, str]] = field(default_factory=list)
+    removed_members: List[Tuple[str, str]] = field(default_factory=list)
+    added_statements: List[str] = field(default_factory=list)
+    removed_statements: List[str] = field(default_factory=list)
+
+    def is_empty(self) -> bool:
+        return not (
+            self.kind_changed or self.added_nodes or self.removed_nodes or self.added_edges
+            or self.removed_edges or self.added_members or self.removed_members
+            or self.added_statements or self.removed_statements
+        )
+
+    def summary(self) -> str:
+        if self.kind_changed:
+            return "diagram type changed"
+        counts = [
+            ("nodes", self.added_nodes, self.removed_nodes),
+            ("edges", self.added_edges, self.removed_edges),
+            ("members", self.added_members, self.removed_members),
+            ("statements", self.added_statements, self.removed_statements),
+        ]
+        parts = [f"{name} +{len(added)}/-{len(removed)}" for name, added, removed in counts if added or removed]
+        return ", ".join(parts) or "no semantic changes"
+
+
+def semantic_diff(old: Union[str, MermaidGraph], new: Union[str, MermaidGraph]) -> SemanticDiff:
+    """Diffs two diagrams (source or parsed), ignoring layout, ordering, styling and node ids."""
+    old = parse_mermaid(old) if isinstance(old, str) else old
+    new = parse_mermaid(new) if isinstance(new, str) else new
+    if old.kind != new.kind:
+        return SemanticDiff(kind_changed=True)
+
+    def members(graph):
+        return {(graph.label(node), member) for node, node_members in graph.members.items() for member in node_members}
+
+    old_nodes, new_nodes = set(old.nodes.values()), set(new.nodes.values())
+    added_edges, removed_edges = edge_changes(old, new)
+    old_members, new_members = members(old), members(new)
+    return SemanticDiff(
+        added_nodes=sorted(new_nodes - old_nodes),
+        removed_nodes=sorted(old_nodes - new_nodes),
+        added_edges=added_edges,
+        removed_edges=removed_edges,
+        added_members=sorted(new_members - old_members),
+        removed_members=sorted(old_members - new_members),
+        added_statements=sorted(new.statements - old.statements),
+        removed_statements=sorted(old.statements - new.statements),
+    )
@@ -0,0 +1,67 @@
+import codecs
+import os
+from typing import Optional
+from urllib.parse import quote
+
+# GITHUB_RAW_URL points raw content reads elsewhere (GitHub Enterprise, or load_test.py's fake).
+RAW_CONTENT_URL = os.getenv("GITHUB_RAW_URL", "https://raw.githubusercontent.com").rstrip("/") + "/{repo}/{ref}/{path}"
+# Enough to tell text from binary: NUL bytes or invalid UTF-8 show up early in practice.
+SNIFF_BYTES = 8192
+
+
+class NotTextError(ValueError):
+    """Raised when a file turns out to be binary or not UTF-8; `reason` says which."""
+
+    def __init__(self, path: str, reason: str):
+        super().__init__(f"{path}: {reason}")
+        self.path = path
+        self.reason = reason
+
+
+def raw_url(repo_full_name: str, ref: str, path: str) -> str:
+    return RAW_CONTENT_URL.format(repo=repo_full_name, ref=quote(ref, safe=""), path=quote(path))
+
+
+def sniff(data: bytes, complete: bool = True) -> Optional[str]:
+    """Why data is not UTF-8 text ("binary", "not UTF-8"), or None if it is."""
+    if b"\0" in data:
+        return "binary"
+    try:
+        # An incomplete prefix may end in the middle of a multi-byte character.
+        codecs.getincrementaldecoder("utf-8")().decode(data, final=complete)
+    except UnicodeDecodeError:
+        return "not UTF-8"
+    return None
+
+
+def decode_text(data: bytes, complete: bool = True) -> str:
+    """Strict UTF-8 decode; a truncated trailing character of an incomplete prefix is dropped."""
+    return codecs.getincrementaldecoder("utf-8")().decode(data, final=complete)
+
+
+def fetch_prefix(session, url: str, limit: int, path: str = "", headers: dict = None,
+                 sniff_bytes: int = SNIFF_BYTES, timeout: float = 30) -> bytes:
+    """
+    The first `limit` bytes of a raw file through an HTTP Range request, streamed so that
+    a binary or non-UTF-8 file is rejected (NotTextError) after its first sniff_bytes
+    without downloading the rest. Servers that ignore Range are cut off at `limit` too.
+    """
+    headers = {**(headers or {}), "Range": f"bytes=0-{limit - 1}", "Accept-Encoding": "identity"}
+    data = bytearray()
+    sniffed = False
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=sniff_bytes):
+            data += chunk
+            if not sniffed and len(data) >= min(sniff_bytes, limit):
+                sniffed = True
+                reason = sniff(bytes(data[:sniff_bytes]), complete=False)
+                if reason:
+                    raise NotTextError(path, reason)
+            if len(data) >= limit:
+                break
+    if not sniffed:
+        reason = sniff(bytes(data), complete=False)
+        if reason:
+            raise NotTextError(path, reason)
+    return bytes(data[:limit])
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional, Tuple
+
+
+class SnapshotStore:
+    """
+    Local, process-wide cache of repository data shared across jobs.
+
+    Blob contents are content-addressed by their git SHA, so identical files in different
+    repos (or different runs) are stored once, zlib-compressed on disk. SQLite holds the blob
+    metadata and the ETag + body of conditional GitHub API responses. When the compressed
+    blobs exceed max_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, root_dir: str = "snapshots", max_bytes: int = 512 * 1024 * 1024):
+        self.root_dir = root_dir
+        self.blob_dir = os.path.join(root_dir, "blobs")
+        self.max_bytes = max_bytes
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(root_dir, "snapshots.db"), check_same_thread=False)
+        self._db.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                stored_bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS blobs_last_access ON blobs(last_access);
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                body TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+        """)
+        self._db.commit()
+
+    def _blob_path(self, sha: str) -> str:
+        return os.path.join(self.blob_dir, sha[:2], sha[2:])
+
+    def has_blob(self, sha: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM blobs WHERE sha = ?", (sha,)).fetchone() is not None
+
+    def get_blob(self, sha: str) -> Optional[bytes]:
+        """Return the cached blob content, or None if it is not stored."""
+        with self._lock:
+            row = self._db.execute("SELECT sha FROM blobs WHERE sha = ?", (sha,)).fetchone()
+            if not row:
+                return None
+            try:
+                with open(self._blob_path(sha), "rb") as f:
+                    content = zlib.decompress(f.read())
+            except (OSError, zlib.error):
+                self._db.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE blobs SET last_access = ? WHERE sha = ?", (time.time(), sha))
+            self._db.commit()
+        return content
+
+    def put_blob(self, sha: str, content: bytes):
+        """Store a blob once; later puts of the same SHA are no-ops."""
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM blobs WHERE sha = ?", (sha,)).fetchone():
+                return
+
+            compressed = zlib.compress(content, 6)
+            path = self._blob_path(sha)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Unique per writer: other processes share the directory.
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+
+            self._db.execute(
+                "INSERT OR IGNORE INTO blobs (sha, size, stored_bytes, last_access) VALUES (?, ?, ?, ?)",
+                (sha, len(content), len(compressed), time.time())
+            )
+            self._db.commit()
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used blobs until the store is back under 90% of max_bytes. Caller holds the lock."""
+        total = self._db.execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        evicted = 0
+        for sha, stored_bytes in self._db.execute("SELECT sha, stored_bytes FROM blobs ORDER BY last_access").fetchall():
+            if total <= target:
+                break
+            try:
+                os.remove(self._blob_path(sha))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+            total -= stored_bytes
+            evicted += 1
+        self._db.commit()
+        print(f"Snapshot store: evicted {evicted} blobs, {total} bytes stored")
+
+    def get_response(self, url: str) -> Optional[Tuple[str, str]]:
+        """(etag, body) of the last successful response for a URL."""
+        with self._lock:
+            row = self._db.execute("SELECT etag, body FROM responses WHERE url = ?", (url,)).fetchone()
+        return tuple(row) if row else None
+
+    def put_response(self, url: str, etag: str, body: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (url, etag, body, updated_at) VALUES (?, ?, ?, ?)",
+                (url, etag, body, time.time())
+            )
+            self._db.commit()
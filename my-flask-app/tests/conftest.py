@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app's modules are flat files next to main.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
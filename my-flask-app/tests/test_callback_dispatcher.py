@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from callback_dispatcher import CallbackDispatcher
+
+
+class Receiver(ThreadingHTTPServer):
+    """Records every callback it gets; answers status (200 unless told otherwise), or status(body) if callable."""
+
+    def __init__(self, status=200):
+        super().__init__(("127.0.0.1", 0), ReceiverHandler)
+        self.status = status
+        self.received = []
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/callback"
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        status = self.server.status(body) if callable(self.server.status) else self.server.status
+        self.server.received.append((body, status))
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def receiver():
+    servers = []
+
+    def start(status=200):
+        server = Receiver(status)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_job_progress_is_flushed_before_its_result(receiver, tmp_path):
+    server = receiver()
+    dispatcher = CallbackDispatcher(str(tmp_path), workers=4, batch_progress=True, batch_size=100, batch_interval=60)
+    dispatcher.send_progress(server.url, "job-1", "files")
+    dispatcher.send_progress(server.url, "job-2", "files")
+    dispatcher.send_progress(server.url, "job-1", "ranking")
+    dispatcher.send(server.url, {"job_id": "job-1", "status": "completed"})
+    dispatcher.close(timeout=5)
+
+    received = [body for body, _ in server.received]
+    batches = {body["events"][0]["job_id"]: (i, body) for i, body in enumerate(received) if body["status"] == "progress_batch"}
+    completed = next(i for i, body in enumerate(received) if body["status"] == "completed")
+    job_batch, other_batch = batches["job-1"], batches["job-2"]
+    assert job_batch[0] < completed
+    assert [event["stage"] for event in job_batch[1]["events"]] == ["files", "ranking"]
+    # Another job's events stay buffered until their own flush.
+    assert [event["job_id"] for event in other_batch[1]["events"]] == ["job-2"]
+
+
+def test_pending_retries_are_dead_lettered_on_close(receiver, tmp_path):
+    server = receiver(status=503)
+    dispatcher = CallbackDispatcher(str(tmp_path), workers=1, backoff=60, max_retries=5)
+    dispatcher.send(server.url, {"job_id": "job-1", "status": "completed"})
+    dispatcher.close(timeout=5)
+
+    assert len(server.received) == 1
+    [name] = dispatcher.dead_letters()
+    with open(os.path.join(tmp_path, name), encoding="utf-8") as f:
+        record = json.load(f)
+    assert record["payload"]["job_id"] == "job-1"
+    assert "HTTP 503" in record["error"]
+
+
+def test_dead_letter_failure_does_not_kill_the_worker(receiver, tmp_path):
+    server = receiver(status=400)
+    dispatcher = CallbackDispatcher(str(tmp_path), workers=1)
+    dispatcher.dead_letter_dir = str(tmp_path / "missing")
+    dispatcher.send(server.url, {"job_id": "job-1", "status": "completed"})
+    server.status = 200
+    dispatcher.send(server.url, {"job_id": "job-2", "status": "completed"})
+    dispatcher.close(timeout=5)
+
+    assert [body["job_id"] for body, _ in server.received] == ["job-1", "job-2"]
+
+
+def test_result_waits_for_a_progress_batch_being_retried(receiver, tmp_path):
+    failures = [503]
+    server = receiver(status=lambda body: failures.pop() if body["status"] == "progress_batch" and failures else 200)
+    dispatcher = CallbackDispatcher(str(tmp_path), workers=4, backoff=0.2, batch_progress=True, batch_size=100, batch_interval=60)
+    dispatcher.send_progress(server.url, "job-1", "files")
+    dispatcher.send(server.url, {"job_id": "job-1", "status": "completed"})
+    dispatcher.send(server.url, {"job_id": "job-2", "status": "completed"})
+    deadline = time.monotonic() + 5
+    while len(server.received) < 4 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    dispatcher.close(timeout=5)
+
+    delivered = [body.get("job_id", body["status"]) for body, status in server.received if status == 200]
+    assert delivered.index("progress_batch") < delivered.index("job-1")
+    # Other jobs are not held up.
+    assert delivered.index("job-2") < delivered.index("progress_batch")
@@ -0,0 +1,16 @@
+from doc_memo import CHANGES_HEADING, DocumentationMemo
+
+BASE = "graph TD\n" + "".join(f"  N{i}[Service {i}] --> N{i + 1}[Service {i + 1}]\n" for i in range(20))
+CHANGED = BASE + "  N0[Service 0] --> N5[Service 5]\n"
+
+
+def test_patched_docs_are_not_served_to_another_scope(tmp_path):
+    memo = DocumentationMemo(str(tmp_path / "memo.db"))
+    memo.store(BASE, "Twenty services in a chain.", scope="tenant-a/repo")
+    patched = memo.lookup(CHANGED, scope="tenant-a/repo")
+    assert CHANGES_HEADING in patched
+
+    assert memo.lookup(CHANGED, scope="tenant-b/other") is None
+    assert memo.lookup(CHANGED, scope="tenant-a/repo") == patched
+    # Fully generated documentation is still shared.
+    assert memo.lookup(BASE, scope="tenant-b/other") == "Twenty services in a chain."
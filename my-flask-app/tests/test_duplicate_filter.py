@@ -0,0 +1,26 @@
+from duplicate_filter import generated_reason
+
+
+def test_generator_headers_are_dropped():
+    headers = [
+        "// Code generated by protoc-gen-go. DO NOT EDIT.\npackage api\n",
+        "/**\n * Copyright Example\n * @generated\n */\nexport const x = 1;\n",
+        "#!/usr/bin/env python\n# This file is autogenerated by pip-compile\nflask==3.0\n",
+        '"""Generated by the protocol buffer compiler.  DO NOT EDIT!"""\nimport sys\n',
+        "// <auto-generated />\nnamespace App {}\n",
+    ]
+    for content in headers:
+        assert generated_reason("src/file.py", content) == "generated", content
+
+
+def test_handwritten_files_mentioning_generation_are_kept():
+    lexer = (
+        "# Lexer for the query language.\n"
+        "# The parser consumes tokens generated by the lexer below.\n"
+        "import re\n\n\n"
+        "def tokens(text):\n    return re.findall(r'\\w+', text)\n"
+    )
+    assert generated_reason("query/lexer.py", lexer) is None
+    # Markers in code, after the header comments, do not count either.
+    banner = "import os\n\nBANNER = 'Auto-generated reports. Do not edit by hand.'\n"
+    assert generated_reason("reports.py", banner) is None
@@ -0,0 +1,38 @@
+import json
+
+from exclusions import ExclusionEngine
+
+
+def engine_for(files, **options):
+    """An engine for a tree of {path: text}; records which rule files were read."""
+    read = []
+
+    def read_text(path):
+        read.append(path)
+        return files[path]
+
+    return ExclusionEngine.for_tree(files, read_text, **options), read
+
+
+def test_rule_files_in_excluded_directories_are_not_read():
+    engine, read = engine_for({
+        ".gitignore": "vendor/\n",
+        "web/.gitignore": "dist/\n",
+        "node_modules/q/.gitignore": "*\n",
+        "vendor/x/.gitignore": "!keep.py\n",
+        "web/dist/.gitattributes": "*.js linguist-generated\n",
+        "src/.gitattributes": "*.pb.go linguist-generated\n",
+    }, ignored_dirs=["node_modules"])
+    assert read == [".gitignore", "src/.gitattributes", "web/.gitignore"]
+    assert engine.reason("vendor/x/keep.py")
+    assert engine.reason("src/api.pb.go")
+    assert engine.reason("web/app.js") is None
+
+
+def test_repository_config_cannot_raise_the_size_cap():
+    config = {".docgen.json": json.dumps({"max_file_bytes": 10_000_000})}
+    engine, _ = engine_for(config, max_file_bytes=1000)
+    assert engine.max_file_bytes == 1000
+
+    engine, _ = engine_for({".docgen.json": json.dumps({"max_file_bytes": 10})}, max_file_bytes=1000)
+    assert engine.max_file_bytes == 10
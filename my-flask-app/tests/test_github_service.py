@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+
+from file_ranking import rank_files
+from github_service import GITHUB_API_URL, RepoFile, SetUpGithub
+
+TREES = f"{GITHUB_API_URL}/repos/o/r/git/trees"
+HEAD = {f"{GITHUB_API_URL}/repos/o/r/git/ref/heads/main": {"object": {"sha": "c0ffee", "type": "commit"}}}
+
+
+def service_with_trees(responses):
+    """A SetUpGithub whose (conditional) GETs are answered from responses, by URL."""
+    service = SetUpGithub("token", "https://github.com/o/r", graphql_batch_size=0)
+    service.repo = SimpleNamespace(full_name="o/r", default_branch="main")
+    service.requested = []
+
+    def conditional_get(url, **options):
+        service.requested.append(url)
+        return responses[url]
+
+    service._conditional_get = conditional_get
+    return service
+
+
+def blob(path, sha="b"):
+    return {"path": path, "type": "blob", "sha": sha, "size": 1}
+
+
+def subtree(path, sha):
+    return {"path": path, "type": "tree", "sha": sha}
+
+
+def test_complete_listing_is_one_request():
+    service = service_with_trees({
+        **HEAD,
+        f"{TREES}/c0ffee?recursive=1": {"sha": "root", "truncated": False, "tree": [blob("a.py"), subtree("src", "s"), blob("src/b.py")]},
+    })
+    assert [entry["path"] for entry in service.get_tree()] == ["a.py", "src/b.py"]
+    assert len(service.requested) == 2
+    assert service.commit_sha == "c0ffee"
+
+
+def test_truncated_listing_is_completed_subtree_by_subtree():
+    service = service_with_trees({
+        **HEAD,
+        f"{TREES}/c0ffee?recursive=1": {"sha": "root", "truncated": True, "tree": [blob("a.py")]},
+        f"{TREES}/root": {"sha": "root", "truncated": False, "tree": [blob("a.py"), subtree("src", "s"), subtree("docs", "d")]},
+        # src is too big for one recursive listing as well, docs is not.
+        f"{TREES}/s?recursive=1": {"sha": "s", "truncated": True, "tree": []},
+        f"{TREES}/s": {"sha": "s", "truncated": False, "tree": [blob("main.py"), subtree("lib", "l")]},
+        f"{TREES}/l?recursive=1": {"sha": "l", "truncated": False, "tree": [blob("util.py"), subtree("deep", "x"), blob("deep/x.py")]},
+        f"{TREES}/d?recursive=1": {"sha": "d", "truncated": False, "tree": [blob("index.md")]},
+    })
+    paths = [entry["path"] for entry in service.get_tree()]
+    assert paths == ["a.py", "src/main.py", "src/lib/util.py", "src/lib/deep/x.py", "docs/index.md"]
+
+
+def test_prefix_is_read_at_the_listed_commit(monkeypatch):
+    service = service_with_trees({**HEAD, f"{TREES}/c0ffee?recursive=1": {"sha": "root", "truncated": False, "tree": [blob("big.py")]}})
+    service.get_tree()
+    urls = []
+    monkeypatch.setattr("github_service.fetch_prefix", lambda session, url, limit, **options: urls.append(url) or b"x" * limit)
+    service._get_prefix("big.py", "b", 100, 10)
+    assert urls == ["https://raw.githubusercontent.com/o/r/c0ffee/big.py"]
+
+
+def test_ranking_reads_only_a_prefix_of_large_files(monkeypatch):
+    service = service_with_trees({**HEAD, f"{TREES}/c0ffee?recursive=1": {"sha": "root", "truncated": False, "tree": [blob("big.py")]}})
+    service.get_tree()
+    monkeypatch.setattr("github_service.fetch_prefix", lambda session, url, limit, **options: b"import os\n" + b"x" * (limit - 10))
+    service.get_blob = lambda sha: (_ for _ in ()).throw(AssertionError("whole blob downloaded"))
+    files = [RepoFile(service, "big.py", "b", 10_000_000), RepoFile(service, "small.py", "c", 10)]
+    service._prefetched["c"] = b"def f(): pass\n"
+
+    ranked = rank_files(files, "python", read=lambda file: file.read_text(100))
+    assert sorted(file.path for file in ranked) == ["big.py", "small.py"]
+    assert service.bytes_skipped == 10_000_000 - 100
@@ -0,0 +1,184 @@
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import github_service
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from graphql_blobs import GraphQLBlobFetcher, git_blob_sha
+
+
+class FakeGraphQL(ThreadingHTTPServer):
+    """
+    Answers blob queries the way GitHub does. Blobs are content by oid (None for binary);
+    queries with more than max_aliases blobs fail with RESOURCE_LIMITS_EXCEEDED, the
+    first fail_first queries with HTTP 502, and each query costs cost(aliases).
+    """
+
+    def __init__(self, blobs, max_aliases=None, fail_first=0, truncated=(), cost=lambda aliases: 1):
+        super().__init__(("127.0.0.1", 0), GraphQLHandler)
+        self.blobs = blobs
+        self.max_aliases = max_aliases
+        self.fail_first = fail_first
+        self.truncated = set(truncated)
+        self.cost = cost
+        self.batches = []
+
+    def answer(self, oids):
+        if self.fail_first:
+            self.fail_first -= 1
+            return 502, {"message": "Bad gateway"}
+        if self.max_aliases and len(oids) > self.max_aliases:
+            return 200, {"errors": [{"type": "RESOURCE_LIMITS_EXCEEDED", "message": "Resource limits exceeded"}]}
+        self.batches.append(len(oids))
+        repository = {}
+        for i, oid in enumerate(oids):
+            if oid not in self.blobs:
+                repository[f"b{i}"] = None
+                continue
+            content = self.blobs[oid]
+            repository[f"b{i}"] = {
+                "isBinary": content is None,
+                "isTruncated": oid in self.truncated,
+                "byteSize": len(content or b""),
+                "text": None if content is None else content.decode("utf-8", errors="replace"),
+            }
+        return 200, {"data": {"rateLimit": {"cost": self.cost(len(oids)), "remaining": 4999}, "repository": repository}}
+
+
+class GraphQLHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        variables = body["variables"]
+        names = sorted((name for name in variables if re.fullmatch(r"o\d+", name)), key=lambda name: int(name[1:]))
+        status, payload = self.server.answer([variables[name] for name in names])
+        out = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+
+def text_blobs(count):
+    contents = [f"def f{i}():\n    return {i}\n".encode("utf-8") for i in range(count)]
+    return {git_blob_sha(content): content for content in contents}
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Starts a FakeGraphQL and returns a fetcher that posts to it through SetUpGithub."""
+    servers = []
+    # Failures the tests provoke must not open the process-wide GitHub circuit.
+    monkeypatch.setattr(github_service, "github_breaker", CircuitBreaker("github-test", min_calls=10 ** 6))
+
+    def start(blobs, batch_size=25, max_cost=5, **options):
+        server = FakeGraphQL(blobs, **options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(github_service, "GRAPHQL_URL", f"http://127.0.0.1:{server.server_port}/graphql")
+        service = github_service.SetUpGithub("token", "https://github.com/owner/repo", graphql_batch_size=batch_size)
+        return server, GraphQLBlobFetcher(service._post_graphql, batch_size=batch_size, max_cost=max_cost)
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def fetch_all(fetcher, blobs):
+    return fetcher.fetch("owner", "repo", [(sha, len(content or b"")) for sha, content in blobs.items()])
+
+
+def test_fetches_blobs_in_batches(serve):
+    blobs = text_blobs(60)
+    server, fetcher = serve(blobs, batch_size=25)
+    assert fetch_all(fetcher, blobs) == blobs
+    assert sum(server.batches) == 60
+    assert max(server.batches) <= fetcher.max_batch
+    assert len(server.batches) < 60
+    assert fetcher.queries == len(server.batches)
+
+
+def test_batch_grows_while_cheap_and_shrinks_with_cost(serve):
+    blobs = text_blobs(100)
+    server, fetcher = serve(blobs, batch_size=10, max_cost=5)
+    fetch_all(fetcher, blobs)
+    assert server.batches[1] > server.batches[0]
+
+    server, fetcher = serve(blobs, batch_size=100, max_cost=5, cost=lambda aliases: aliases // 10)
+    fetch_all(fetcher, blobs)
+    assert server.batches[0] == 100
+    assert fetcher.batch_size == 100 * 5 // 10
+
+
+def test_splits_batches_github_rejects_as_too_large(serve):
+    blobs = text_blobs(50)
+    server, fetcher = serve(blobs, batch_size=50, max_aliases=20)
+    assert fetch_all(fetcher, blobs) == blobs
+    assert max(server.batches) <= 20
+
+
+def test_retries_halves_after_bad_gateway(serve):
+    blobs = text_blobs(40)
+    server, fetcher = serve(blobs, batch_size=40, fail_first=1)
+    assert fetch_all(fetcher, blobs) == blobs
+    assert server.batches[0] == 20
+
+
+def test_binary_truncated_missing_and_non_utf8_blobs(serve):
+    blobs = text_blobs(3)
+    text_sha, truncated_sha, _ = blobs
+    binary = b"\x89PNG\r\n\x1a\n\0\0"
+    latin1 = "café\n".encode("latin-1")
+    blobs[git_blob_sha(binary)] = None
+    blobs[git_blob_sha(latin1)] = latin1
+    missing_sha = git_blob_sha(b"deleted since the tree was listed")
+    server, fetcher = serve(blobs, truncated=[truncated_sha])
+
+    results = fetcher.fetch("owner", "repo", [(sha, 10) for sha in [*blobs, missing_sha]])
+
+    assert results[text_sha] == blobs[text_sha]
+    assert results[git_blob_sha(binary)] is None
+    # Left for the REST path: cut short, gone, or text that is not the blob's bytes.
+    assert truncated_sha not in results
+    assert missing_sha not in results
+    assert git_blob_sha(latin1) not in results
+
+
+def test_prefetch_keeps_only_blobs_safe_to_store_by_sha(serve):
+    blobs = text_blobs(5)
+    latin1 = "naïve\n".encode("latin-1")
+    blobs[git_blob_sha(latin1)] = latin1
+    serve(blobs)
+    service = github_service.SetUpGithub("token", "https://github.com/owner/repo", graphql_batch_size=25)
+    service.repo = type("Repo", (), {"full_name": "owner/repo", "default_branch": "main"})()
+    files = [github_service.RepoFile(service, f"f{i}.py", sha, len(content)) for i, (sha, content) in enumerate(blobs.items())]
+
+    assert service.prefetch_blobs(files) == 5
+    assert all(service._prefetched[sha] == blobs[sha] for sha in list(blobs)[:5])
+    assert git_blob_sha(latin1) not in service._prefetched
+
+
+def test_prefetch_leaves_blobs_to_rest_when_graphql_is_unreachable(serve):
+    blobs = text_blobs(3)
+    server, _ = serve(blobs)
+    server.shutdown()
+    server.server_close()
+    service = github_service.SetUpGithub("token", "https://github.com/owner/repo", graphql_batch_size=25)
+    service.repo = type("Repo", (), {"full_name": "owner/repo", "default_branch": "main"})()
+    files = [github_service.RepoFile(service, f"f{i}.py", sha, len(content)) for i, (sha, content) in enumerate(blobs.items())]
+
+    assert service.prefetch_blobs(files) == 0
+
+    def open_circuit(*args, **kwargs):
+        raise CircuitOpenError("github", 30)
+
+    service.graphql.post = open_circuit
+    assert service.prefetch_blobs(files) == 0
+    assert not service._prefetched
@@ -0,0 +1,22 @@
+from path_index import ROOT, PathIndex
+
+
+def test_tree_shape_and_aggregates():
+    index = PathIndex.build(["src/app.py", "README.md", "src/lib/util.py", "src/app.py", "docs/a.md"], [10, 5, 7, 99, 1])
+    assert list(index.paths()) == ["README.md", "docs/a.md", "src/app.py", "src/lib/util.py"]
+    src = index.find("src")
+    assert index.file_count(src) == 2
+    # A path listed twice keeps its first size.
+    assert index.total_bytes(src) == 17
+    assert index.total_bytes() == 23
+    assert [index.path(node) for node in index.input_nodes] == ["src/app.py", "README.md", "src/lib/util.py", "src/app.py", "docs/a.md"]
+    assert index.extension_counts() == {".py": 2, ".md": 2}
+    assert [index.name(node) for node in index.directories(ROOT)] == ["docs", "src"]
+
+
+def test_more_extensions_than_int16_holds():
+    paths = [f"data/file.x{i}" for i in range(40000)]
+    index = PathIndex.build(paths)
+    assert index.count_extension(".x39999") == 1
+    assert index.extension_counts()[".x39999"] == 1
+    assert index.input_mask(index.extension_mask([".x35000"])).sum() == 1
@@ -0,0 +1,28 @@
+import time
+
+import pytest
+
+from job_budget import BudgetExhausted, JobBudget
+from token_manager import GitHubClientManager, RateLimitExhausted
+
+
+def exhausted_manager(reset_in):
+    manager = GitHubClientManager(max_wait=900)
+    manager.record("t", {"X-RateLimit-Remaining": "0", "X-RateLimit-Limit": "60", "X-RateLimit-Reset": str(time.time() + reset_in)})
+    return manager
+
+
+def test_rate_limit_wait_stops_at_the_job_deadline():
+    manager, budget = exhausted_manager(600), JobBudget(deadline_seconds=0.5)
+    started = time.monotonic()
+    with pytest.raises(BudgetExhausted):
+        budget.bounded_wait(lambda limit: manager.acquire("t", needed=5, max_wait=limit), manager.max_wait, RateLimitExhausted)
+    assert time.monotonic() - started < 0.5
+
+
+def test_rate_limit_wait_gives_up_when_the_reset_is_late():
+    manager = exhausted_manager(3)
+    started = time.monotonic()
+    with pytest.raises(RateLimitExhausted):
+        manager.acquire("t", needed=5, max_wait=0.3)
+    assert time.monotonic() - started < 0.3
@@ -0,0 +1,213 @@
+import hashlib
+import threading
+import time
+import requests
+from datetime import timezone
+from github import Auth, Github, GithubIntegration
+from typing import Dict, Optional, Tuple
+
+
+class RateLimitExhausted(Exception):
+    """Raised when a token's rate limit won't reset within the allowed wait"""
+
+    def __init__(self, reset_in: float):
+        super().__init__(f"GitHub rate limit exhausted, resets in {reset_in:.0f}s")
+        self.reset_in = reset_in
+
+
+class Reservation:
+    """
+    Core API requests one job set aside on its token, and how many of them it has made.
+    Only the part not yet made is held back from other jobs; X-RateLimit-Remaining
+    already accounts for the rest.
+    """
+    __slots__ = ("token_key", "needed", "used", "window")
+
+    def __init__(self, token_key: str, needed: int, window: Optional[float]):
+        self.token_key = token_key
+        self.needed = needed
+        self.used = 0
+        # reset_at of the rate-limit window it was made in (None while unknown).
+        self.window = window
+
+    @property
+    def outstanding(self) -> int:
+        return max(self.needed - self.used, 0)
+
+
+class RateLimitState:
+    """Last known core rate limit of one token"""
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset_at = 0.0
+        self.reservations = set()
+
+    @property
+    def reserved(self) -> int:
+        return sum(reservation.outstanding for reservation in self.reservations)
+
+    def new_window(self, reset_at: float):
+        """
+        The limit was reset: reservations made in an earlier window are dropped, so nothing
+        a job failed to release outlives one window; unplaced ones now belong to this one.
+        """
+        for reservation in list(self.reservations):
+            if reservation.window is None:
+                reservation.window = reset_at
+            elif reservation.window < reset_at:
+                self.reservations.discard(reservation)
+        self.reset_at = reset_at
+
+    def reset_in(self) -> float:
+        return max(self.reset_at - time.time(), 0.0)
+
+    def available(self) -> Optional[int]:
+        """Requests left after in-flight reservations, or None while unknown."""
+        if self.remaining is None or self.reset_in() == 0:
+            return None
+        return self.remaining - self.reserved
+
+
+class GitHubClientManager:
+    """
+    Shares one PyGithub client and one pooled HTTP session per token across jobs and
+    tracks each token's X-RateLimit-Remaining / X-RateLimit-Reset. Jobs reserve the
+    requests they expect to make and wait for the reset instead of failing midway.
+    Optionally mints and caches GitHub App installation tokens.
+    """
+
+    def __init__(self, max_wait: float = 900.0, app_id: str = None, app_private_key: str = None, api_url: str = "https://api.github.com"):
+        self.max_wait = max_wait
+        self.api_url = api_url
+        self.app_id = app_id
+        self.app_private_key = app_private_key
+        self._clients: Dict[str, Github] = {}
+        self._sessions: Dict[str, requests.Session] = {}
+        self._limits: Dict[str, RateLimitState] = {}
+        self._installation_tokens: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    @staticmethod
+    def token_key(token: Optional[str]) -> str:
+        # Never keep raw tokens as dict keys that might end up in logs.
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16] if token else "anonymous"
+
+    def client_for(self, token: Optional[str]) -> Github:
+        key = self.token_key(token)
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = Github(auth=Auth.Token(token), base_url=self.api_url) if token else Github(base_url=self.api_url)
+            return self._clients[key]
+
+    def session_for(self, token: Optional[str]) -> requests.Session:
+        key = self.token_key(token)
+        with self._lock:
+            if key not in self._sessions:
+                session = requests.Session()
+                session.headers["Accept"] = "application/vnd.github+json"
+                if token:
+                    session.headers["Authorization"] = f"Bearer {token}"
+                self._sessions[key] = session
+            return self._sessions[key]
+
+    def _state(self, key: str) -> RateLimitState:
+        if key not in self._limits:
+            self._limits[key] = RateLimitState()
+        return self._limits[key]
+
+    def record(self, token: Optional[str], headers) -> None:
+        """Update the token's state from a GitHub response's rate-limit headers."""
+        if headers.get("X-RateLimit-Resource", "core") != "core" or "X-RateLimit-Remaining" not in headers:
+            return
+        with self._changed:
+            state = self._state(self.token_key(token))
+            state.limit = int(headers.get("X-RateLimit-Limit", state.limit or 0))
+            state.remaining = int(headers["X-RateLimit-Remaining"])
+            reset_at = float(headers.get("X-RateLimit-Reset", state.reset_at))
+            if reset_at > state.reset_at or any(reservation.window is None for reservation in state.reservations):
+                state.new_window(reset_at)
+            self._changed.notify_all()
+
+    def record_client(self, token: Optional[str], client: Github) -> None:
+        """Pick up the limits PyGithub saw on its own requests."""
+        remaining, limit = client.rate_limiting
+        if remaining < 0:
+            return
+        self.record(token, {
+            "X-RateLimit-Remaining": remaining,
+            "X-RateLimit-Limit": limit,
+            "X-RateLimit-Reset": client.rate_limiting_resettime,
+        })
+
+    def acquire(self, token: Optional[str], needed: int = 1, max_wait: float = None) -> Reservation:
+        """
+        Reserve `needed` requests, waiting for the rate-limit reset if the token can't
+        cover them. Raises RateLimitExhausted if that would take longer than max_wait.
+        The job reports each request it makes with consume() and hands back the
+        reservation with release() when it is done.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        give_up = time.monotonic() + max_wait
+        key = self.token_key(token)
+        with self._changed:
+            state = self._state(key)
+            while True:
+                available = state.available()
+                if available is None or available >= needed:
+                    # A window that is unknown or already over is placed by the next response.
+                    reservation = Reservation(key, needed, None if available is None else state.reset_at)
+                    state.reservations.add(reservation)
+                    return reservation
+                reset_in = state.reset_in()
+                wait_left = give_up - time.monotonic()
+                if reset_in > wait_left:
+                    raise RateLimitExhausted(reset_in)
+                print(f"GitHub token exhausted ({available} left), waiting {reset_in:.0f}s for reset...")
+                self._changed.wait(timeout=max(min(reset_in + 1, wait_left), 0.0))
+
+    def consume(self, reservation: Reservation, count: int = 1) -> None:
+        """Count requests a job made against its reservation."""
+        with self._lock:
+            reservation.used += count
+
+    def release(self, reservation: Reservation) -> None:
+        """Return whatever part of a job's reservation it did not use."""
+        with self._changed:
+            self._state(reservation.token_key).reservations.discard(reservation)
+            self._changed.notify_all()
+
+    def headroom(self, token: Optional[str]) -> Tuple[Optional[int], float]:
+        """(requests left after reservations, or None while unknown; seconds until the reset)"""
+        with self._lock:
+            state = self._state(self.token_key(token))
+            return state.available(), state.reset_in()
+
+    def status(self) -> Dict[str, dict]:
+        with self._lock:
+            return {
+                key: {"remaining": state.remaining, "limit": state.limit, "reserved": state.reserved, "reset_in": round(state.reset_in())}
+                for key, state in self._limits.items()
+            }
+
+    def installation_token(self, installation_id: int) -> str:
+        """Installation access token for a GitHub App, cached until a minute before it expires."""
+        if not (self.app_id and self.app_private_key):
+            raise ValueError("GitHub App credentials are not configured.")
+
+        with self._lock:
+            cached = self._installation_tokens.get(installation_id)
+            if cached and cached[1] - 60 > time.time():
+                return cached[0]
+
+        integration = GithubIntegration(auth=Auth.AppAuth(self.app_id, self.app_private_key), base_url=self.api_url)
+        authorization = integration.get_access_token(installation_id)
+        expires_at = authorization.expires_at
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+
+        with self._lock:
+            self._installation_tokens[installation_id] = (authorization.token, expires_at.timestamp())
+        return authorization.token
@@ -0,0 +1,13 @@
+"""
+Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+HTTP requests are served by gunicorn's workers; generation jobs run on each
+worker's own JOB_WORKERS scheduler threads (see main.py), so a long job never occupies an
+HTTP thread. On shutdown each worker drains its jobs and callbacks first (worker_exit in
+gunicorn.conf.py), for up to HTTP_GRACEFUL_TIMEOUT seconds.
+"""
+from main import app
+
+__all__ = ["app"]
@@ -0,0 +1,403 @@
+import zlib
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+import numpy as np
+
+ROOT = 0
+_EMPTY = np.zeros(0, dtype=np.int32)
+
+
+def _crc(name: str) -> int:
+    return zlib.crc32(name.encode("utf-8", "surrogatepass"))
+
+
+def _mix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """64-bit hash combine (splitmix64 finalizer); uint64 arithmetic wraps around."""
+    with np.errstate(over="ignore"):
+        x = a * np.uint64(0x9E3779B97F4A7C15) + b + np.uint64(1)
+        x ^= x >> np.uint64(30)
+        x *= np.uint64(0xBF58476D1CE4E5B9)
+        x ^= x >> np.uint64(27)
+        x *= np.uint64(0x94D049BB133111EB)
+        return x ^ (x >> np.uint64(31))
+
+
+class SegmentTable:
+    """Distinct path segments packed into one string, found through a sorted array of their CRC32s."""
+
+    def __init__(self, names: List[str]):
+        self.offsets = np.zeros(len(names) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in names], out=self.offsets[1:])
+        self.blob = "".join(names)
+        self.hashes = np.fromiter((_crc(name) for name in names), dtype=np.uint32, count=len(names))
+        self._order, self._sorted = self._sort(self.hashes)
+        self._lower = None
+
+    @staticmethod
+    def _sort(hashes: np.ndarray):
+        order = np.argsort(hashes, kind="stable").astype(np.int32)
+        return order, hashes[order]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]]
+
+    def names(self, ids: Iterable[int]) -> Iterator[str]:
+        offsets, blob = self.offsets.tolist(), self.blob
+        for i in ids:
+            yield blob[offsets[i]:offsets[i + 1]]
+
+    def lookup(self, name: str) -> Optional[int]:
+        key = _crc(name)
+        start = np.searchsorted(self._sorted, key, side="left")
+        stop = np.searchsorted(self._sorted, key, side="right")
+        for i in self._order[start:stop]:
+            if self[i] == name:
+                return int(i)
+        return None
+
+    def lookup_ignore_case(self, name: str) -> List[int]:
+        """Every segment equal to name ignoring case; the lowercase hashes are computed on first use."""
+        if self._lower is None:
+            lowered = (_crc(name.lower()) for name in self.names(range(len(self))))
+            self._lower = self._sort(np.fromiter(lowered, dtype=np.uint32, count=len(self)))
+        order, hashes = self._lower
+        name = name.lower()
+        key = _crc(name)
+        start = np.searchsorted(hashes, key, side="left")
+        stop = np.searchsorted(hashes, key, side="right")
+        return [int(i) for i in order[start:stop] if self[i].lower() == name]
+
+    def nbytes(self) -> int:
+        arrays = [self.offsets, self.hashes, self._order, self._sorted] + list(self._lower or ())
+        return len(self.blob) + sum(a.nbytes for a in arrays)
+
+
+class PathIndex:
+    """
+    Compact index of a repository's file paths: a trie over interned path segments,
+    stored in flat NumPy arrays instead of one Python object per path.
+
+    Nodes are numbered in preorder, so the subtree of a node is the contiguous range
+    [node, end[node]) and subtree aggregates (file counts, bytes, digests) are differences
+    of prefix sums. Segments and extensions have inverted indexes for basename,
+    extension and path-pattern queries. Build with PathIndex.build(paths, sizes).
+    """
+
+    def __init__(self, segments: SegmentTable, parent, segment, end, depth, is_file, size, input_nodes):
+        self.segments = segments
+        self.parent = parent
+        self.segment = segment
+        self.end = end
+        self.is_file = is_file
+        self.size = size
+        self.input_nodes = input_nodes
+
+        # Extensions are worked out once per distinct file name, not once per path.
+        file_segments = np.zeros(len(segments), dtype=np.bool_)
+        file_segments[segment[is_file]] = True
+        file_segments = np.flatnonzero(file_segments)
+        extension_names = [
+            "." + tail.lower() if head else "" for head, _, tail in (name.rpartition(".") for name in segments.names(file_segments.tolist()))
+        ]
+        extension_ids = {extension: i for i, extension in enumerate(dict.fromkeys(["", *extension_names]))}
+        segment_extension = np.zeros(len(segments), dtype=np.int32)
+        segment_extension[file_segments] = np.fromiter(map(extension_ids.__getitem__, extension_names), dtype=np.int32, count=len(extension_names))
+        del extension_names, file_segments
+        self.extensions = list(extension_ids)
+        self._extension_ids = extension_ids
+        # int16 unless a tree really has more than 32767 distinct extensions.
+        extension_type = np.int16 if len(extension_ids) <= np.iinfo(np.int16).max else np.int32
+        self.extension = np.where(is_file, segment_extension[segment], 0).astype(extension_type)
+        del segment_extension
+
+        # Path hashes level by level from the root: hash(node) = mix(hash(parent), crc32(name)).
+        node_hash = np.zeros(len(parent), dtype=np.uint64)
+        segment_hash = segments.hashes.astype(np.uint64)
+        by_depth = np.argsort(depth, kind="stable").astype(np.int32)
+        level_starts = np.searchsorted(depth[by_depth], np.arange(1, int(depth.max()) + 2))
+        for start, stop in zip(level_starts[:-1], level_starts[1:]):
+            nodes = by_depth[start:stop]
+            node_hash[nodes] = _mix(node_hash[parent[nodes]], segment_hash[segment[nodes]])
+        del segment_hash, by_depth
+        file_nodes = np.flatnonzero(is_file).astype(np.int32)
+        file_hash = np.zeros(len(parent), dtype=np.uint64)
+        file_hash[file_nodes] = _mix(node_hash[file_nodes], size[file_nodes].astype(np.uint64))
+        del node_hash
+
+        self._file_cum = np.zeros(len(parent) + 1, dtype=np.int32)
+        np.cumsum(is_file, out=self._file_cum[1:])
+        self._bytes_cum = np.zeros(len(parent) + 1, dtype=np.int64)
+        np.cumsum(size, out=self._bytes_cum[1:])
+        # uint64 sums wrap around, which is exactly what an order-independent digest needs.
+        self._hash_cum = np.zeros(len(parent) + 1, dtype=np.uint64)
+        np.cumsum(file_hash, out=self._hash_cum[1:])
+        del file_hash
+
+        self._children_order, self._children_offsets = self._group(parent[1:], len(parent), offset=1)
+        self._by_segment, self._segment_offsets = self._group(segment, len(segments))
+        order, self._extension_offsets = self._group(self.extension[file_nodes], len(self.extensions))
+        self._by_extension = file_nodes[order]
+
+    @staticmethod
+    def _group(keys: np.ndarray, key_count: int, offset: int = 0):
+        """CSR grouping: positions (+offset) sorted by key, and the start offset of every key."""
+        order = np.argsort(keys, kind="stable").astype(np.int32) + offset
+        offsets = np.zeros(key_count + 1, dtype=np.int32)
+        np.cumsum(np.bincount(keys, minlength=key_count), out=offsets[1:])
+        return order, offsets
+
+    @classmethod
+    def build(cls, paths: Sequence[str], sizes: Union[Dict[str, int], Sequence[int]] = None) -> "PathIndex":
+        """
+        Builds the index in one pass over the paths in sorted order; sizes is a dict or a parallel list.
+        The pass only records parents and names; everything else a file node needs is filled in
+        with whole-array operations afterwards.
+        """
+        if isinstance(sizes, dict):
+            sizes = [sizes.get(path, 0) for path in paths]
+
+        segment_ids: Dict[str, int] = {"": 0}
+        intern = segment_ids.setdefault
+        parent, segment = array("i", [-1]), array("i", [0])
+        directories, directory_depths = array("i", [ROOT]), array("h", [0])
+        closed, closed_ends = array("i"), array("i")
+        input_nodes = array("i", [0]) * len(paths)
+
+        # "/" sorts before every other character, so each directory's entries stay contiguous.
+        keys = [path.replace("/", "\0") for path in paths]
+        order = sorted(range(len(paths)), key=keys.__getitem__)
+        del keys
+        open_names: List[str] = []
+        open_nodes: List[int] = [ROOT]
+        count = 1
+        previous, previous_node = None, ROOT
+        for i in order:
+            path = paths[i]
+            if path == previous:
+                input_nodes[i] = previous_node
+                continue
+            parts = path.split("/")
+            last = len(parts) - 1
+
+            common, limit = 0, min(last, len(open_names))
+            while common < limit and parts[common] == open_names[common]:
+                common += 1
+            while len(open_names) > common:
+                open_names.pop()
+                closed.append(open_nodes.pop())
+                closed_ends.append(count)
+            for level in range(common, last):
+                name = parts[level]
+                parent.append(open_nodes[-1])
+                segment.append(intern(name, len(segment_ids)))
+                directories.append(count)
+                directory_depths.append(level + 1)
+                open_nodes.append(count)
+                open_names.append(name)
+                count += 1
+
+            parent.append(open_nodes[-1])
+            segment.append(intern(parts[last], len(segment_ids)))
+            previous, previous_node = path, count
+            input_nodes[i] = count
+            count += 1
+        closed.extend(open_nodes)
+        closed_ends.extend([count] * len(open_nodes))
+        del order, open_names, open_nodes
+
+        parent = np.frombuffer(parent, dtype=np.int32)
+        input_nodes = np.frombuffer(input_nodes, dtype=np.int32)
+        directories = np.frombuffer(directories, dtype=np.int32)
+        is_file = np.ones(count, dtype=np.bool_)
+        is_file[directories] = False
+        end = np.arange(1, count + 1, dtype=np.int32)
+        end[np.frombuffer(closed, dtype=np.int32)] = np.frombuffer(closed_ends, dtype=np.int32)
+        # Every file sits directly in a directory, whose depth is known.
+        depth = np.zeros(count, dtype=np.int16)
+        depth[directories] = np.frombuffer(directory_depths, dtype=np.int16)
+        depth[is_file] = depth[parent[is_file]] + 1
+        size = np.zeros(count, dtype=np.int64)
+        if sizes is not None:
+            # Reversed, so the first of a path listed twice is the one that sticks.
+            size[input_nodes[::-1]] = np.fromiter((value or 0 for value in reversed(sizes)), dtype=np.int64, count=len(paths))
+
+        segments = SegmentTable(list(segment_ids))
+        del segment_ids, intern, closed, closed_ends
+        return cls(segments, parent, np.frombuffer(segment, dtype=np.int32), end, depth, is_file, size, input_nodes)
+
+    @classmethod
+    def of(cls, paths, sizes=None) -> "PathIndex":
+        """Returns paths unchanged if it already is an index, else builds one."""
+        return paths if isinstance(paths, PathIndex) else cls.build(list(paths), sizes)
+
+    # Nodes
+
+    def __len__(self) -> int:
+        return int(self._file_cum[-1])
+
+    @property
+    def node_count(self) -> int:
+        return len(self.parent)
+
+    def name(self, node: int) -> str:
+        return self.segments[self.segment[node]]
+
+    def path(self, node: int) -> str:
+        parts = []
+        while node > ROOT:
+            parts.append(self.segments[self.segment[node]])
+            node = self.parent[node]
+        return "/".join(reversed(parts))
+
+    def children(self, node: int = ROOT) -> np.ndarray:
+        return self._children_order[self._children_offsets[node]:self._children_offsets[node + 1]]
+
+    def directories(self, node: int = ROOT) -> np.ndarray:
+        children = self.children(node)
+        return children[~self.is_file[children]]
+
+    def files(self, node: int = ROOT) -> np.ndarray:
+        children = self.children(node)
+        return children[self.is_file[children]]
+
+    def child(self, node: int, name: str, ignore_case: bool = False) -> Optional[int]:
+        children = self.children(node)
+        if ignore_case and len(children) <= 64:
+            name = name.lower()
+            return next((int(c) for c in children if self.name(c).lower() == name), None)
+        if ignore_case:
+            keys = self.segments.lookup_ignore_case(name)
+            matches = children[np.isin(self.segment[children], keys)] if keys else _EMPTY
+        else:
+            key = self.segments.lookup(name)
+            matches = children[self.segment[children] == key] if key is not None else _EMPTY
+        return int(matches[0]) if len(matches) else None
+
+    def find(self, path: str, ignore_case: bool = False) -> Optional[int]:
+        """Node of a file or directory path, or None."""
+        node = ROOT
+        for name in path.strip("/").split("/"):
+            if not name:
+                continue
+            node = self.child(node, name, ignore_case)
+            if node is None:
+                return None
+        return node
+
+    def contains(self, path: str, ignore_case: bool = False) -> bool:
+        return self.find(path, ignore_case) is not None
+
+    # Aggregates
+
+    def file_count(self, node: int = ROOT) -> int:
+        return int(self._file_cum[self.end[node]] - self._file_cum[node])
+
+    def total_bytes(self, node: int = ROOT) -> int:
+        return int(self._bytes_cum[self.end[node]] - self._bytes_cum[node])
+
+    def digest(self, node: int = ROOT) -> str:
+        """Changes whenever a path or size anywhere in the subtree changes."""
+        total = (int(self._hash_cum[self.end[node]]) - int(self._hash_cum[node])) % (1 << 64)
+        return f"{total:016x}{self.file_count(node):x}"
+
+    def fingerprint(self) -> str:
+        return self.digest(ROOT)
+
+    def extension_counts(self, node: int = ROOT) -> Counter:
+        start, stop = node, self.end[node]
+        counts = np.bincount(self.extension[start:stop][self.is_file[start:stop]], minlength=len(self.extensions))
+        return Counter({self.extensions[i]: int(counts[i]) for i in np.flatnonzero(counts) if self.extensions[i]})
+
+    # Queries
+
+    def file_nodes(self, prefix: str = "") -> np.ndarray:
+        """Files under a directory prefix (or the file itself), in path order."""
+        node = self.find(prefix) if prefix else ROOT
+        if node is None:
+            return _EMPTY
+        return node + np.flatnonzero(self.is_file[node:self.end[node]]).astype(np.int32)
+
+    def with_extension(self, *extensions: str) -> np.ndarray:
+        groups = []
+        for extension in extensions:
+            i = self._extension_ids.get(extension.lower())
+            if i is not None:
+                groups.append(self._by_extension[self._extension_offsets[i]:self._extension_offsets[i + 1]])
+        return np.sort(np.concatenate(groups)) if groups else _EMPTY
+
+    def extension_mask(self, extensions: Iterable[str]) -> np.ndarray:
+        """Boolean mask over nodes: True for files with one of the extensions."""
+        ids = [self._extension_ids[ext.lower()] for ext in extensions if ext.lower() in self._extension_ids]
+        return np.isin(self.extension, ids) & self.is_file
+
+    def count_extension(self, *extensions: str) -> int:
+        return len(self.with_extension(*extensions))
+
+    def _named(self, segment_id: int) -> np.ndarray:
+        return self._by_segment[self._segment_offsets[segment_id]:self._segment_offsets[segment_id + 1]]
+
+    def with_basename(self, name: str, ignore_case: bool = False) -> np.ndarray:
+        if ignore_case:
+            groups = [self._named(i) for i in self.segments.lookup_ignore_case(name)]
+            nodes = np.concatenate(groups) if groups else _EMPTY
+        else:
+            i = self.segments.lookup(name)
+            nodes = self._named(i) if i is not None else _EMPTY
+        return np.sort(nodes[self.is_file[nodes]])
+
+    def match_mask(self, patterns: Iterable[str]) -> np.ndarray:
+        """
+        Boolean mask over nodes: True for every node whose path contains one of the patterns
+        as consecutive path components ("app/Models", "models.py", "src"), including
+        everything below a matching directory.
+        """
+        marks = np.zeros(self.node_count + 1, dtype=np.int32)
+        for pattern in patterns:
+            matched = None
+            for name in [part for part in pattern.strip("/").split("/") if part]:
+                key = self.segments.lookup(name)
+                if key is None:
+                    matched = _EMPTY
+                    break
+                candidates = self._named(key)
+                # Later components must sit directly below a node matched by the previous one.
+                matched = candidates if matched is None else candidates[np.isin(self.parent[candidates], matched)]
+            if matched is None or not len(matched):
+                continue
+            np.add.at(marks, matched, 1)
+            np.add.at(marks, self.end[matched], -1)
+        return np.cumsum(marks[:-1]) > 0
+
+    def input_mask(self, node_mask: np.ndarray) -> np.ndarray:
+        """A node mask re-ordered to line up with the path list the index was built from."""
+        return node_mask[self.input_nodes]
+
+    def paths(self, nodes: Iterable[int] = None) -> Iterator[str]:
+        """File paths (all of them in path order, or of the given nodes)."""
+        if nodes is not None:
+            for node in nodes:
+                yield self.path(int(node))
+            return
+        stack: List[str] = []
+        depth_of = {ROOT: 0}
+        for node in range(1, self.node_count):
+            depth = depth_of[int(self.parent[node])] + 1
+            del stack[depth - 1:]
+            stack.append(self.segments[self.segment[node]])
+            if self.is_file[node]:
+                yield "/".join(stack)
+            else:
+                depth_of[node] = depth
+
+    def memory_bytes(self) -> int:
+        """Footprint of the arrays plus the packed segment table."""
+        arrays = [
+            self.parent, self.segment, self.end, self.is_file, self.size, self.extension, self.input_nodes,
+            self._file_cum, self._bytes_cum, self._hash_cum, self._children_order, self._children_offsets,
+            self._by_segment, self._segment_offsets, self._by_extension, self._extension_offsets,
+        ]
+        return sum(a.nbytes for a in arrays) + self.segments.nbytes()
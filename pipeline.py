@@ -0,0 +1,167 @@
+import dataclasses
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class Stage:
+    """
+    One step of an analysis pipeline. The stage function is called with its inputs as
+    keyword arguments; a single output is returned as-is, several as a tuple.
+    Only stages with cache_inputs are cached, keyed by the hash of those inputs.
+    """
+    name: str
+    func: Callable[..., Any]
+    inputs: List[str]
+    outputs: List[str]
+    cache_inputs: Optional[List[str]] = None
+    cache_if: Optional[Callable[[Any], bool]] = None
+
+
+def _canonical(value):
+    """JSON-friendly canonical form of a stage input, used for the cache key."""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _canonical(item) for key, item in value.items()}
+    if dataclasses.is_dataclass(value):
+        return _canonical(dataclasses.asdict(value))
+    if callable(getattr(value, "fingerprint", None)):
+        # Indexes and parsed graphs know their own content digest.
+        return value.fingerprint()
+    if hasattr(value, "sha") and hasattr(value, "path"):
+        # Repository files are identified by path + blob SHA, never by their content.
+        return [value.path, value.sha]
+    raise TypeError(f"Cannot fingerprint a {type(value).__name__}")
+
+
+def fingerprint(stage_name: str, values: Dict[str, Any]) -> str:
+    payload = json.dumps([stage_name, _canonical(values)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageCache:
+    """LRU cache of stage outputs, optionally persisted to disk as pickles"""
+
+    def __init__(self, max_entries: int = 256, cache_dir: str = None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: str):
+        """Returns (hit, value)."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True, self._entries[key]
+
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"{key}.pkl")
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+                return False, None
+            self._remember(key, value)
+            return True, value
+
+        return False, None
+
+    def put(self, key: str, value):
+        self._remember(key, value)
+        if self.cache_dir:
+            path = os.path.join(self.cache_dir, f"{key}.pkl")
+            try:
+                with open(path + ".tmp", "wb") as f:
+                    pickle.dump(value, f)
+                os.replace(path + ".tmp", path)
+            except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+                print(f"Stage cache: could not persist {key[:12]}: {e}")
+
+    def _remember(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class Pipeline:
+    """
+    Runs stages as a DAG: every stage starts as soon as all of its inputs exist,
+    so independent stages (e.g. languages and the tree listing) run concurrently.
+    """
+
+    def __init__(self, stages: List[Stage], cache: StageCache = None, max_workers: int = 4,
+                 on_stage: Callable[[Stage, float, bool], None] = None):
+        produced = [output for stage in stages for output in stage.outputs]
+        duplicates = {output for output in produced if produced.count(output) > 1}
+        if duplicates:
+            raise ValueError(f"Outputs produced by more than one stage: {duplicates}")
+
+        self.stages = stages
+        self.cache = cache
+        self.max_workers = max_workers
+        self.on_stage = on_stage
+
+    def _run_stage(self, stage: Stage, kwargs: Dict[str, Any]):
+        started = time.monotonic()
+        key = None
+        if self.cache and stage.cache_inputs is not None:
+            try:
+                key = fingerprint(stage.name, {name: kwargs[name] for name in stage.cache_inputs})
+            except TypeError as e:
+                print(f"  [{stage.name}] not cacheable: {e}")
+
+        hit, result = self.cache.get(key) if key else (False, None)
+        if not hit:
+            result = stage.func(**kwargs)
+            if key and (stage.cache_if is None or stage.cache_if(result)):
+                self.cache.put(key, result)
+
+        elapsed = time.monotonic() - started
+        print(f"  [{stage.name}] {'cached' if hit else 'done'} in {elapsed:.1f}s")
+        if self.on_stage:
+            self.on_stage(stage, elapsed, hit)
+
+        if len(stage.outputs) == 1:
+            return {stage.outputs[0]: result}
+        return dict(zip(stage.outputs, result))
+
+    def run(self, **initial) -> Dict[str, Any]:
+        """Runs every stage and returns all values (initial inputs included)."""
+        values = dict(initial)
+        pending = list(self.stages)
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                ready = [stage for stage in pending if all(name in values for name in stage.inputs)]
+                for stage in ready:
+                    pending.remove(stage)
+                    kwargs = {name: values[name] for name in stage.inputs}
+                    running[executor.submit(self._run_stage, stage, kwargs)] = stage
+
+                if not running:
+                    missing = {name for stage in pending for name in stage.inputs if name not in values}
+                    raise ValueError(f"Stages {[stage.name for stage in pending]} can never run, missing inputs: {missing}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    running.pop(future)
+                    values.update(future.result())
+
+        return values
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+import pyarrow as pa
+import pyarrow.parquet as pq
+from typing import Dict
+from file_records import language_for
+
+FILES_SCHEMA = pa.schema([
+    ("path", pa.string()),
+    ("sha", pa.string()),
+    ("size", pa.int64()),
+    ("language", pa.dictionary(pa.int16(), pa.string())),
+    ("skeleton", pa.large_string()),
+    ("diagram", pa.large_string()),
+    ("description", pa.large_string()),
+    ("status", pa.dictionary(pa.int8(), pa.string())),
+    ("tokens", pa.int64()),
+    ("latency", pa.float32()),
+])
+
+DIAGRAMS_SCHEMA = pa.schema([
+    ("kind", pa.dictionary(pa.int8(), pa.string())),
+    ("name", pa.string()),
+    ("diagram", pa.large_string()),
+    ("description", pa.large_string()),
+    ("success", pa.bool_()),
+    ("error", pa.string()),
+])
+
+
+class RunRecorder:
+    """
+    Collects one row per file and one per run-level diagram while a run is in progress.
+    Thread-safe, so streaming stages can record from their worker threads.
+    """
+
+    def __init__(self):
+        self.files = {name: [] for name in FILES_SCHEMA.names}
+        self.diagrams = {name: [] for name in DIAGRAMS_SCHEMA.names}
+        self._lock = threading.Lock()
+
+    def add_file(self, path: str, sha: str = None, size: int = None, skeleton: str = None, diagram: str = None,
+                 description: str = None, status: str = "ok", tokens: int = None, latency: float = None):
+        row = {
+            "path": path, "sha": sha, "size": size, "language": language_for(path), "skeleton": skeleton,
+            "diagram": diagram, "description": description, "status": status, "tokens": tokens, "latency": latency,
+        }
+        with self._lock:
+            for name, value in row.items():
+                self.files[name].append(value)
+
+    def add_diagram(self, kind: str, result):
+        row = {
+            "kind": kind, "name": result.file_path, "diagram": result.mermaid_code or None,
+            "description": result.description or None, "success": result.success, "error": result.error,
+        }
+        with self._lock:
+            for name, value in row.items():
+                self.diagrams[name].append(value)
+
+    def tables(self, metadata: Dict[str, str] = None):
+        """(files, diagrams) Arrow tables; run metadata is stored in both schemas."""
+        metadata = {key: str(value) for key, value in (metadata or {}).items()}
+        with self._lock:
+            files = pa.Table.from_pydict(self.files, schema=FILES_SCHEMA.with_metadata(metadata))
+            diagrams = pa.Table.from_pydict(self.diagrams, schema=DIAGRAMS_SCHEMA.with_metadata(metadata))
+        return files, diagrams
+
+
+def write_run(recorder: RunRecorder, output_dir: str, fmt: str = "arrow", metadata: Dict[str, str] = None) -> Dict[str, str]:
+    """
+    Writes files.<fmt> and diagrams.<fmt> into output_dir. "arrow" is the uncompressed
+    Arrow IPC file format, which load_run memory-maps without copying; "parquet" is
+    smaller on disk and suits long-term storage and analytics engines.
+    """
+    if fmt not in ("arrow", "parquet"):
+        raise ValueError(f"Unknown run export format '{fmt}', expected 'arrow' or 'parquet'.")
+
+    metadata = {"created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), **(metadata or {})}
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for name, table in zip(("files", "diagrams"), recorder.tables(metadata)):
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        tmp_path = path + ".tmp"
+        if fmt == "parquet":
+            pq.write_table(table, tmp_path, compression="zstd")
+        else:
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+        paths[name] = path
+
+    with open(os.path.join(output_dir, "run.json"), "w", encoding="utf-8") as f:
+        json.dump({**metadata, "format": fmt, "files": len(recorder.files["path"])}, f, indent=2)
+    return paths
+
+
+def load_run(output_dir: str):
+    """(files, diagrams) tables of an exported run; Arrow files are memory-mapped, not read."""
+    tables = []
+    for name in ("files", "diagrams"):
+        arrow_path = os.path.join(output_dir, f"{name}.arrow")
+        if os.path.exists(arrow_path):
+            tables.append(pa.ipc.open_file(pa.memory_map(arrow_path, "r")).read_all())
+        else:
+            tables.append(pq.read_table(os.path.join(output_dir, f"{name}.parquet"), memory_map=True))
+    return tuple(tables)
@@ -0,0 +1,84 @@
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional
+
+_DONE = object()
+
+
+@dataclass
+class StreamStage:
+    """
+    One step of a streaming pipeline. func is called once per item; returning None drops
+    the item. Each stage reads from a bounded queue, so a slow stage blocks the ones
+    before it instead of letting items pile up in memory.
+    """
+    name: str
+    func: Callable[[Any], Optional[Any]]
+    workers: int = 1
+    queue_size: int = 4
+
+
+class StreamingPipeline:
+    """Connects StreamStages with bounded queues and runs each stage on its own worker threads"""
+
+    def __init__(self, stages: List[StreamStage]):
+        if not stages:
+            raise ValueError("StreamingPipeline needs at least one stage.")
+        self.stages = stages
+        self.processed = {stage.name: 0 for stage in stages}
+        self.failed = {stage.name: 0 for stage in stages}
+        self._lock = threading.Lock()
+
+    def _worker(self, stage: StreamStage, inbox: queue.Queue, outbox: Optional[queue.Queue]):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                return
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                print(f"  ✗ [{stage.name}] {e}")
+                with self._lock:
+                    self.failed[stage.name] += 1
+                continue
+
+            with self._lock:
+                self.processed[stage.name] += 1
+            if result is not None and outbox is not None:
+                outbox.put(result)
+
+    def _run_stage(self, stage: StreamStage, inbox: queue.Queue, outbox: Optional[queue.Queue]):
+        workers = [
+            threading.Thread(target=self._worker, args=(stage, inbox, outbox), daemon=True)
+            for _ in range(stage.workers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        # Every worker consumed one _DONE; pass the end of stream on to the next stage.
+        if outbox is not None:
+            for _ in range(self._next_workers[id(outbox)]):
+                outbox.put(_DONE)
+
+    def run(self, items: Iterable[Any]):
+        """Streams items through every stage and blocks until the last one drains."""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        self._next_workers = {id(q): stage.workers for q, stage in zip(queues, self.stages)}
+
+        runners = []
+        for index, stage in enumerate(self.stages):
+            outbox = queues[index + 1] if index + 1 < len(queues) else None
+            runner = threading.Thread(target=self._run_stage, args=(stage, queues[index], outbox), daemon=True)
+            runner.start()
+            runners.append(runner)
+
+        for item in items:
+            queues[0].put(item)
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+
+        for runner in runners:
+            runner.join()
+        return self.processed, self.failed
@@ -0,0 +1,246 @@
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+from path_index import ROOT, PathIndex
+
+CHARS_PER_TOKEN = 4
+HOT_DIRS = {
+    "src", "app", "lib", "core", "api", "models", "controllers", "routes", "services",
+    "components", "pages", "hooks", "store", "handlers", "domain", "server", "cmd", "pkg"
+}
+COLD_DIRS = {
+    "test", "tests", "__tests__", "spec", "docs", "doc", "examples", "example", "fixtures",
+    "assets", "static", "public", "images", "img", "locale", "locales", "i18n", "migrations",
+    "third_party", "vendor", "node_modules", "dist", "build", "coverage", "benchmarks"
+}
+
+
+class DirNode:
+    """
+    Directory of a PathIndex, with aggregates over its whole subtree. Aggregates come
+    straight from the index; children and files are only materialized when rendered.
+    """
+    __slots__ = ("index", "node", "name", "path", "file_count", "bytes", "digest", "_children", "_files", "_extensions")
+
+    def __init__(self, index: PathIndex, node: int, path: str):
+        self.index = index
+        self.node = node
+        self.name = index.name(node)
+        self.path = path
+        self.file_count = index.file_count(node)
+        self.bytes = index.total_bytes(node)
+        self.digest = index.digest(node)
+        self._children = None
+        self._files = None
+        self._extensions = None
+
+    @property
+    def children(self) -> Dict[str, "DirNode"]:
+        if self._children is None:
+            self._children = {}
+            for child in self.index.directories(self.node):
+                name = self.index.name(child)
+                self._children[name] = DirNode(self.index, int(child), f"{self.path}/{name}" if self.path else name)
+        return self._children
+
+    @property
+    def files(self) -> List[Tuple[str, int]]:
+        if self._files is None:
+            self._files = [(self.index.name(f), int(self.index.size[f])) for f in self.index.files(self.node)]
+        return self._files
+
+    @property
+    def extensions(self) -> Counter:
+        if self._extensions is None:
+            self._extensions = self.index.extension_counts(self.node)
+        return self._extensions
+
+    def importance(self) -> float:
+        weight = 2.0 if self.name.lower() in HOT_DIRS else 0.2 if self.name.lower() in COLD_DIRS else 1.0
+        return weight * math.log1p(self.file_count)
+
+    def is_cold(self) -> bool:
+        return self.name.lower() in COLD_DIRS
+
+    def header(self) -> str:
+        top = ", ".join(ext for ext, _ in self.extensions.most_common(3))
+        return f"{self.path or 'root'}/ ({self.file_count} files, {self.bytes // 1024} KB{', ' + top if top else ''})"
+
+
+def build_tree(file_list: Union[List[str], PathIndex], file_sizes: Dict[str, int] = None) -> DirNode:
+    """Root of the directory tree; a list of paths is indexed first, an existing PathIndex is reused."""
+    return DirNode(PathIndex.of(file_list, file_sizes), ROOT, "")
+
+
+class HierarchicalSummarizer:
+    """
+    Summarizes a repository tree within a fixed token budget. The budget is split between
+    subtrees by importance, cold or starved subtrees collapse to a one-line aggregate,
+    and each subtree summary is cached by (subtree digest, budget) so unchanged
+    directories are not re-rendered across calls.
+    """
+
+    def __init__(self, token_budget: int = 3000, max_files_per_dir: int = 10, cache_size: int = 4096):
+        self.char_budget = token_budget * CHARS_PER_TOKEN
+        self.max_files_per_dir = max_files_per_dir
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def summarize(self, file_list: Union[List[str], PathIndex], file_sizes: Dict[str, int] = None) -> str:
+        root = build_tree(file_list, file_sizes)
+        lines = self._render(root, self.char_budget, is_root=True)
+
+        output, used = [], 0
+        for depth, text in lines:
+            line = "  " * depth + text
+            if used + len(line) + 1 > self.char_budget:
+                output.append("... (summary truncated to fit the token budget)")
+                break
+            output.append(line)
+            used += len(line) + 1
+        return "\n".join(output)
+
+    def _render(self, node: DirNode, budget: int, is_root: bool = False) -> List[Tuple[int, str]]:
+        # Budgets are bucketed so small fluctuations elsewhere in the tree still hit the cache.
+        bucket = 1 << max(int(budget).bit_length() - 1, 0)
+        key = (node.digest, bucket, is_root)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        lines = self._render_uncached(node, bucket, is_root)
+
+        with self._lock:
+            self._cache[key] = lines
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return lines
+
+    def _render_uncached(self, node: DirNode, budget: int, is_root: bool) -> List[Tuple[int, str]]:
+        header = node.header()
+        if not is_root and (node.is_cold() or budget < len(header) * 3):
+            return [(0, header + " [collapsed]")]
+
+        lines = [(0, header)]
+        remaining = budget - len(header)
+
+        files = sorted(node.files)
+        file_budget = remaining // 4 if node.children else remaining
+        shown = 0
+        for name, _ in files[:self.max_files_per_dir]:
+            if file_budget < len(name) + 6:
+                break
+            lines.append((1, f"- {name}"))
+            file_budget -= len(name) + 6
+            remaining -= len(name) + 6
+            shown += 1
+        if len(files) > shown:
+            lines.append((1, f"... ({len(files) - shown} more files)"))
+
+        # Children get a share of what is left proportional to their importance; whatever a
+        # child doesn't use (e.g. because it collapsed) flows on to its less important siblings.
+        children = sorted(node.children.values(), key=lambda child: (-child.importance(), child.name))
+        remaining_importance = sum(child.importance() for child in children)
+        hidden: List[DirNode] = []
+        for child in children:
+            share = int(remaining * child.importance() / remaining_importance) if remaining_importance else 0
+            remaining_importance -= child.importance()
+            minimum = len(child.header()) + 16
+            if share < minimum:
+                share = minimum if remaining >= minimum * 2 else 0
+            if not share:
+                hidden.append(child)
+                continue
+            child_lines = self._render(child, share)
+            lines.extend((depth + 1, text) for depth, text in child_lines)
+            remaining -= sum(len(text) + 2 * (depth + 1) + 1 for depth, text in child_lines)
+
+        if hidden:
+            hidden_files = sum(child.file_count for child in hidden)
+            lines.append((1, f"... ({len(hidden)} more directories, {hidden_files} files)"))
+        return lines
+
+
+class StructureDiagramRenderer:
+    """
+    Renders the repository tree as a Mermaid `graph TD` without an LLM. Directories become
+    nested subgraphs, ordered by importance; cold directories, directories past max_depth
+    and everything beyond max_nodes collapse into a single summary node.
+    """
+
+    def __init__(self, max_depth: int = 3, max_dirs: int = 8, max_files: int = 5, max_nodes: int = 120):
+        self.max_depth = max_depth
+        self.max_dirs = max_dirs
+        self.max_files = max_files
+        self.max_nodes = max_nodes
+
+    def render(self, file_list: Union[List[str], PathIndex], file_sizes: Dict[str, int] = None, title: str = "repository") -> str:
+        root = build_tree(file_list, file_sizes)
+        self._next_id = 0
+        self._lines = ["graph TD"]
+        root_id = self._node(f"{title}/ ({root.file_count} files)", indent=1)
+        for child_id in self._render_children(root, depth=1, indent=1):
+            self._lines.append(f"    {root_id} --> {child_id}")
+        return "\n".join(self._lines)
+
+    def _new_id(self) -> str:
+        self._next_id += 1
+        return f"n{self._next_id}"
+
+    @staticmethod
+    def _label(text: str) -> str:
+        return '"' + text.replace('"', "#quot;") + '"'
+
+    def _node(self, text: str, indent: int, shape: str = "[{}]") -> str:
+        node_id = self._new_id()
+        self._lines.append("    " * indent + node_id + shape.format(self._label(text)))
+        return node_id
+
+    def _collapsed(self, node: DirNode, indent: int) -> str:
+        return self._node(f"{node.name}/ ({node.file_count} files)", indent, shape="([{}])")
+
+    def _render_children(self, node: DirNode, depth: int, indent: int) -> List[str]:
+        """Renders the files and subdirectories of node; returns the ids of the rendered entries."""
+        entries = []
+        children = sorted(node.children.values(), key=lambda child: (-child.importance(), child.name))
+        for child in children[:self.max_dirs]:
+            if child.is_cold() or depth >= self.max_depth or self._next_id >= self.max_nodes:
+                entries.append(self._collapsed(child, indent))
+            else:
+                entries.append(self._render_directory(child, depth, indent))
+        if len(children) > self.max_dirs:
+            hidden = children[self.max_dirs:]
+            entries.append(self._node(f"+{len(hidden)} more directories ({sum(c.file_count for c in hidden)} files)", indent, shape="([{}])"))
+
+        files = sorted(node.files)
+        shown = files[:self.max_files] if self._next_id < self.max_nodes else []
+        for name, _ in shown:
+            entries.append(self._node(name, indent))
+        if len(files) > len(shown):
+            entries.append(self._node(f"+{len(files) - len(shown)} more files", indent, shape="([{}])"))
+        return entries
+
+    def _render_directory(self, node: DirNode, depth: int, indent: int) -> str:
+        subgraph_id = self._new_id()
+        self._lines.append("    " * indent + f"subgraph {subgraph_id}[{self._label(node.header().replace(node.path, node.name, 1))}]")
+        self._render_children(node, depth + 1, indent + 1)
+        self._lines.append("    " * indent + "end")
+        return subgraph_id
+
+
+def render_structure_diagram(file_list: Union[List[str], PathIndex], file_sizes: Dict[str, int] = None, max_depth: int = 3) -> str:
+    return StructureDiagramRenderer(max_depth=max_depth).render(file_list, file_sizes)
+
+
+_default_summarizer: Optional[HierarchicalSummarizer] = None
+
+
+def summarize_structure(file_list: Union[List[str], PathIndex], file_sizes: Dict[str, int] = None, token_budget: int = 3000) -> str:
+    """Module-level entry point sharing one subtree cache across all callers."""
+    global _default_summarizer
+    if _default_summarizer is None or _default_summarizer.char_budget != token_budget * CHARS_PER_TOKEN:
+        _default_summarizer = HierarchicalSummarizer(token_budget=token_budget)
+    return _default_summarizer.summarize(file_list, file_sizes)